@@ -2,23 +2,89 @@
 Core MiniAnki class to manage flashcards and spaced repetition
 """
 
+import time
+
 from Utils.Constants import *
 from Utils.EInkDisplay import EInkDisplay
 from Utils.ButtonManager import ButtonManager
+from Utils.PowerManager import PowerManager
+from Utils.MemoryProfiler import memory_profiler
+from Utils.StudyStats import StudyStats
+from Utils.Logger import log
 from .MiniAnkiSetup import MiniAnkiSetup
 from .MiniAnkiCore import MiniAnkiCore
+from .MiniAnkiTiers import MiniAnkiTiers
+from .MiniAnkiSync import MiniAnkiSync
+from .MiniAnkiBulk import MiniAnkiBulk
+from .MiniAnkiConsole import MiniAnkiConsole
+
+class MiniAnki(MiniAnkiSetup, MiniAnkiCore, MiniAnkiTiers, MiniAnkiSync, MiniAnkiBulk,
+               MiniAnkiConsole):
+    def __init__(self, boot_time=None):
+        """
+        Initialize MiniAnki system
+
+        Only what the first card needs is set up here, the rest is loaded
+        by finish_startup once the first card is on screen.
+
+        Args:
+            boot_time: time.monotonic() when main.py started, for startup metrics
+        """            
+        self.boot_time = time.monotonic() if boot_time is None else boot_time
+        self.startup_metrics = {}
+        self.first_card_shown = False
+        self.saves_since_checkpoint = 0
+        self.decks = {}
+        self.dirty_decks = set()
+        self.stale_checkpoints = set()
+        self.cold_stores = {}
+        self.schedulers = {}
+        self.ring_log = None
+        self.review_export = None
+        self.pending_reviews = {}
+        self.logged_decks = set()
+        self.logged_reviews = 0
+        self.held_card = None
+        self.displayed_card = None
+        self.sync_client = None
+        self.console = None
+        self.last_sync_time = None
+        self.stats = StudyStats()
+        self.stats_shown = None
 
-class MiniAnki(MiniAnkiSetup, MiniAnkiCore):
-    def __init__(self):
-        """Initialize MiniAnki system"""            
         self.setup_sd_card()
+        self.mark_startup("sd_card")
+
+        # Only the active decks' shards are read
+        self.load_manifest()
+        if RING_LOG_ENABLED:
+            self.open_review_log()
+        if REVIEW_EXPORT_ENABLED:
+            self.open_review_export()
+        if TIERED_STORAGE:
+            self.load_tier_state()
+        self.stats.load(time.monotonic())
+        with memory_profiler.phase("load_cards"):
+            self.load_active_decks()
+        self.mark_startup("load_cards")
         
         self.eink = EInkDisplay()
+        self.mark_startup("display")
         self.button_manager = ButtonManager()
+        self.mark_startup("buttons")
+        self.motion_manager = None
+        if MOTION_SENSING:
+            self.setup_motion_sensor()
+        self.power = PowerManager(self.button_manager, self.motion_manager)
+        if SYNC_ENABLED:
+            self.setup_sync()
+        if CONSOLE_ENABLED:
+            self.setup_console()
 
-        self.cards = self.load_cards()
+        # Defaults until the fitted parameters are loaded after the first card
+        self.reset_scheduler_params()
         self.last_shown_card_time = 0
 
 
-        print("MiniAnki initialized")
+        log.info("MiniAnki initialized")
 
@@ -0,0 +1,113 @@
+import time
+
+from Utils.Constants import *
+from Utils.Logger import log
+from Utils.MemoryProfiler import memory_profiler
+from Utils.Tracer import traced
+from Utils import Reschedule
+
+class MiniAnkiBulk:
+    """
+    Bulk rescheduling
+
+    Each operation is one pass over the hot cards and one streaming pass
+    over each cold tier, followed by a single save per deck. Spreading the
+    backlog reads the cards once more first, to find the most overdue.
+    """
+
+    @traced("bulk.apply")
+    def bulk_apply(self, transform, decks=None):
+        """
+        Run a card transform over whole decks
+
+        Args:
+            transform: function(card) -> bool, see Utils/Reschedule.py
+            decks: deck names, the active decks by default
+
+        Returns:
+            int: number of changed cards
+        """
+        total = 0
+        with memory_profiler.phase("bulk_apply"):
+            for name in decks or self.active_decks:
+                if name not in self.decks:
+                    continue
+                changed = 0
+                for card in self.decks[name]:
+                    if transform(card):
+                        changed += 1
+
+                store = self.cold_stores.get(name)
+                if store is not None and store.count:
+                    cold_changed = store.apply(transform)
+                    if cold_changed is None:
+                        log.error("Cold cards of deck %s not rescheduled", name)
+                    else:
+                        changed += cold_changed
+
+                if changed:
+                    self.dirty_decks.add(name)
+                    self.save_deck(name, checkpoint=True)
+                total += changed
+
+            if self.cold_stores:
+                self.save_tier_state()
+            self.collect_active_cards()
+        log.info("Rescheduled %d cards", total)
+        return total
+
+    def deck_cards(self, decks=None):
+        """Stream the hot and cold cards of decks, the active decks by default"""
+        for name in decks or self.active_decks:
+            if name not in self.decks:
+                continue
+            for card in self.decks[name]:
+                yield card
+            store = self.cold_stores.get(name)
+            if store is not None and store.count:
+                for card in store.cards():
+                    yield card
+
+    def spread_backlog(self, days=BACKLOG_SPREAD_DAYS, decks=None):
+        """Keep the BACKLOG_DAILY_LIMIT most overdue cards due and spread the rest over days"""
+        current_time = time.monotonic()
+        cutoff = Reschedule.overdue_cutoff(self.deck_cards(decks), current_time)
+        if cutoff is None or days < 2:
+            return 0
+        return self.bulk_apply(Reschedule.spread_backlog(current_time, days, cutoff), decks)
+
+    def postpone_cards(self, factor, decks=None, **selection):
+        """
+        Multiply the intervals of the selected cards by factor
+
+        Args:
+            selection: filters of Reschedule.card_filter, e.g. overdue=True
+        """
+        matches = Reschedule.card_filter(time.monotonic(), **selection)
+        return self.bulk_apply(Reschedule.postpone(factor, matches), decks)
+
+    def reset_cards(self, decks=None, **selection):
+        """
+        Turn the selected cards back into new cards
+
+        Args:
+            selection: filters of Reschedule.card_filter, e.g. card_ids={"你好"}
+        """
+        matches = Reschedule.card_filter(time.monotonic(), **selection)
+        return self.bulk_apply(Reschedule.reset(matches), decks)
+
+    def smooth_backlog(self):
+        """
+        Spread the overdue cards if there are more than a day's worth
+
+        Called after boot and after long absences, when the backlog builds up.
+
+        Returns:
+            bool: True if the backlog was spread
+        """
+        due = self.stats.update_due(time.monotonic())
+        if due <= BACKLOG_DAILY_LIMIT:
+            return False
+        log.info("%d cards overdue, spreading over %d days", due, BACKLOG_SPREAD_DAYS)
+        self.spread_backlog()
+        return True
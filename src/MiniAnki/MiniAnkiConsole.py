@@ -0,0 +1,158 @@
+import gc
+import time
+
+from Utils.Constants import *
+from Utils.Console import SerialConsole
+from Utils.IOStats import io_stats
+from Utils.Logger import log, LEVELS
+from Utils.MemoryProfiler import memory_profiler
+from Utils.Tracer import tracer
+
+class MiniAnkiConsole:
+    """
+    Diagnostics console on the USB serial port
+
+    Commands are polled from the main loop, between button checks and
+    between idle sleep steps, so they run while a card waits for an answer
+    and while nothing is due.
+    """
+
+    def setup_console(self):
+        """Create the console and let the button waits and idle sleeps poll it"""
+        self.console = SerialConsole({
+            "help": (self.console_help, "list the commands"),
+            "stats": (self.console_stats, "study statistics"),
+            "due": (self.console_due, "cards, due counts and scheduler per deck"),
+            "timing": (self.console_timing, "span timings, see trace"),
+            "memory": (self.console_memory, "heap usage, see profile"),
+            "io": (self.console_io, "SD card traffic"),
+            "power": (self.console_power, "sleep time and current estimate"),
+            "log": (self.console_log, "log [debug|info|warning|error|off]"),
+            "trace": (self.console_trace, "trace on|off|clear"),
+            "profile": (self.console_profile, "profile on|off|clear"),
+            "save": (self.console_save, "save all decks with checkpoints"),
+            "compact": (self.console_compact, "collect garbage"),
+            "card": (self.console_card, "card HANZI, show a card's schedule"),
+        })
+        self.button_manager.idle_callback = self.poll_console
+        self.power.idle_callback = self.poll_console
+
+    def poll_console(self):
+        """Run the commands received since the last poll"""
+        if self.console is not None:
+            self.console.poll()
+
+    def console_help(self, args):
+        return self.console.help_lines()
+
+    def console_stats(self, args):
+        return self.stats.report_lines(time.monotonic(), self.active_cold_stores())
+
+    def console_due(self, args):
+        current_time = time.monotonic()
+        lines = []
+        for name in self.active_decks:
+            cards = self.decks[name]
+            due = sum(1 for card in cards if card.last_review is not None
+                      and card.last_review + card.interval <= current_time)
+            new = sum(1 for card in cards if card.last_review is None)
+            store = self.cold_stores.get(name)
+            next_due = self.schedulers[name].next_due_time(current_time)
+            lines.append("%s (%s): %d hot, %d due, %d new, %d cold, next in %s" % (
+                name, self.schedulers[name].name, len(cards), due, new,
+                store.count if store else 0,
+                "-" if next_due is None else "%ds" % max(0, next_due - current_time)))
+        if self.held_card is not None:
+            lines.append("held: %s" % self.held_card.hanzi)
+        return lines
+
+    def console_timing(self, args):
+        return tracer.report_lines() or ["No spans recorded, try trace on"]
+
+    def console_memory(self, args):
+        lines = []
+        if hasattr(gc, "mem_free"):
+            lines.append("heap: %d allocated, %d free" % (gc.mem_alloc(), gc.mem_free()))
+        return lines + (memory_profiler.report_lines() if memory_profiler.enabled else
+                        ["Memory profiling off, try profile on"])
+
+    def console_io(self, args):
+        return io_stats.report_lines()
+
+    def console_power(self, args):
+        return ["%s: %.1f" % item for item in self.power.report().items()]
+
+    def console_log(self, args):
+        if args:
+            if args[0].lower() not in LEVELS:
+                return ["Levels: %s" % ", ".join(LEVELS)]
+            log.set_level(args[0])
+        return ["log level %s" % log.level_name()]
+
+    def _toggle(self, profiler, args):
+        """Handle on/off/clear for the tracer or the memory profiler"""
+        if args and args[0] == "on":
+            if profiler is tracer:
+                tracer.enabled = True
+            else:
+                profiler.enable()
+        elif args and args[0] == "off":
+            if profiler is tracer:
+                tracer.enabled = False
+            else:
+                profiler.disable()
+        elif args and args[0] == "clear":
+            profiler.clear()
+        return ["on" if profiler.enabled else "off"]
+
+    def console_trace(self, args):
+        return self._toggle(tracer, args)
+
+    def console_profile(self, args):
+        return self._toggle(memory_profiler, args)
+
+    def console_save(self, args):
+        self.save_cards(checkpoint=True)
+        if self.cold_stores:
+            self.save_tier_state()
+        return ["Saved"]
+
+    def console_compact(self, args):
+        before = gc.mem_free() if hasattr(gc, "mem_free") else None
+        gc.collect()
+        if before is None:
+            return ["Collected"]
+        return ["Collected, %d -> %d bytes free" % (before, gc.mem_free())]
+
+    def console_card(self, args):
+        if not args:
+            return ["Usage: card HANZI"]
+        hanzi = args[0]
+        card = None
+        for candidate in self.cards:
+            if candidate.hanzi == hanzi:
+                card = candidate
+                break
+        where = "hot"
+        if card is None:
+            # Cold tiers are streamed from the SD card, read to the end so
+            # the file is closed
+            for name in self.active_decks:
+                store = self.cold_stores.get(name)
+                if store is None or card is not None:
+                    continue
+                for candidate in store.cards():
+                    if card is None and candidate.hanzi == hanzi:
+                        card = candidate
+                        card.deck = name
+                        where = "cold"
+        if card is None:
+            return ["No card %s in the active decks" % hanzi]
+
+        if card.last_review is None:
+            due = "new"
+        else:
+            due = "due in %ds" % (card.last_review + card.interval - time.monotonic())
+        return ["%s %s %s" % (card.hanzi, card.pinyin, card.english),
+                "deck %s (%s), interval %ds, %d reviews, %s" % (
+                    card.deck, where, card.interval, card.review_count, due)]
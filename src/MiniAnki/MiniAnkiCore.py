@@ -1,79 +1,175 @@
 from Utils.Constants import *
+from Utils.MemoryProfiler import memory_profiler
+from Utils.Tracer import traced
+from Utils.IOStats import io_stats
+from Utils.Logger import log
+from Utils.Scheduler import overdue_factor
 import time
 import random
 
 class MiniAnkiCore:
 
+    @traced("core.get_next_card")
     def get_next_card(self):
         """Get the next card due for review"""
         current_time = time.monotonic()
+
+        # Bring cold cards that are about to be due into the hot set
+        if self.cold_stores:
+            self.promote_cold_cards(current_time)
         
-        # Find cards that are due for review
-        print("all cards: ", self.cards)
-        due_cards = [
-            card for card in self.cards
-            if card.last_review is None or 
-            current_time - card.last_review >= card.interval
-        ]
-        
-        if not due_cards:
-            print("No cards due for review")
-            return None
-        
-        # Find the most overdue card    
+        # Each deck's scheduler proposes a card, the most overdue one wins
         most_overdue_card = None
         highest_overdue_factor = 0
         
-        for card in due_cards:
-            overdue_factor = (10.0 if card.last_review is None else 
-                             (current_time - card.last_review) / card.interval)
-            
-            if overdue_factor > highest_overdue_factor:
-                highest_overdue_factor = overdue_factor
+        for name in self.active_decks:
+            card = self.schedulers[name].next_card(current_time)
+            if card is None:
+                continue
+            factor = overdue_factor(card, current_time)
+            if factor > highest_overdue_factor:
+                highest_overdue_factor = factor
                 most_overdue_card = card
         
+        if most_overdue_card is None:
+            log.info("No cards due for review")
         return most_overdue_card
 
+    def predict_next_cards(self, current_card, count=PREFETCH_CARDS):
+        """
+        Guess which cards get_next_card will return after the current one
+
+        Cards are ranked as get_next_card would rank them at the earliest
+        time the next card can be shown. The current card is left out since
+        answering it pushes it back.
+
+        Returns:
+            list: up to count Flashcard objects, most likely first
+        """
+        predict_time = time.monotonic() + MIN_SHOW_INTERVAL_SEC
+        ranked = []
+        for name in self.active_decks:
+            ranked.extend(self.schedulers[name].predict(current_card, predict_time, count))
+        # Stable, so ties go to the earlier deck like get_next_card
+        ranked.sort(key=lambda pair: -pair[0])
+        return [card for _, card in ranked[:count]]
+
+    def prefetch_next(self, current_card):
+        """Prepare the likely next cards on the display's back buffer"""
+        if PREFETCH_CARDS <= 0:
+            return
+        with memory_profiler.phase("prefetch"):
+            self.eink.prefetch(self.predict_next_cards(current_card))
+
     def show_card(self, card):
         """Show the card on the display"""
-        print("e ink show card")
-        self.eink.show_card(card, show_answer=False)
+        log.debug("e ink show card")
+        with memory_profiler.phase("show_card"):
+            self.eink.show_card(card, show_answer=False)
+        if not self.first_card_shown:
+            self.finish_startup()
         
+    def show_stats(self):
+        """
+        Show the study statistics on the display and serial if they changed
+
+        The counters are kept up to date by each review, so no cards are read.
+
+        Returns:
+            bool: True if the display was refreshed
+        """
+        if self.stats.changes == self.stats_shown:
+            return False
+        lines = self.stats.report_lines(time.monotonic(), self.active_cold_stores())
+        for line in lines:
+            log.info("stats %s", line)
+        self.stats_shown = self.stats.changes
+        self.displayed_card = None
+        with memory_profiler.phase("show_stats"):
+            return self.eink.show_stats(lines)
+
     def reveal_card(self, card):
         """Reveal the answer on the display"""
-        self.eink.show_card(card, show_answer=True)
+        with memory_profiler.phase("show_card"):
+            self.eink.show_card(card, show_answer=True)
+        self.displayed_card = card
+        if not self.first_card_shown:
+            self.finish_startup()
 
     def wait_for_response(self):
-        """Wait for user response using buttons"""
-        return self.button_manager.wait_for_response()
+        """
+        Wait for user response using buttons
+
+        With presence detection the card is never timed out to
+        DEFAULT_RESPONSE; the wait goes on while someone is around.
+
+        Returns:
+            int: response, or None if everyone left before answering
+        """
+        if self.motion_manager is None:
+            return self.button_manager.wait_for_response()
+
+        while True:
+            response = self.button_manager.wait_for_response(default=None)
+            if response is not None:
+                self.motion_manager.mark_present()
+                return response
+            if not self.motion_manager.is_present():
+                return None
+
+    def is_present(self):
+        """Check whether someone is around to review, always True without a sensor"""
+        return self.motion_manager is None or self.motion_manager.is_present()
+
+    def hold_card(self, card):
+        """Keep a card nobody answered until someone is back"""
+        log.info("Nobody present - holding card %s", card.hanzi)
+        self.held_card = card
+
+    def resume_held_card(self):
+        """
+        Take the held card back, revealing it if it is not on the display
+
+        Returns:
+            Flashcard: the held card, or None
+        """
+        card = self.held_card
+        if card is None:
+            return None
+        self.held_card = None
+        log.info("Resuming card: %s", card.hanzi)
+        if card is not self.displayed_card:
+            self.reveal_card(card)
+        return card
 
     def wait_for_any_button(self):
         """Wait for any button press"""
         self.button_manager.wait_for_any_button()
         
+    @traced("core.process_response")
     def process_response(self, card, response):
         """Process response quality (1=Easy, 2=Medium, 3=Hard)"""
-        multipliers = {
-            RESPONSE_EASY: RESPONSE_EASY_MULTIPLIER,
-            RESPONSE_MEDIUM: RESPONSE_MEDIUM_MULTIPLIER,
-            RESPONSE_HARD: RESPONSE_HARD_MULTIPLIER
-        }
-
         old_interval = card.interval
+        old_last_review = card.last_review
 
-        # if card.review_count == 0:
-        #     card.interval = MIN_INTERVAL
-        # else:
-        card.interval = min(MAX_INTERVAL, int(card.interval * multipliers[response]))
-        
-        card.last_review = time.monotonic()
+        # The deck's scheduler sets the new interval and review time
+        self.scheduler_for(card.deck).grade(card, response, time.monotonic())
         card.review_count += 1
+        if self.review_export is not None:
+            self.review_export.add(card, old_interval, response)
+        io_stats.add_review()
+        self.stats.record_review(card, old_interval, old_last_review, response, card.last_review)
+        self.record_review(card, response)
+        if self.cold_stores and card.interval >= MATURE_INTERVAL_SEC:
+            self.demote_card(card)
         self.last_shown_card_time = time.monotonic()
         
-        print(f"Card: {card.hanzi}, Response: {response}, Interval: {old_interval}s → {card.interval}s")
-        self.save_cards()
+        log.info("Card: %s, Response: %s, Interval: %ss → %ss", card.hanzi, response, old_interval, card.interval)
+        with memory_profiler.phase("save_cards"):
+            self.save_cards()
         return card
 
+    @traced("core.wait_for_random_interval")
     def wait_for_random_interval(self, card):
         """
         Wait a random time between MIN_SHOW_INTERVAL_SEC and MAX_SHOW_INTERVAL_SEC
@@ -82,24 +178,93 @@ class MiniAnkiCore:
         Returns:
             bool: True if wait completed normally, False if interrupted by button press
         """
+        # The first card after boot is shown right away
+        if not self.first_card_shown:
+            with memory_profiler.phase("create_labels"):
+                self.eink.create_labels(card)
+            return True
+
         # Calculate a random wait interval
         wait_interval = random.randint(MIN_SHOW_INTERVAL_SEC, MAX_SHOW_INTERVAL_SEC)
-        print(f"Waiting {wait_interval} seconds before next card")
+        log.info("Waiting %s seconds before next card", wait_interval)
         
         # Wait for the interval, but check for button presses to skip wait
         wait_start = time.monotonic()
 
-        question_label, pinyin_label, answer_label = self.eink.create_labels(card)
-        card.question_label = question_label
-        card.pinyin_label = pinyin_label
-        card.answer_label = answer_label
+        # Fill the pooled labels while waiting
+        with memory_profiler.phase("create_labels"):
+            self.eink.create_labels(card)
 
-        while time.monotonic() - wait_start < wait_interval:
-            # Check if any button is pressed to skip waiting
-            if self.button_manager.is_any_button_pressed():
-                print("Button pressed - skipping wait")
-                return False  # Wait was interrupted
-            print(f"Elapsed time: {time.monotonic() - wait_start:.2f}s")
-            time.sleep(1)  # Short sleep to prevent CPU overuse
+        # Sleep instead of polling, a button press wakes the board
+        if self.power.sleep_until(wait_start + wait_interval):
+            log.info("Button pressed - skipping wait")
+            return False  # Wait was interrupted
         
-        return True  # Wait completed normally
\ No newline at end of file
+        return True  # Wait completed normally
+
+    def next_due_time(self, current_time):
+        """
+        Earliest time at which get_next_card could find a card
+
+        Returns:
+            float: time.monotonic() value, or None if no card will become due
+        """
+        next_due = None
+        for name in self.active_decks:
+            due = self.schedulers[name].next_due_time(current_time)
+            if due is not None and (next_due is None or due < next_due):
+                next_due = due
+
+        for name, store in self.cold_stores.items():
+            if name not in self.active_decks:
+                continue
+            if store.next_due is not None:
+                due = store.next_due - PROMOTE_AHEAD_SEC
+                if next_due is None or due < next_due:
+                    next_due = due
+            if store.unseen > 0:
+                # New cards are admitted again when the deck's day rolls over
+                due = self.tier_state[name]["day_start"] + SECONDS_PER_DAY
+                if next_due is None or due < next_due:
+                    next_due = due
+        return next_due
+
+    @traced("core.idle_until_present")
+    def idle_until_present(self):
+        """
+        Sleep until the PIR sensor sees motion, a button press or IDLE_MAX_SLEEP_SEC
+
+        Returns:
+            bool: True if someone is back
+        """
+        log.info("Idle until motion, ~%.1f mAh per hour so far",
+                 self.power.estimated_current_ma())
+        if self.power.sleep_until(time.monotonic() + IDLE_MAX_SLEEP_SEC, wake_on_motion=True):
+            if self.button_manager.is_any_button_pressed():
+                self.button_manager.wait_for_button_release()
+            self.motion_manager.mark_present()
+            self.smooth_backlog()
+            return True
+        return False
+
+    @traced("core.idle_until_due")
+    def idle_until_due(self):
+        """
+        Sleep until the next card is due, a button press or IDLE_MAX_SLEEP_SEC
+
+        Returns:
+            bool: True if woken by a button
+        """
+        current_time = time.monotonic()
+        deadline = current_time + IDLE_MAX_SLEEP_SEC
+        next_due = self.next_due_time(current_time)
+        if next_due is not None:
+            deadline = min(deadline, max(next_due, current_time + IDLE_MIN_SLEEP_SEC))
+
+        log.info("Idle for %.0fs, ~%.1f mAh per hour so far",
+                 deadline - current_time, self.power.estimated_current_ma())
+        if self.power.sleep_until(deadline):
+            log.info("Button pressed - checking for cards")
+            self.button_manager.wait_for_button_release()
+            return True
+        return False
\ No newline at end of file
@@ -1,15 +1,21 @@
-import board
-import busio as io
-import digitalio
-import storage
-import adafruit_sdcard
 import json
 import os
+import time
 
 from Utils.Constants import *
 from Utils.Flashcard import Flashcard
+from Utils.MemoryProfiler import memory_profiler
+from Utils.Tracer import tracer, traced
+from Utils.IOStats import io_stats
+from Utils.Logger import log
+from Utils.Checkpoint import Checkpoint, file_crc
+from Utils.DeckFile import read_deck, write_deck
+from Utils.RingLog import RingLog
+from Utils.ReviewExport import ReviewExport
+from Utils.Scheduler import create_scheduler
 
 class MiniAnkiSetup:
+    @traced("setup.setup_sd_card")
     def setup_sd_card(self):
         """
         Initialize the SD card
@@ -18,13 +24,19 @@ class MiniAnkiSetup:
             bool: True if SD card was successfully mounted, False otherwise
         """
         try:
+            # Hardware modules are imported here to keep them off the import path
+            import busio as io
+            import digitalio
+            import storage
+            import adafruit_sdcard
+
             # Create the SPI bus
             spi = io.SPI(
-                SD_SCK_PIN,     
-                SD_MOSI_PIN,    
-                SD_MISO_PIN,
+                pin(SD_SCK_PIN),     
+                pin(SD_MOSI_PIN),    
+                pin(SD_MISO_PIN),
             )
-            cs = digitalio.DigitalInOut(SD_CS_PIN)
+            cs = digitalio.DigitalInOut(pin(SD_CS_PIN))
             
             # Initialize SD card
             sdcard = adafruit_sdcard.SDCard(spi, cs)
@@ -35,62 +47,422 @@ class MiniAnkiSetup:
             # Mount the filesystem
             try:
                 storage.mount(vfs, "/sd")
-                print("SD card mounted successfully at /sd")
+                log.info("SD card mounted successfully at /sd")
             except RuntimeError as e:
                 # If already mounted, unmount and try again
                 storage.umount("/sd")
                 storage.mount(vfs, "/sd")
-                print("SD card remounted successfully at /sd")
+                log.info("SD card remounted successfully at /sd")
                 
             return True
             
         except Exception as e:
-            print(f"Failed to mount SD card: {str(e)}")
+            log.error("Failed to mount SD card: %s", e)
+            return False
+
+    def setup_motion_sensor(self):
+        """
+        Initialize the PIR sensor, without it cards are shown regardless of presence
+
+        Returns:
+            bool: True if the sensor is ready
+        """
+        try:
+            from Utils.MotionManager import MotionManager
+            self.motion_manager = MotionManager()
+            return True
+        except Exception as e:
+            log.warning("No motion sensor, presence detection disabled: %s", e)
+            self.motion_manager = None
+            return False
+
+    def mark_startup(self, stage):
+        """Record the seconds since boot at which a startup stage finished"""
+        self.startup_metrics[stage] = time.monotonic() - self.boot_time
+
+    def finish_startup(self):
+        """Report boot-to-first-card time and load what the first card did not need"""
+        self.first_card_shown = True
+        self.mark_startup("first_card")
+        log.info("Boot to first card: %.2fs", self.startup_metrics["first_card"])
+
+        self.load_scheduler_params()
+        self.smooth_backlog()
+        self.mark_startup("deferred")
+        log.info("Startup metrics: %s", self.startup_metrics)
+
+    def reset_scheduler_params(self):
+        """Use the response multipliers from Utils/Constants.py"""
+        self.multipliers = {
+            RESPONSE_EASY: RESPONSE_EASY_MULTIPLIER,
+            RESPONSE_MEDIUM: RESPONSE_MEDIUM_MULTIPLIER,
+            RESPONSE_HARD: RESPONSE_HARD_MULTIPLIER
+        }
+        self.card_scales = {}
+        self.deck_multipliers = {}
+
+    @traced("setup.load_scheduler_params")
+    def load_scheduler_params(self):
+        """
+        Load fitted response multipliers, falling back to the constants
+
+        The parameter file is produced offline by optimizer.py
+        """
+        self.reset_scheduler_params()
+
+        try:
+            with io_stats.open(SCHEDULER_PARAMS_PATH, "r") as f:
+                params = json.loads(f.read())
+        except OSError:
+            log.info("No scheduler parameters found, using defaults")
+            return False
+        except Exception as e:
+            log.error("Error loading scheduler parameters: %s", e)
+            return False
+
+        for response, multiplier in params.get("multipliers", {}).items():
+            if int(response) in self.multipliers:
+                self.multipliers[int(response)] = float(multiplier)
+        self.card_scales = params.get("cards", {})
+
+        # Decks fitted separately override the global multipliers
+        for deck, multipliers in params.get("decks", {}).items():
+            self.deck_multipliers[deck] = dict(self.multipliers)
+            for response, multiplier in multipliers.items():
+                if int(response) in self.multipliers:
+                    self.deck_multipliers[deck][int(response)] = float(multiplier)
+
+        log.info("Loaded scheduler parameters: %s", self.multipliers)
+        return True
+
+    def response_multiplier(self, card, response):
+        """Interval multiplier for a response, fitted per deck and card if available"""
+        multipliers = self.deck_multipliers.get(card.deck, self.multipliers)
+        return multipliers[response] * self.card_scales.get(card.hanzi, 1.0)
+
+    def scheduler_for(self, name):
+        """Return a deck's scheduler, creating the one the manifest names"""
+        scheduler = self.schedulers.get(name)
+        if scheduler is None:
+            kind = self.manifest.get("schedulers", {}).get(name) if self.manifest else None
+            scheduler = create_scheduler(kind, self.response_multiplier)
+            self.schedulers[name] = scheduler
+        return scheduler
+
+    def set_scheduler(self, name, kind):
+        """
+        Switch a deck to another scheduler and remember it in the manifest
+
+        Args:
+            kind: scheduler name, see Utils/Scheduler.py SCHEDULERS
+        """
+        if self.manifest is None or name not in self.deck_paths:
+            return False
+        self.manifest.setdefault("schedulers", {})[name] = kind
+        self.schedulers.pop(name, None)
+        self.save_manifest()
+        if name in self.active_decks:
+            self.collect_active_cards()
+            self.dirty_decks.add(name)
+        log.info("Deck %s uses the %s scheduler", name, self.scheduler_for(name).name)
+        return True
+
+    @traced("setup.load_manifest")
+    def load_manifest(self):
+        """
+        Load the deck manifest listing one shard file per deck
+
+        Without a manifest the single FLASHCARDS_PATH deck is used.
+
+        Returns:
+            bool: True if a manifest was loaded
+        """
+        self.manifest = None
+        self.deck_paths = {DEFAULT_DECK: FLASHCARDS_PATH}
+        self.active_decks = [DEFAULT_DECK]
+
+        try:
+            with io_stats.open(DECK_MANIFEST_PATH, "r") as f:
+                manifest = json.loads(f.read())
+        except OSError:
+            log.info("No deck manifest found, using %s", FLASHCARDS_PATH)
+            return False
+        except Exception as e:
+            log.error("Error loading deck manifest: %s", e)
+            return False
+
+        # Shard files are relative to the decks directory
+        deck_paths = {}
+        for name, file_name in manifest.get("decks", {}).items():
+            deck_paths[name] = f"{DECKS_PATH}/{file_name}"
+        if not deck_paths:
+            log.warning("Deck manifest lists no decks")
+            return False
+
+        self.manifest = manifest
+        self.deck_paths = deck_paths
+        self.active_decks = [name for name in manifest.get("active", []) if name in deck_paths]
+        if not self.active_decks:
+            self.active_decks = [sorted(deck_paths)[0]]
+
+        log.info("Decks: %s, active: %s", list(deck_paths), self.active_decks)
+        return True
+
+    def save_manifest(self):
+        """Persist the active deck selection"""
+        if self.manifest is None:
+            return False
+        self.manifest["active"] = self.active_decks
+        try:
+            with io_stats.open(DECK_MANIFEST_PATH, "w") as f:
+                f.write(json.dumps(self.manifest))
+            return True
+        except Exception as e:
+            log.error("Error saving deck manifest: %s", e)
+            return False
+
+    def load_active_decks(self):
+        """Load the shards of the active decks and rebuild the card list"""
+        for name in self.active_decks:
+            if name not in self.decks:
+                self.decks[name] = self.load_deck(name)
+        return self.collect_active_cards()
+
+    def collect_active_cards(self):
+        """Rebuild the list of cards considered for review"""
+        current_time = time.monotonic()
+        self.cards = []
+        schedulers = {}
+        for name in self.active_decks:
+            self.cards.extend(self.decks[name])
+            schedulers[name] = self.scheduler_for(name)
+            schedulers[name].rebuild(self.decks[name], current_time)
+        self.schedulers = schedulers
+        self.stats.rebuild(self.cards, current_time)
+        return self.cards
+
+    def switch_decks(self, names):
+        """
+        Make the given decks the active ones
+
+        Only the newly activated shards are read; decks that become inactive
+        are saved if needed and dropped from RAM.
+
+        Args:
+            names: deck name or list of deck names from the manifest
+        """
+        if isinstance(names, str):
+            names = [names]
+        names = [name for name in names if name in self.deck_paths]
+        if not names:
+            log.warning("No such deck")
             return False
 
-    def load_cards(self):
-        """Load flashcards from JSON file"""
+        for name in list(self.decks):
+            if name not in names:
+                if name in self.dirty_decks or name in self.logged_decks:
+                    self.save_deck(name, checkpoint=True)
+                elif name in self.stale_checkpoints:
+                    self.write_checkpoint(name, file_crc(self.deck_paths[name]))
+                del self.decks[name]
+
+        self.active_decks = names
+        self.load_active_decks()
+        self.save_manifest()
+        log.info("Active decks: %s (%d cards)", names, len(self.cards))
+        return True
+
+    def checkpoint_for(self, name):
+        """Return the checkpoint belonging to a deck"""
+        return Checkpoint(CHECKPOINT_PATH_FORMAT.format(name))
+
+    @traced("setup.load_deck")
+    def load_deck(self, name=DEFAULT_DECK):
+        """
+        Load one deck, restoring from its checkpoint when the shard is unchanged
+
+        Returns:
+            list: Flashcard objects
+        """
+        path = self.deck_paths[name]
+        cards = None
+        deck_crc = file_crc(path)
+        if deck_crc is not None:
+            cards = self.checkpoint_for(name).read(deck_crc)
+        if cards is None:
+            cards = self.load_cards(path)
+        for card in cards:
+            card.deck = name
+        self.replay_reviews(name, cards)
+        if TIERED_STORAGE:
+            cards = self.split_deck(name, cards, time.monotonic())
+        return cards
+
+    @traced("setup.load_cards")
+    def load_cards(self, path=FLASHCARDS_PATH):
+        """Load flashcards from JSON file, verifying its checksum"""
         try:
-            with open(FLASHCARDS_PATH, "r") as f:
-                data = json.load(f)
-                print("data", data)
-                cards = [Flashcard(**card) for card in data]
-                print(f"Loaded {len(cards)} flashcards")
-                return cards
+            data = read_deck(path)
+            log.debug("data %s", data)
+            cards = [Flashcard(**card) for card in data]
+            log.info("Loaded %d flashcards from %s", len(cards), path)
+            return cards
                 
         except Exception as e:
-            print(f"Error loading flashcards: {e}")
+            log.error("Error loading flashcards: %s", e)
             return []
 
     def cleanup(self):
         """Clean up resources before exit"""
-        print("Cleaning up...")
+        log.info("Cleaning up...")
+        
+        with memory_profiler.phase("save_cards"):
+            self.save_cards(checkpoint=True)
+
+        if memory_profiler.enabled:
+            memory_profiler.dump()
+            memory_profiler.dump_to_file()
+        if tracer.enabled:
+            tracer.dump()
+            tracer.export_chrome_trace()
+        io_stats.dump()
+        self.power.dump()
+        self.stats.dump(time.monotonic(), self.active_cold_stores())
         
-        self.save_cards()
+        if self.ring_log is not None:
+            self.ring_log.close()
         
         self.eink.cleanup()
         self.button_manager.cleanup()
+        if self.motion_manager is not None:
+            self.motion_manager.cleanup()
         # cleanup sd card etc
 
-    def save_cards(self):
-        """Save flashcards to JSON file"""
+    def open_review_log(self):
+        """Open the review log and collect reviews not yet in the deck files"""
+        ring_log = RingLog()
+        if not ring_log.open():
+            return False
+        self.ring_log = ring_log
+        self.pending_reviews = ring_log.recover()
+        return True
+
+    def open_review_export(self):
+        """Start this boot's part of the append-only review history"""
+        review_export = ReviewExport()
+        if not review_export.open():
+            return False
+        self.review_export = review_export
+        return True
+
+    def replay_reviews(self, name, cards):
+        """Apply logged reviews of a freshly loaded deck that its file does not contain"""
+        reviews = self.pending_reviews.pop(name, None)
+        if not reviews:
+            return
+        by_id = {card.hanzi: card for card in cards}
+        replayed = 0
+        for card_id, interval, last_review, review_count, _ in reviews:
+            card = by_id.get(card_id)
+            # Reviews the file already has, or older than it, would roll the card back
+            if card is not None and review_count > card.review_count:
+                card.interval = interval
+                card.last_review = last_review
+                card.review_count = review_count
+                replayed += 1
+        self.logged_decks.add(name)
+        self.logged_reviews += len(reviews)
+        log.info("Replayed %d of %d logged reviews for deck %s", replayed, len(reviews), name)
+
+    def record_review(self, card, response):
+        """
+        Make a review durable
+
+        Reviews go to the review log; the deck file is only rewritten
+        every RING_SAVE_EVERY reviews, or right away without a log.
+        """
+        if self.ring_log is not None and self.ring_log.append_review(card, response):
+            self.logged_decks.add(card.deck)
+            self.logged_reviews += 1
+            if self.logged_reviews >= RING_SAVE_EVERY:
+                self.dirty_decks.update(self.logged_decks)
+            return
+        self.dirty_decks.add(card.deck)
+
+    @traced("setup.save_cards")
+    def save_cards(self, checkpoint=False):
+        """
+        Save every deck with unsaved changes
+
+        Args:
+            checkpoint: also write the fast-resume checkpoints, including for
+                decks saved earlier without one
+        """
+        names = set(self.dirty_decks)
+        if checkpoint:
+            names.update(self.logged_decks)
+        for name in names:
+            if name in self.decks:
+                self.save_deck(name, checkpoint)
+
+        # The review history is appended along with the deck saves
+        if self.review_export is not None and (names or checkpoint):
+            self.review_export.flush()
+
+        # Decks already saved without a checkpoint only need the checkpoint
+        if checkpoint:
+            self.stats.save(time.monotonic())
+            for name in list(self.stale_checkpoints):
+                if name in self.decks:
+                    self.write_checkpoint(name, file_crc(self.deck_paths[name]))
+
+    def write_checkpoint(self, name, deck_crc):
+        """Write the checkpoint of a deck whose shard has the given checksum"""
+        if deck_crc is not None and self.checkpoint_for(name).write(self.decks[name], deck_crc):
+            self.stale_checkpoints.discard(name)
+            return True
+        return False
+
+    def _card_dicts(self, cards):
+        """Convert cards to dictionaries with error handling"""
+        for card in cards:
+            try:
+                yield card.to_dict()
+            except Exception as card_error:
+                log.error("Error converting card to dict: %s", card_error)
+                # Optionally, print the card's attributes to understand what's wrong
+                log.error("Card attributes: %s", card.__dict__)
+
+    def save_deck(self, name, checkpoint=False):
+        """
+        Save one deck to its JSON shard
+
+        Args:
+            checkpoint: also write the fast-resume checkpoint. Every
+                CHECKPOINT_EVERY_SAVES saves write one regardless.
+        """
+        cards = self.decks[name]
         try:
-            # Convert cards to a list of dictionaries with error handling
-            card_dicts = []
-            for card in self.cards:
-                try:
-                    card_dict = card.to_dict()
-                    card_dicts.append(card_dict)
-                except Exception as card_error:
-                    print(f"Error converting card to dict: {card_error}")
-                    # Optionally, print the card's attributes to understand what's wrong
-                    print(f"Card attributes: {vars(card)}")
-            
-            # Save with explicit encoding and error handling
-            with open(FLASHCARDS_PATH, "w", encoding="utf-8") as f:
-                json.dump(card_dicts, f)
+            # Cards are serialized one at a time into block sized buffers
+            deck_crc = write_deck(self.deck_paths[name], self._card_dicts(cards))
+            if deck_crc is None:
+                return
+            self.dirty_decks.discard(name)
+            if name in self.cold_stores:
+                self.cold_tier_saved(name)
+            if self.ring_log is not None:
+                self.ring_log.append_checkpoint(name)
+            self.logged_decks.discard(name)
+            if not self.logged_decks:
+                self.logged_reviews = 0
             
-            print(f"Saved {len(card_dicts)} flashcards")
+            log.info("Saved %d flashcards to %s", len(cards), self.deck_paths[name])
+
+            self.stale_checkpoints.add(name)
+            self.saves_since_checkpoint += 1
+            if checkpoint or self.saves_since_checkpoint >= CHECKPOINT_EVERY_SAVES:
+                self.write_checkpoint(name, deck_crc)
+                self.saves_since_checkpoint = 0
             
         except Exception as e:
-            print(f"Error saving flashcards: {e}")
\ No newline at end of file
+            log.error("Error saving flashcards: %s", e)
@@ -0,0 +1,186 @@
+import time
+
+from Utils.Constants import *
+from Utils.ColdStore import ColdStore, cold_path
+from Utils.DeckFile import read_deck, write_deck
+from Utils.Flashcard import Flashcard
+from Utils.Logger import log
+from Utils.Sync import SyncClient, SerialTransport, resolve
+
+class MiniAnkiSync:
+    """
+    Card store side of the desktop sync
+
+    Reviews come from the review log; desktop changes are merged into the
+    hot cards, the cold tier or the deck files of inactive decks.
+    """
+
+    def setup_sync(self):
+        """
+        Prepare syncing over the USB data port
+
+        Returns:
+            bool: True if a sync client is ready
+        """
+        try:
+            self.sync_client = SyncClient(SerialTransport())
+            return True
+        except Exception as e:
+            log.info("Desktop sync unavailable: %s", e)
+            return False
+
+    def sync_if_connected(self):
+        """
+        Sync when the desktop has the port open and the last sync is old enough
+
+        Returns:
+            bool: True if a sync ran
+        """
+        if self.sync_client is None or not self.sync_client.transport.connected:
+            return False
+        current_time = time.monotonic()
+        if self.last_sync_time is not None and current_time - self.last_sync_time < SYNC_INTERVAL_SEC:
+            return False
+        self.last_sync_time = current_time
+        return self.sync()
+
+    def sync(self, client=None):
+        """
+        Exchange reviews and changed cards with the desktop
+
+        Args:
+            client: SyncClient to use instead of the serial one
+
+        Returns:
+            bool: True if the sync completed
+        """
+        client = client or self.sync_client
+        # Deck files on the SD card are brought up to date first
+        self.save_cards(checkpoint=True)
+        try:
+            client.sync(self)
+            return True
+        except Exception as e:
+            log.error("Sync failed: %s", e)
+            return False
+
+    def review_sequence(self):
+        """Sequence number the next logged review will get"""
+        return 0 if self.ring_log is None else self.ring_log.sequence
+
+    def reviews_since(self, sequence):
+        """Logged reviews from sequence on, None if the log does not have them all"""
+        if self.ring_log is None:
+            return None
+        return self.ring_log.reviews_since(sequence)
+
+    def reviewed_cards(self):
+        """
+        Yield (deck, card dictionary) for every card reviewed at least once
+
+        Used when the review log cannot cover a sync. Inactive decks are
+        read from their files one at a time.
+        """
+        for name, path in self.deck_paths.items():
+            if name in self.decks:
+                cards = self.decks[name]
+            else:
+                try:
+                    cards = [Flashcard(**card) for card in read_deck(path)]
+                except Exception as e:
+                    log.error("Error reading deck %s: %s", name, e)
+                    continue
+            for card in cards:
+                if card.review_count:
+                    yield name, card.to_dict()
+
+            store = self.cold_stores.get(name) or ColdStore(cold_path(path))
+            for card in store.cards():
+                if card.review_count:
+                    yield name, card.to_dict()
+
+    def add_deck(self, name):
+        """
+        Create an empty shard for a deck that only exists on the desktop
+
+        Returns:
+            bool: True if the deck was added to the manifest
+        """
+        if self.manifest is None:
+            return False
+        file_name = name + ".json"
+        path = f"{DECKS_PATH}/{file_name}"
+        if write_deck(path, []) is None:
+            return False
+        self.manifest.setdefault("decks", {})[name] = file_name
+        self.deck_paths[name] = path
+        self.save_manifest()
+        log.info("Added deck %s", name)
+        return True
+
+    def apply_cards(self, name, card_dicts):
+        """
+        Merge cards changed on the desktop into a deck
+
+        Inactive decks are loaded, merged, saved and dropped again. Nothing
+        is written if the cards are already as the desktop has them.
+        """
+        if name not in self.deck_paths and not self.add_deck(name):
+            log.warning("Skipping %d cards for unknown deck %s", len(card_dicts), name)
+            return
+
+        loaded = name in self.decks
+        if not loaded:
+            self.decks[name] = self.load_deck(name)
+        cards = self.decks[name]
+
+        by_id = {card.hanzi: card for card in cards}
+        remaining = {}
+        changed = 0
+        for incoming in card_dicts:
+            card = by_id.get(incoming["hanzi"])
+            if card is None:
+                remaining[incoming["hanzi"]] = incoming
+                continue
+            card_changed = False
+            for field, value in resolve(card.to_dict(), incoming).items():
+                if getattr(card, field) != value:
+                    setattr(card, field, value)
+                    card_changed = True
+            if card_changed:
+                # The display may hold labels with the old text
+                self.eink.forget_card(card)
+                changed += 1
+
+        store = self.cold_stores.get(name)
+        if store is not None and remaining:
+            result = store.update(remaining, resolve)
+            if result is None:
+                remaining = {}
+                log.error("Cold cards of deck %s not updated", name)
+            else:
+                remaining, cold_changed = result
+                changed += cold_changed
+
+        # Cards new to the device
+        current_time = time.monotonic()
+        for incoming in remaining.values():
+            card = Flashcard(**incoming)
+            card.deck = name
+            if store is not None and self.is_cold(card, current_time):
+                store.append([card])
+            else:
+                cards.append(card)
+            changed += 1
+
+        # A deck loaded just for this may have had cold cards split off
+        if changed or (not loaded and name in self.dirty_decks):
+            self.save_deck(name, checkpoint=True)
+            if store is not None:
+                self.save_tier_state()
+        if loaded:
+            if changed:
+                self.collect_active_cards()
+        else:
+            del self.decks[name]
+        log.info("Applied %d desktop cards to deck %s, %d changed", len(card_dicts), name, changed)
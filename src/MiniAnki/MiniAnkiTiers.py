@@ -0,0 +1,190 @@
+import json
+
+from Utils.Constants import *
+from Utils.ColdStore import ColdStore, cold_path, due_time
+from Utils.IOStats import io_stats
+from Utils.Logger import log
+from Utils.Tracer import traced
+
+class MiniAnkiTiers:
+    """
+    Hot/cold card tiers
+
+    Only learning cards, cards about to be due and the new cards admitted
+    today stay in RAM. Mature and unseen cards live in each deck's cold
+    tier file on the SD card and are promoted when they near their due time.
+    """
+
+    def load_tier_state(self):
+        """Load the per-deck tier summaries and admission counters"""
+        self.cold_stores = {}
+        self.tier_state = {}
+        # Decks whose cards are being promoted, see promote_cold_cards
+        self.moving_decks = set()
+        try:
+            with io_stats.open(TIER_STATE_PATH, "r") as f:
+                self.tier_state = json.loads(f.read())
+        except OSError:
+            log.info("No tier state found")
+        except Exception as e:
+            log.error("Error loading tier state: %s", e)
+
+    def save_tier_state(self):
+        """Persist the tier summaries and admission counters"""
+        for name, store in self.cold_stores.items():
+            self.tier_state[name]["cold"] = store.summary()
+        try:
+            with io_stats.open(TIER_STATE_PATH, "w") as f:
+                f.write(json.dumps(self.tier_state))
+        except Exception as e:
+            log.error("Error saving tier state: %s", e)
+
+    def is_cold(self, card, current_time):
+        """Check whether a hot card belongs in the cold tier"""
+        due = due_time(card)
+        if due is None:
+            return True
+        return card.interval >= MATURE_INTERVAL_SEC and due - current_time > PROMOTE_AHEAD_SEC
+
+    def set_tiers_pending(self, name, pending):
+        """
+        Record whether a deck's shard and cold tier may both hold a card
+
+        A pending deck is reconciled against its cold file on the next load.
+        """
+        state = self.tier_state[name]
+        if state.get("pending", False) != pending:
+            state["pending"] = pending
+            self.save_tier_state()
+
+    def cold_tier_saved(self, name):
+        """Called after a deck shard is saved: it now agrees with its cold tier"""
+        if name not in self.moving_decks:
+            self.set_tiers_pending(name, False)
+
+    @traced("tiers.split_deck")
+    def split_deck(self, name, cards, current_time):
+        """
+        Attach a deck's cold tier, moving cold cards out of a freshly loaded deck
+
+        The tier state only caches the cold file's summary. Without it, or
+        after a move between the tiers was cut short, the cold file is read
+        to rebuild the summary and drop cards found in both tiers.
+
+        Returns:
+            list: the cards that stay hot
+        """
+        path = cold_path(self.deck_paths[name])
+        state = self.tier_state.get(name)
+        if state is not None and not state.get("pending"):
+            self.cold_stores[name] = ColdStore(path, state.get("cold"))
+            return cards
+
+        store = ColdStore(path)
+        if store.exists():
+            stale = store.reconcile({card.hanzi: card for card in cards})
+            if stale is None:
+                # Leave the cold cards where they are, without a tier this boot
+                log.error("Cold tier of deck %s not readable, using the shard only", name)
+                return cards
+            cards = [card for card in cards if card.hanzi not in stale]
+
+        hot = []
+        cold = []
+        for card in cards:
+            if self.is_cold(card, current_time):
+                cold.append(card)
+            else:
+                hot.append(card)
+
+        if not store.append(cold):
+            return cards
+
+        self.cold_stores[name] = store
+        if state is None:
+            state = {"day_start": current_time, "admitted": 0}
+            self.tier_state[name] = state
+        # The shard still holds the cards just moved until it is saved
+        state["pending"] = True
+        self.dirty_decks.add(name)
+        self.save_tier_state()
+        log.info("Deck %s split into %d hot and %d cold cards (%d cold in all)",
+                 name, len(hot), len(cold), store.count)
+        return hot
+
+    def new_card_slots(self, name, current_time):
+        """Number of new cards the deck may still admit today"""
+        state = self.tier_state[name]
+        # A restarted clock also starts a new day
+        if current_time - state["day_start"] >= SECONDS_PER_DAY or current_time < state["day_start"]:
+            state["day_start"] = current_time
+            state["admitted"] = 0
+        return max(0, NEW_CARDS_PER_DAY - state["admitted"])
+
+    @traced("tiers.promote_cold_cards")
+    def promote_cold_cards(self, current_time):
+        """
+        Move cards that are about to be due and today's new cards into RAM
+
+        Returns:
+            int: number of promoted cards
+        """
+        promoted_total = 0
+        for name in self.active_decks:
+            store = self.cold_stores.get(name)
+            if store is None:
+                continue
+            slots = self.new_card_slots(name, current_time)
+            if not store.needs_promotion(current_time, slots):
+                continue
+
+            promoted = store.select(current_time, slots)
+            if not promoted:
+                continue
+            # Saved in the shard first, then taken out of the cold file; a
+            # power cut in between leaves both copies for split_deck
+            self.moving_decks.add(name)
+            self.set_tiers_pending(name, True)
+            for card in promoted:
+                card.deck = name
+            self.decks[name].extend(promoted)
+            self.dirty_decks.add(name)
+            self.save_deck(name)
+            if name in self.dirty_decks or not store.remove(set(card.hanzi for card in promoted)):
+                # Left in the cold tier; the shard drops them with its next save
+                for card in promoted:
+                    self.decks[name].remove(card)
+                self.dirty_decks.add(name)
+                self.moving_decks.discard(name)
+                log.error("Cards of deck %s not promoted", name)
+                continue
+            self.moving_decks.discard(name)
+            self.set_tiers_pending(name, False)
+            self.tier_state[name]["admitted"] += sum(1 for card in promoted if card.last_review is None)
+            log.info("Promoted %d cards, %d left in cold tier", len(promoted), store.count)
+            promoted_total += len(promoted)
+
+        if promoted_total:
+            self.collect_active_cards()
+            self.save_tier_state()
+        return promoted_total
+
+    def active_cold_stores(self):
+        """Cold tiers of the active decks"""
+        return [self.cold_stores[name] for name in self.active_decks if name in self.cold_stores]
+
+    def demote_card(self, card):
+        """Move a card that became mature to its deck's cold tier"""
+        store = self.cold_stores.get(card.deck)
+        if store is None or not store.append([card]):
+            return False
+
+        self.decks[card.deck].remove(card)
+        self.cards.remove(card)
+        self.scheduler_for(card.deck).remove_card(card)
+        self.stats.remove_card(card)
+        self.dirty_decks.add(card.deck)
+        # Still in the shard until the deck is saved
+        self.set_tiers_pending(card.deck, True)
+        log.debug("Card %s moved to cold tier", card.hanzi)
+        return True
@@ -0,0 +1,43 @@
+"""
+Board identity for MiniAnki
+Names the board in the review export and in sync, so records of different
+boards never mix
+"""
+
+import os
+from Utils.Constants import *
+from Utils.IOStats import io_stats
+from Utils.Logger import log
+
+
+def board_id(path=BOARD_ID_PATH):
+    """
+    Unique id of the board
+
+    The chip's unique id, or else a random id kept on the SD card so it
+    stays the same across boots.
+
+    Returns:
+        str: hex id
+    """
+    try:
+        import microcontroller
+        return "".join("%02x" % b for b in microcontroller.cpu.uid)
+    except (ImportError, AttributeError):
+        pass
+
+    try:
+        with io_stats.open(path, "r") as f:
+            saved = f.read().strip()
+        if saved:
+            return saved
+    except OSError:
+        pass
+
+    new_id = "".join("%02x" % b for b in os.urandom(8))
+    try:
+        with io_stats.open(path, "w") as f:
+            f.write(new_id)
+    except OSError as e:
+        log.error("Error saving board id: %s", e)
+    return new_id
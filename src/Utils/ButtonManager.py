@@ -3,10 +3,11 @@ Button handling for MiniAnki
 Manages button setup and interactions
 """
 
-import board
 import digitalio
 import time
 from Utils.Constants import *
+from Utils.Tracer import traced
+from Utils.Logger import log
 
 class ButtonManager:
     def __init__(self, 
@@ -17,33 +18,60 @@ class ButtonManager:
         
         """Initialize the buttons with given pin numbers"""
         self.debounce_time = debounce_time
+        self.pin_names = [easy_pin, medium_pin, hard_pin]
+        # Called between polls while waiting for a press, e.g. the serial console
+        self.idle_callback = None
+        self._setup_buttons()
+        log.info("Button manager initialized")
 
+    def _setup_buttons(self):
+        """Claim the button pins as pulled-up inputs"""
         # Setup easy button
-        self.easy_button = digitalio.DigitalInOut(BUTTON_EASY_PIN)
+        self.easy_button = digitalio.DigitalInOut(pin(self.pin_names[0]))
         self.easy_button.direction = digitalio.Direction.INPUT
         self.easy_button.pull = digitalio.Pull.UP
         
         # Setup medium button
-        self.medium_button = digitalio.DigitalInOut(BUTTON_MEDIUM_PIN)
+        self.medium_button = digitalio.DigitalInOut(pin(self.pin_names[1]))
         self.medium_button.direction = digitalio.Direction.INPUT
         self.medium_button.pull = digitalio.Pull.UP
         
         # Setup hard button
-        self.hard_button = digitalio.DigitalInOut(BUTTON_HARD_PIN)
+        self.hard_button = digitalio.DigitalInOut(pin(self.pin_names[2]))
         self.hard_button.direction = digitalio.Direction.INPUT
         self.hard_button.pull = digitalio.Pull.UP
         
         # List of all buttons for convenience
         self.buttons = [self.easy_button, self.medium_button, self.hard_button]
-        print("Button manager initialized")
+
+    def create_pin_alarms(self, alarm):
+        """
+        Release the button pins and return alarms firing on any button press
+
+        Call restore_buttons() after sleeping to use the buttons again.
+
+        Args:
+            alarm: the alarm module
+        """
+        for button in self.buttons:
+            button.deinit()
+        return [alarm.pin.PinAlarm(pin(name), value=False, pull=True) for name in self.pin_names]
+
+    def restore_buttons(self):
+        """Reclaim the button pins after sleeping on pin alarms"""
+        self._setup_buttons()
     
     def is_any_button_pressed(self):
         """Check if any button is currently pressed"""
         return not self.easy_button.value or not self.medium_button.value or not self.hard_button.value
     
+    @traced("buttons.wait_for_any_button")
     def wait_for_any_button(self, timeout=RESPONSE_TIMEOUT_SEC):
         """
         Wait until any button is pressed and released, with a timeout
+
+        Returns:
+            str: "easy", "medium" or "hard", or None on timeout
         """
         start_time = time.monotonic()
         
@@ -51,17 +79,19 @@ class ButtonManager:
         while self.is_any_button_pressed():
             time.sleep(self.debounce_time)
             if time.monotonic() - start_time > timeout:
-                print("Timeout waiting for buttons to be released")
+                log.warning("Timeout waiting for buttons to be released")
                 return None
         
         # Wait for a button press or timeout
         while not self.is_any_button_pressed():
             time.sleep(self.debounce_time)
+            if self.idle_callback is not None:
+                self.idle_callback()
             
             # Check for timeout
             if time.monotonic() - start_time > timeout:
-                print("Timeout waiting for button press")
-                return "hard"  # Default to hard if timeout occurs
+                log.info("Timeout waiting for button press")
+                return None
         
         # Wait for debounce
         time.sleep(self.debounce_time)
@@ -76,8 +106,14 @@ class ButtonManager:
         
         return None
     
-    def wait_for_response(self):
-        """Wait for a button press that represents a response quality"""
+    @traced("buttons.wait_for_response")
+    def wait_for_response(self, default=DEFAULT_RESPONSE):
+        """
+        Wait for a button press that represents a response quality
+
+        Args:
+            default: returned if no button is pressed before the timeout
+        """
         response = self.wait_for_any_button()
         
         if response == "easy":
@@ -87,8 +123,8 @@ class ButtonManager:
         elif response == "hard":
             return RESPONSE_HARD
         
-        # Default in case something goes wrong
-        return DEFAULT_RESPONSE
+        # Default in case of a timeout
+        return default
     
     def wait_for_button_release(self):
         """Wait until all buttons are released"""
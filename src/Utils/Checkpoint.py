@@ -0,0 +1,123 @@
+"""
+Fast-resume checkpoint for MiniAnki
+Stores the prepared cards in a compact binary file tied to the deck it came from
+"""
+
+import struct
+from binascii import crc32
+from Utils.Constants import *
+from Utils.Flashcard import Flashcard
+from Utils.IOStats import io_stats
+from Utils.Logger import log
+
+CHECKPOINT_MAGIC = b"MAC1"
+# magic, deck crc, card count
+HEADER_FORMAT = "<4sII"
+# text lengths (hanzi, pinyin, english, part_of_speech, example),
+# interval, last_review (NEVER_REVIEWED for never), review_count
+CARD_FORMAT = "<HHHHHIdI"
+TEXT_FIELDS = ("hanzi", "pinyin", "english", "part_of_speech", "example")
+
+
+def file_crc(path, chunk_size=CHECKPOINT_CHUNK_SIZE):
+    """
+    CRC32 of a file, read sequentially in chunks without parsing it
+
+    Returns:
+        int: checksum, or None if the file cannot be read
+    """
+    crc = 0
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    try:
+        with io_stats.open(path, "rb") as f:
+            while True:
+                count = f.readinto(buffer)
+                if not count:
+                    break
+                crc = crc32(view[:count], crc)
+    except OSError:
+        return None
+    return crc
+
+
+class Checkpoint:
+    def __init__(self, path):
+        """Initialize the checkpoint stored at path"""
+        self.path = path
+
+    def write(self, cards, deck_crc):
+        """
+        Write the cards, tied to the checksum of the deck file they match
+
+        Returns:
+            bool: True if the checkpoint was written
+        """
+        parts = [struct.pack(HEADER_FORMAT, CHECKPOINT_MAGIC, deck_crc, len(cards))]
+        for card in cards:
+            texts = [str(getattr(card, field) or "").encode("utf-8") for field in TEXT_FIELDS]
+            last_review = NEVER_REVIEWED if card.last_review is None else card.last_review
+            parts.append(struct.pack(CARD_FORMAT, *[len(text) for text in texts],
+                                     int(card.interval), last_review, card.review_count))
+            parts.extend(texts)
+
+        body = b"".join(parts)
+        try:
+            with io_stats.open(self.path, "wb") as f:
+                f.write(body)
+                f.write(struct.pack("<I", crc32(body)))
+            log.info("Checkpoint saved for %d cards", len(cards))
+            return True
+        except Exception as e:
+            log.error("Error saving checkpoint: %s", e)
+            return False
+
+    def read(self, deck_crc):
+        """
+        Restore cards if the checkpoint matches the deck checksum
+
+        Returns:
+            list: Flashcard objects, or None if the checkpoint is missing or stale
+        """
+        try:
+            # One sequential read of the whole file
+            with io_stats.open(self.path, "rb") as f:
+                data = f.read()
+        except OSError:
+            log.info("No checkpoint found")
+            return None
+
+        header_size = struct.calcsize(HEADER_FORMAT)
+        if len(data) < header_size + 4:
+            log.warning("Checkpoint truncated")
+            return None
+
+        body = memoryview(data)[:-4]
+        if struct.unpack_from("<I", data, len(data) - 4)[0] != crc32(body):
+            log.warning("Checkpoint checksum mismatch")
+            return None
+
+        magic, saved_crc, count = struct.unpack_from(HEADER_FORMAT, data, 0)
+        if magic != CHECKPOINT_MAGIC or saved_crc != deck_crc:
+            log.info("Checkpoint does not match the deck")
+            return None
+
+        cards = []
+        card_size = struct.calcsize(CARD_FORMAT)
+        offset = header_size
+        for _ in range(count):
+            fields = struct.unpack_from(CARD_FORMAT, data, offset)
+            offset += card_size
+
+            texts = []
+            for length in fields[:5]:
+                texts.append(str(data[offset:offset + length], "utf-8"))
+                offset += length
+
+            interval, last_review, review_count = fields[5:]
+            cards.append(Flashcard(*texts, interval=interval,
+                                   last_review=None if last_review == NEVER_REVIEWED else last_review,
+                                   review_count=review_count))
+
+        log.info("Restored %d cards from checkpoint", len(cards))
+        return cards
@@ -0,0 +1,276 @@
+"""
+Cold card tier for MiniAnki
+Keeps mature and not yet admitted cards on the SD card, one JSON card per line
+"""
+
+import json
+import os
+from Utils.Constants import *
+from Utils.Flashcard import Flashcard
+from Utils.IOStats import io_stats
+from Utils.Logger import log
+
+
+def cold_path(deck_path):
+    """Path of the cold tier file belonging to a deck shard"""
+    if deck_path.endswith(".json"):
+        deck_path = deck_path[:-5]
+    return deck_path + ".cold.jsonl"
+
+
+def due_time(card):
+    """Time at which a card is due, None for cards never reviewed"""
+    if card.last_review is None:
+        return None
+    return card.last_review + card.interval
+
+
+class ColdStore:
+    def __init__(self, path, summary=None):
+        """
+        Initialize the cold tier stored at path
+
+        Args:
+            path: cold tier file
+            summary: saved summary dictionary, see summary()
+        """
+        self.path = path
+        summary = summary or {}
+        self.count = summary.get("count", 0)
+        self.unseen = summary.get("unseen", 0)
+        self.next_due = summary.get("next_due")
+        self._recover_temp()
+
+    def _recover_temp(self):
+        """
+        Finish a rewrite cut short between removing the file and renaming path.tmp
+
+        _rewrite only removes the file once path.tmp is complete, so a
+        path.tmp without the file holds the whole tier.
+        """
+        try:
+            os.stat(self.path)
+            return
+        except OSError:
+            pass
+        try:
+            os.rename(self.path + ".tmp", self.path)
+            log.warning("Recovered cold tier from %s.tmp", self.path)
+        except OSError:
+            pass
+
+    def summary(self):
+        """Return what has to be remembered about the file between boots"""
+        return {"count": self.count, "unseen": self.unseen, "next_due": self.next_due}
+
+    def _track(self, card):
+        """Update the summary for a card stored in the file"""
+        self.count += 1
+        due = due_time(card)
+        if due is None:
+            self.unseen += 1
+        elif self.next_due is None or due < self.next_due:
+            self.next_due = due
+
+    def append(self, cards):
+        """
+        Move cards to the cold tier, appending them to the file
+
+        Returns:
+            bool: True if the cards were written
+        """
+        if not cards:
+            return True
+        try:
+            with io_stats.open(self.path, "a") as f:
+                for card in cards:
+                    f.write(json.dumps(card.to_dict()) + "\n")
+                    self._track(card)
+            return True
+        except Exception as e:
+            log.error("Error writing cold tier: %s", e)
+            return False
+
+    def needs_promotion(self, current_time, new_card_slots):
+        """Check without reading the file whether select() would find cards"""
+        if new_card_slots > 0 and self.unseen > 0:
+            return True
+        return self.next_due is not None and current_time >= self.next_due - PROMOTE_AHEAD_SEC
+
+    def _rewrite(self, visit):
+        """
+        Stream the file through visit and keep the cards it returns
+
+        visit(card) returns the card to store in its place, or None to drop
+        it. Cards returned unchanged are copied without re-serializing.
+        The file is rewritten via path.tmp, so the cold tier is never held in
+        RAM and the old file stays if anything fails.
+
+        Returns:
+            bool: True if the file was rewritten
+        """
+        temp_path = self.path + ".tmp"
+        previous = self.summary()
+        self.count = 0
+        self.unseen = 0
+        self.next_due = None
+
+        try:
+            with io_stats.open(self.path, "r") as source, io_stats.open(temp_path, "w") as target:
+                for line in source:
+                    if not line.strip():
+                        continue
+                    card = Flashcard(**json.loads(line))
+                    kept = visit(card)
+                    if kept is None:
+                        continue
+                    if kept is not card:
+                        line = json.dumps(kept.to_dict())
+                    target.write(line if line.endswith("\n") else line + "\n")
+                    self._track(kept)
+
+            os.remove(self.path)
+            os.rename(temp_path, self.path)
+        except OSError as e:
+            log.error("Error rewriting cold tier: %s", e)
+            self.count = previous["count"]
+            self.unseen = previous["unseen"]
+            self.next_due = previous["next_due"]
+            return False
+        return True
+
+    def exists(self):
+        """Check whether the tier file is on the SD card"""
+        try:
+            with io_stats.open(self.path, "r"):
+                return True
+        except OSError:
+            return False
+
+    def select(self, current_time, new_card_slots):
+        """
+        Find cards that are about to be due, plus up to new_card_slots unseen cards
+
+        The file is only read; remove() takes the cards out once the deck
+        holding them is saved, so a power cut cannot lose them.
+
+        Returns:
+            list: Flashcard objects to promote
+        """
+        selected = []
+        for card in self.cards():
+            due = due_time(card)
+            if due is None and new_card_slots > 0:
+                new_card_slots -= 1
+            elif due is None or current_time < due - PROMOTE_AHEAD_SEC:
+                continue
+            selected.append(card)
+        return selected
+
+    def remove(self, card_ids):
+        """
+        Drop cards from the file
+
+        Returns:
+            bool: True if the file was rewritten
+        """
+        if not card_ids:
+            return True
+        return self._rewrite(lambda card: None if card.hanzi in card_ids else card)
+
+    def reconcile(self, hot_cards):
+        """
+        Rebuild the summary from the file and drop cards that are also hot
+
+        A card in both tiers was being moved when the device stopped. The
+        copy with more reviews wins, the hot one on a tie.
+
+        Args:
+            hot_cards: dictionary of card id -> Flashcard loaded from the deck
+
+        Returns:
+            set: ids of hot cards to drop for their cold copy, or None if the
+                file could not be rewritten
+        """
+        stale = set()
+
+        def visit(card):
+            hot = hot_cards.get(card.hanzi)
+            if hot is None:
+                return card
+            if card.review_count > hot.review_count:
+                stale.add(card.hanzi)
+                return card
+            return None
+
+        if not self._rewrite(visit):
+            return None
+        return stale
+
+    def update(self, card_dicts, merge):
+        """
+        Replace stored cards with merged versions
+
+        The file is read first and only rewritten if a merge changes a card.
+
+        Args:
+            card_dicts: dictionary of card id -> incoming card dictionary
+            merge: function(stored dictionary, incoming dictionary) -> new dictionary
+
+        Returns:
+            tuple: (the incoming cards that are not in the cold tier, number
+                of changed cards), or None if the file could not be rewritten
+        """
+        remaining = dict(card_dicts)
+        changes = {}
+        if remaining:
+            for card in self.cards():
+                incoming = remaining.pop(card.hanzi, None)
+                if incoming is None:
+                    continue
+                stored = card.to_dict()
+                merged = merge(stored, incoming)
+                if any(stored.get(field) != value for field, value in merged.items()):
+                    changes[card.hanzi] = merged
+
+        def visit(card):
+            merged = changes.get(card.hanzi)
+            return card if merged is None else Flashcard(**merged)
+
+        if changes and not self._rewrite(visit):
+            return None
+        return remaining, len(changes)
+
+    def apply(self, transform):
+        """
+        Run a card transform over the whole tier in one streaming pass
+
+        Args:
+            transform: function(card) -> bool, changing the card in place and
+                returning True if it did
+
+        Returns:
+            int: number of changed cards, or None if the file could not be rewritten
+        """
+        changed = [0]
+
+        def visit(card):
+            if not transform(card):
+                return card
+            changed[0] += 1
+            # A new object makes _rewrite serialize the changed card
+            return Flashcard(**card.to_dict())
+
+        if not self._rewrite(visit):
+            return None
+        return changed[0]
+
+    def cards(self):
+        """Stream the stored cards without loading the file"""
+        try:
+            with io_stats.open(self.path, "r") as f:
+                for line in f:
+                    if line.strip():
+                        yield Flashcard(**json.loads(line))
+        except OSError:
+            return
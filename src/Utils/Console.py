@@ -0,0 +1,90 @@
+"""
+Serial command console for MiniAnki
+Collects command lines from the USB serial console a few characters at a
+time, so polling it never blocks the review loop
+"""
+
+import sys
+from Utils.Constants import *
+
+try:
+    import supervisor
+except ImportError:
+    supervisor = None
+
+
+def input_available():
+    """
+    Check if characters are waiting on the serial console
+
+    On the host stdin is checked with select instead.
+    """
+    if supervisor is not None:
+        return supervisor.runtime.serial_bytes_available > 0
+    try:
+        import select
+        return bool(select.select([sys.stdin], [], [], 0)[0])
+    except Exception:
+        return False
+
+
+class SerialConsole:
+    def __init__(self, commands, max_line=CONSOLE_MAX_LINE):
+        """
+        Initialize the console
+
+        Args:
+            commands: command name -> (function(args) -> list of lines, help text)
+            max_line: longest accepted command line, longer input is dropped
+        """
+        self.commands = commands
+        self.max_line = max_line
+        self.buffer = ""
+        self.overflow = False
+
+    def poll(self):
+        """
+        Read the characters already received and run completed commands
+
+        Returns:
+            int: number of commands run
+        """
+        executed = 0
+        # Bounded so a paste cannot hold up a review
+        for _ in range(self.max_line):
+            if not input_available():
+                break
+            char = sys.stdin.read(1)
+            if not char:
+                break
+            if char in "\r\n":
+                if self.buffer and not self.overflow:
+                    self.execute(self.buffer)
+                    executed += 1
+                self.buffer = ""
+                self.overflow = False
+            elif len(self.buffer) < self.max_line:
+                self.buffer += char
+            else:
+                self.overflow = True
+        return executed
+
+    def execute(self, line):
+        """Run one command line and print its output"""
+        words = line.split()
+        if not words:
+            return
+        command = self.commands.get(words[0].lower())
+        if command is None:
+            print("Unknown command %s, try help" % words[0])
+            return
+        try:
+            for output in command[0](words[1:]) or ():
+                print(output)
+        except Exception as e:
+            # A bad command must never stop the reviews
+            print("Error in %s: %s" % (words[0], e))
+
+    def help_lines(self):
+        """One line per command with its help text"""
+        return ["%s - %s" % (name, self.commands[name][1]) for name in sorted(self.commands)]
@@ -2,7 +2,13 @@
 Constants used throughout MiniAnki
 All time values are in seconds unless otherwise specified
 """
-import board
+
+
+def pin(name):
+    """Look up a board pin by name, board is only imported once hardware is set up"""
+    import board
+    return getattr(board, name)
+
 
 # File paths
 SD_CARD_PATH = "/sd"
@@ -10,36 +16,54 @@ MANDARIN_FONT_PATH = f"{SD_CARD_PATH}/ChineseFont.bdf"
 # FLASHCARDS_PATH = f"/sd/flashcards2.json"
 FLASHCARDS_PATH = f"flashcardsbackup.json"
 ANKI_IMPORT_PATH = f"{SD_CARD_PATH}/anki_export.txt"
+# Fitted multipliers written by optimizer.py, optional
+SCHEDULER_PARAMS_PATH = f"{SD_CARD_PATH}/scheduler_params.json"
+# Multiple decks: a manifest naming one JSON shard per deck
+DECKS_PATH = f"{SD_CARD_PATH}/decks"
+DECK_MANIFEST_PATH = f"{DECKS_PATH}/manifest.json"
+DEFAULT_DECK = "default"  # Name of the FLASHCARDS_PATH deck when there is no manifest
+# Compact copy of a deck's prepared cards, used when its shard is unchanged
+CHECKPOINT_PATH_FORMAT = f"{SD_CARD_PATH}/checkpoint_{{}}.bin"
+# Preallocated ring buffer of review records
+RING_LOG_PATH = f"{SD_CARD_PATH}/reviews.log"
+# Admission counters and cold tier summaries for all decks
+TIER_STATE_PATH = f"{SD_CARD_PATH}/tiers.json"
+# Random id of a board whose chip has none, written once
+BOARD_ID_PATH = f"{SD_CARD_PATH}/board_id.txt"
 
-# SD Card configuration
-SD_SCK_PIN = board.GP2
-SD_MOSI_PIN = board.GP3
-SD_MISO_PIN = board.GP4
-SD_CS_PIN = board.GP5
+# SD Card configuration (board pin names, see pin())
+SD_SCK_PIN = "GP2"
+SD_MOSI_PIN = "GP3"
+SD_MISO_PIN = "GP4"
+SD_CS_PIN = "GP5"
 
 # Button configuration
-BUTTON_EASY_PIN = board.GP21
-BUTTON_MEDIUM_PIN = board.GP20
-BUTTON_HARD_PIN = board.GP19
+BUTTON_EASY_PIN = "GP21"
+BUTTON_MEDIUM_PIN = "GP20"
+BUTTON_HARD_PIN = "GP19"
 
 # E-Ink display configuration
-EINK_SCK_PIN = board.GP10
-EINK_MOSI_PIN = board.GP11
-EINK_CS_PIN = board.GP9
-EINK_DC_PIN = board.GP8
-EINK_RESET_PIN = board.GP12
-EINK_BUSY_PIN = board.GP13
+EINK_SCK_PIN = "GP10"
+EINK_MOSI_PIN = "GP11"
+EINK_CS_PIN = "GP9"
+EINK_DC_PIN = "GP8"
+EINK_RESET_PIN = "GP12"
+EINK_BUSY_PIN = "GP13"
 
 EINK_BAUDRATE = 1000000  # Baudrate for SPI communication
 EINK_WIDTH = 250
 EINK_HEIGHT = 122
 EINK_ROTATION = 270  # Rotation for the display
 EINK_COLOR = 0xFF0000  # Highlight color for display
+# (x, y) of the question, pinyin and english labels
+LABEL_POSITIONS = ((10, 30), (10, 60), (10, 90))
+STATS_POSITION = (5, 15)  # Top left of the statistics text
 
 # Time intervals for flashcard display
 # Minimum and maximum intervals for displaying any cards
 MIN_SHOW_INTERVAL_SEC = 5 
-MAX_SHOW_INTERVAL_SEC = 10 
+MAX_SHOW_INTERVAL_SEC = 10
+PREFETCH_CARDS = 2  # Cards prepared while the current one is on screen, 0 disables 
 
 # Spaced repetition intervals (in seconds)
 # Minimum and maximum intervals assigned to cards
@@ -47,6 +71,9 @@ MAX_SHOW_INTERVAL_SEC = 10
 # before showing particular card again
 MIN_INTERVAL = 60 * 5 # minutes
 MAX_INTERVAL = 60 * 60 * 24 * 30 # days
+# last_review in binary records of cards never reviewed; imported reviews
+# from before boot are negative, so only this exact value means never
+NEVER_REVIEWED = -1.0
 
 # Spaced Repition settings
 RESPONSE_EASY = 1
@@ -58,5 +85,91 @@ DEFAULT_RESPONSE = RESPONSE_HARD
 RESPONSE_EASY_MULTIPLIER = 2.0
 RESPONSE_MEDIUM_MULTIPLIER = 1.3
 RESPONSE_HARD_MULTIPLIER = 0.5
+NEW_CARD_PRIORITY = 10.0  # Overdue factor of new cards when picking the next card
+
+# Schedulers
+# Decks use DEFAULT_SCHEDULER unless the manifest's "schedulers" entry names another
+DEFAULT_SCHEDULER = "multiplier"  # "multiplier", "indexed" or "leitner"
+# Interval of each Leitner box
+LEITNER_BOX_INTERVALS = (60 * 5, 60 * 30, 60 * 60 * 4, 60 * 60 * 24, 60 * 60 * 24 * 3,
+                         60 * 60 * 24 * 7, 60 * 60 * 24 * 14, 60 * 60 * 24 * 30)
+# Boxes a card moves up per response, None sends it back to the first box
+LEITNER_STEPS = {RESPONSE_EASY: 2, RESPONSE_MEDIUM: 1, RESPONSE_HARD: None}
+
+RESPONSE_TIMEOUT_SEC = 5  # Time to wait for user response
+
+# Presence detection
+# Cards are only picked and the display only refreshed while someone is around
+MOTION_SENSING = False  # Set True on boards with a PIR sensor on PIR_PIN
+PIR_PIN = "GP16"  # PIR sensor output
+MOTION_TIMEOUT_SEC = 60 * 3  # Time without motion before the room counts as empty
+
+# Hot/cold card tiers
+# Mature and unseen cards are kept in a cold file on the SD card instead of RAM
+TIERED_STORAGE = True
+NEW_CARDS_PER_DAY = 20  # New cards admitted into the hot set per day and deck
+MATURE_INTERVAL_SEC = 60 * 60 * 24  # Cards with longer intervals go cold
+PROMOTE_AHEAD_SEC = 60 * 60  # Cold cards are promoted this long before they are due
+SECONDS_PER_DAY = 60 * 60 * 24
+
+# Backlog smoothing
+BACKLOG_DAILY_LIMIT = 100  # Overdue cards left due at once, the rest are spread out
+BACKLOG_SPREAD_DAYS = 7  # Days an overdue backlog is spread over
+
+# Study statistics
+STATS_PATH = f"{SD_CARD_PATH}/stats.json"
+STATS_INTERVAL_BUCKETS = (60 * 60, 60 * 60 * 24, 60 * 60 * 24 * 7, 60 * 60 * 24 * 30)  # Histogram bounds
+STATS_DUE_RESOLUTION_SEC = 60  # Due counts are kept per slot of this length
+STATS_HISTORY_DAYS = 7  # Days of review counters kept for retention
+
+# Power management
+# Rough Pico figures for the mAh estimate, measure your own board for real numbers
+ACTIVE_CURRENT_MA = 25.0  # Awake, polling buttons or refreshing the display
+SLEEP_CURRENT_MA = 8.0  # Light sleep at the idle clock
+IDLE_CPU_FREQUENCY = 48_000_000  # CPU clock while waiting, 0 keeps the full clock
+IDLE_MAX_SLEEP_SEC = 60 * 10  # Longest sleep before checking the cards again
+IDLE_MIN_SLEEP_SEC = 5  # Shortest sleep between checks when nothing is due
+IDLE_POLL_SEC = 0.1  # Button poll step where the alarm module is missing
+
+# Deck saves
+SD_BLOCK_SIZE = 4096  # Write buffer size, a multiple of the 512 byte SD/FAT sector
+
+# Review log
+# Reviews are appended to a fixed-size ring file instead of rewriting the deck
+RING_LOG_ENABLED = True
+RING_SLOTS = 1024  # Number of records the ring holds
+RING_SLOT_SIZE = 512  # One SD sector per record
+RING_SAVE_EVERY = 20  # Rewrite the deck files after this many logged reviews
+
+# Review history export
+# Every review is appended to a binary file that review_ingest.py collects
+REVIEW_EXPORT_ENABLED = True
+REVIEW_EXPORT_PATH = f"{SD_CARD_PATH}/reviews.mrx"
+REVIEW_EXPORT_STATE_PATH = f"{SD_CARD_PATH}/reviews_export.json"
+
+# Desktop sync
+# Reviews and changed cards are exchanged with sync_server.py over USB serial
+SYNC_ENABLED = True  # Needs usb_cdc.enable(console=True, data=True) in boot.py
+SYNC_STATE_PATH = f"{SD_CARD_PATH}/sync.json"
+SYNC_INTERVAL_SEC = 60 * 5  # Minimum time between syncs while the desktop is connected
+SYNC_TIMEOUT_SEC = 10  # Time to wait for the desktop's reply
+SYNC_PAGE_CARDS = 50  # Most desktop cards per reply line, more come in further requests
+
+# Serial console
+# Diagnostics commands typed into the USB serial console, see help
+CONSOLE_ENABLED = True
+CONSOLE_MAX_LINE = 80  # Longest command line, also the most characters read per poll
+CONSOLE_IDLE_STEP_SEC = 2  # Longest sleep between console polls while USB is connected
+
+# Checkpoint settings
+CHECKPOINT_EVERY_SAVES = 10  # Write a checkpoint with every Nth deck save
+CHECKPOINT_CHUNK_SIZE = 512  # Read size when checksumming the deck file
 
-RESPONSE_TIMEOUT_SEC = 5  # Time to wait for user response
\ No newline at end of file
+# Diagnostics
+LOG_LEVEL = "info"  # debug, info, warning, error or off
+MEMORY_PROFILING = False  # Record heap usage around each main loop phase
+MEMORY_PROFILE_SIZE = 32  # Number of phase records kept in the ring buffer
+MEMORY_PROFILE_PATH = f"{SD_CARD_PATH}/memory_profile.txt"
+TRACING = False  # Record timing spans for the hot path
+TRACE_BUFFER_SIZE = 256  # Number of span events kept for trace export
+TRACE_PATH = f"{SD_CARD_PATH}/trace.json"
\ No newline at end of file
@@ -0,0 +1,139 @@
+"""
+Deck file storage for MiniAnki
+Writes decks in SD block sized chunks with a trailing checksum and swaps them in
+"""
+
+import json
+import os
+from binascii import crc32
+from Utils.Constants import *
+from Utils.IOStats import io_stats
+from Utils.Logger import log
+
+# Appended after the JSON text: newline, marker, 8 hex digits, newline
+CHECKSUM_MARKER = b"//crc32="
+TRAILER_SIZE = len(CHECKSUM_MARKER) + 10
+
+
+class BlockWriter:
+    """Collects small writes and passes them on in whole blocks"""
+
+    def __init__(self, f, block_size=SD_BLOCK_SIZE):
+        self.file = f
+        self.buffer = bytearray(block_size)
+        self.block_size = block_size
+        self.used = 0
+        self.crc = 0
+        self.size = 0
+
+    def write(self, data):
+        self.crc = crc32(data, self.crc)
+        self.size += len(data)
+
+        view = memoryview(data)
+        offset = 0
+        while offset < len(data):
+            count = min(len(data) - offset, self.block_size - self.used)
+            self.buffer[self.used:self.used + count] = view[offset:offset + count]
+            self.used += count
+            offset += count
+            if self.used == self.block_size:
+                self.file.write(self.buffer)
+                self.used = 0
+
+    def flush(self):
+        """Write the last, partial block"""
+        if self.used:
+            self.file.write(memoryview(self.buffer)[:self.used])
+            self.used = 0
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def write_deck(path, card_dicts):
+    """
+    Save card dictionaries to path without ever leaving a partial deck
+
+    The deck is written to path.tmp, then the current file becomes path.bak
+    and path.tmp is renamed to path.
+
+    Returns:
+        int: CRC32 of the whole file as written, or None if saving failed
+    """
+    temp_path = path + ".tmp"
+    try:
+        with io_stats.open(temp_path, "wb") as f:
+            writer = BlockWriter(f)
+            separator = b"["
+            for card_dict in card_dicts:
+                writer.write(separator)
+                writer.write(json.dumps(card_dict).encode("utf-8"))
+                separator = b","
+            writer.write(b"[]" if separator == b"[" else b"]")
+
+            content_crc = writer.crc
+            writer.write(b"\n" + CHECKSUM_MARKER + ("%08x\n" % content_crc).encode())
+            writer.flush()
+    except Exception as e:
+        log.error("Error writing %s: %s", temp_path, e)
+        _remove(temp_path)
+        return None
+
+    # FAT has no atomic replace, the previous copy is kept as the fallback
+    _remove(path + ".bak")
+    try:
+        os.rename(path, path + ".bak")
+    except OSError:
+        pass
+    os.rename(temp_path, path)
+    return writer.crc
+
+
+def parse_deck(data):
+    """
+    Verify and parse deck file contents
+
+    Files without a checksum (e.g. written by parser.py) are accepted as is.
+
+    Returns:
+        list: card dictionaries
+    """
+    if len(data) >= TRAILER_SIZE and data[-TRAILER_SIZE + 1:-9] == CHECKSUM_MARKER:
+        content = memoryview(data)[:-TRAILER_SIZE]
+        expected = int(data[-9:-1], 16)
+        if crc32(content) != expected:
+            raise ValueError("checksum mismatch")
+        data = data[:-TRAILER_SIZE]
+    return json.loads(data)
+
+
+def read_deck(path):
+    """
+    Load card dictionaries, falling back to the copies left by write_deck
+
+    A complete path.tmp means the last save stopped between the renames;
+    path.bak is the deck as it was before the last save.
+
+    Returns:
+        list: card dictionaries
+    """
+    error = None
+    for candidate in (path, path + ".tmp", path + ".bak"):
+        try:
+            with io_stats.open(candidate, "rb") as f:
+                data = f.read()
+            cards = parse_deck(data)
+            if candidate != path:
+                log.warning("Recovered deck from %s", candidate)
+            return cards
+        except OSError as e:
+            error = error or e
+        except ValueError as e:
+            log.warning("Deck file %s is corrupt: %s", candidate, e)
+            error = e
+    raise error
@@ -4,38 +4,61 @@ Manages display initialization, refresh timing, and content rendering
 """
 
 import time
-import board
 import displayio
-import busio
-import adafruit_ssd1680
-from adafruit_bitmap_font import bitmap_font
-from adafruit_display_text import label
 from Utils.Constants import *
+from Utils.MemoryProfiler import memory_profiler
+from Utils.Tracer import traced
+from Utils.IOStats import io_stats
+from Utils.Logger import log
+
+class LabelPool:
+    """A display group of the labels for one card"""
+
+    def __init__(self):
+        self.group = displayio.Group()
+        self.labels = []
+        self.question_label = None
+        self.pinyin_label = None
+        self.english_label = None
+        # Card whose text the labels currently hold
+        self.card = None
+
 
 class EInkDisplay:
     def __init__(self):
         """Initialize the e-ink display and required hardware"""
         self.display = None
         self.font = None
+        self.font_loaded = False
         self.group = None
+
+        # Two label pools: the front one is on screen, the back one holds
+        # the next card, prepared ahead of time and swapped in when shown
+        self.front = None
+        self.back = None
+        self.stats_group = None
+        self.stats_label = None
         
-        # Initialize the display
+        # Initialize the display, the font is loaded when the first card needs it
         self._initialize_display()
-        self._load_font()
     
+    @traced("eink._initialize_display")
     def _initialize_display(self):
         """Initialize the e-ink display hardware"""
         try:
+            import busio
+            import adafruit_ssd1680
+
             displayio.release_displays()
             
-            spi_epd = busio.SPI(clock=EINK_SCK_PIN, MOSI=EINK_MOSI_PIN)  
+            spi_epd = busio.SPI(clock=pin(EINK_SCK_PIN), MOSI=pin(EINK_MOSI_PIN))  
             
             # Create display bus
             display_bus = displayio.FourWire(
                 spi_epd, 
-                command=EINK_DC_PIN, 
-                chip_select=EINK_CS_PIN, 
-                reset=EINK_RESET_PIN, 
+                command=pin(EINK_DC_PIN), 
+                chip_select=pin(EINK_CS_PIN), 
+                reset=pin(EINK_RESET_PIN), 
                 baudrate=EINK_BAUDRATE
             )
             
@@ -44,7 +67,7 @@ class EInkDisplay:
                 display_bus,
                 width=EINK_WIDTH,
                 height=EINK_HEIGHT,
-                busy_pin=EINK_BUSY_PIN,
+                busy_pin=pin(EINK_BUSY_PIN),
                 highlight_color=EINK_COLOR,
                 rotation=EINK_ROTATION
             )
@@ -53,36 +76,63 @@ class EInkDisplay:
             self.group = displayio.Group()
             self.display.root_group = self.group
             
-            print("E-ink display initialized successfully")
+            log.info("E-ink display initialized successfully")
             return True
             
         except Exception as e:
-            print(f"Error initializing e-ink display: {e}")
+            log.error("Error initializing e-ink display: %s", e)
             return False
     
+    def _open_font(self, path):
+        """
+        Open a font, counting glyph reads from the SD card
+
+        BDF glyphs are read lazily from the open file, so the file is
+        handed to the BDF loader through the I/O counters.
+        """
+        if path.endswith(".bdf"):
+            from adafruit_bitmap_font import bdf
+            return bdf.BDF(io_stats.open(path, "rb"), displayio.Bitmap)
+        from adafruit_bitmap_font import bitmap_font
+        return bitmap_font.load_font(path)
+
+    def _ensure_font(self):
+        """
+        Load the font on first use
+
+        Returns:
+            bool: True if a font is available
+        """
+        if not self.font_loaded:
+            self.font_loaded = True
+            self._load_font()
+        return self.font is not None
+
+    @traced("eink._load_font")
     def _load_font(self):
         """Load Chinese font from SD card"""
         try:
             # Assuming SD card is already mounted
-            print("Loading font...")
-            self.font = bitmap_font.load_font(MANDARIN_FONT_PATH)
-            print("Font loaded")
+            log.info("Loading font...")
+            self.font = self._open_font(MANDARIN_FONT_PATH)
+            log.info("Font loaded")
             
         except Exception as e:
-            print(f"Error loading font: {e}")
+            log.error("Error loading font: %s", e)
            
             try:
-                self.font = bitmap_font.load_font("/fonts/Arial-12.bdf")
-                print("Fallback font loaded")
+                self.font = self._open_font("/fonts/Arial-12.bdf")
+                log.info("Fallback font loaded")
             except:
-                print("No font available")
+                log.error("No font available")
         
     def _clear_display(self):
         """Clear all items from display group"""
         while len(self.group) > 0:
             self.group.pop()
-            print("Cleared display group")
+            log.debug("Cleared display group")
     
+    @traced("eink.refresh")
     def refresh(self):
         """
         Refresh the display using built-in timing with periodic progress updates
@@ -91,7 +141,7 @@ class EInkDisplay:
             return False
         
         total_refresh_time = self.display.time_to_refresh
-        print(f"Total refresh time: {total_refresh_time} seconds")
+        log.debug("Total refresh time: %s seconds", total_refresh_time)
         
         elapsed_time = 0
         while elapsed_time < total_refresh_time:
@@ -99,77 +149,160 @@ class EInkDisplay:
             elapsed_time += 1
             
             remaining_time = total_refresh_time - elapsed_time
-            print(f"Refresh in progress: {elapsed_time} seconds elapsed, {remaining_time} seconds remaining")
+            log.debug("Refresh in progress: %s seconds elapsed, %s seconds remaining", elapsed_time, remaining_time)
         
         # Perform the actual display refresh
-        print("Refreshing display...")
+        log.debug("Refreshing display...")
         self.display.refresh()
-        print("Display refresh complete")
+        log.debug("Display refresh complete")
         return True
     
-    def create_labels(self, card):
-        """Create labels for the flashcard"""
-        # Create labels for the card
-        question_label = label.Label(
+    def _create_label_pool(self):
+        """Create a set of labels reused for every card"""
+        from adafruit_display_text import label
+
+        pool = LabelPool()
+        (question_x, question_y), (pinyin_x, pinyin_y), (english_x, english_y) = LABEL_POSITIONS
+        pool.question_label = label.Label(
             self.font, 
-            text=card.hanzi, 
+            text="", 
             color=0xFFFFFF, 
-            x=10, 
-            y=30, 
+            x=question_x, 
+            y=question_y, 
             scale=2
         )
-        print("question_label created")
-        pinyin_label = label.Label(
+        pool.pinyin_label = label.Label(
             self.font, 
-            text=card.pinyin, 
+            text="", 
             color=0xFFFFFF, 
-            x=10, 
-            y=60, 
+            x=pinyin_x, 
+            y=pinyin_y, 
             scale=1
         )
-        print("pinyin_label created")
-        english_label = label.Label(
+        pool.english_label = label.Label(
             self.font, 
-            text=card.english, 
+            text="", 
             color=0xFFFFFF, 
-            x=10, 
-            y=90, 
+            x=english_x, 
+            y=english_y, 
             scale=1
         )
-        print("english_label created")
-        return question_label, pinyin_label, english_label
+        pool.labels = [pool.question_label, pool.pinyin_label, pool.english_label]
+        for item in pool.labels:
+            pool.group.append(item)
+        log.debug("Label pool created")
+        return pool
+
+    def _ensure_pools(self):
+        """
+        Create the label pools and font on first use
+
+        Returns:
+            bool: True if labels can be drawn
+        """
+        if not self._ensure_font():
+            return False
+        if self.front is None:
+            self.front = self._create_label_pool()
+            self.back = self._create_label_pool()
+        return True
+
+    def _fill_pool(self, pool, card):
+        """Set a pool's labels to the flashcard's text"""
+        texts = (card.hanzi, card.pinyin, card.english)
+        for item, text, (x, y) in zip(pool.labels, texts, LABEL_POSITIONS):
+            item.text = text
+            item.x = x
+            item.y = y
+        pool.card = card
+
+    @traced("eink.create_labels")
+    def create_labels(self, card):
+        """
+        Prepare the flashcard's labels in the back pool
+
+        Labels are owned by the display and reused, so no display objects
+        are kept on the card. Nothing is done if either pool already holds
+        the card.
+        """
+        if not self._ensure_pools():
+            return None
+
+        if self.front.card is card:
+            return self.front.labels
+        if self.back.card is not card:
+            self._fill_pool(self.back, card)
+            log.debug("Labels updated")
+        return self.back.labels
+
+    def forget_card(self, card):
+        """Drop a card's prepared labels after its text changed, they are filled again when shown"""
+        for pool in (self.front, self.back):
+            if pool is not None and pool.card is card:
+                pool.card = None
+
+    @traced("eink.prefetch")
+    def prefetch(self, cards):
+        """
+        Prepare the cards likely to be shown next while the panel is busy
+
+        The first card gets the back label pool, the glyphs of the others
+        are loaded into the font cache.
+        """
+        if not cards or not self._ensure_pools():
+            return
+        self.create_labels(cards[0])
+        if hasattr(self.font, "load_glyphs"):
+            for card in cards[1:]:
+                self.font.load_glyphs(card.hanzi + card.pinyin + card.english)
     
+    @traced("eink.show_card")
     def show_card(self, card, show_answer=False):
         """Show a flashcard on the display"""
-        print("E ink show card", card)
-        if not self.display or not self.font:
+        log.debug("E ink show card %s", card)
+        if not self.display or not self._ensure_pools():
             return False
 
-        # Clear the display
-        self._clear_display()
-        
-        # Create labels for the card
-        if not card.question_label or not card.pinyin_label or not card.answer_label:
-            question_label, pinyin_label, english_label = self.create_labels(card)
-            card.question_label = question_label
-            card.pinyin_label = pinyin_label
-            card.answer_label = english_label
-        else:
-            question_label = card.question_label
-            pinyin_label = card.pinyin_label
-            english_label = card.answer_label
-            print("Labels already created")
+        # A prepared card only needs the pools swapped
+        if self.front.card is not card:
+            self.create_labels(card)
+            self.front, self.back = self.back, self.front
+
+        # Later cards only change which pool is attached and label visibility
+        if len(self.group) != 1 or self.group[0] is not self.front.group:
+            self._clear_display()
+            self.group.append(self.front.group)
 
+        self.front.pinyin_label.hidden = not show_answer
+        self.front.english_label.hidden = not show_answer
         if show_answer:
-            self.group.append(question_label)
-            self.group.append(pinyin_label)
-            self.group.append(english_label)
-            print("show_answer is True")
-        else:
-            self.group.append(question_label)
+            log.debug("show_answer is True")
         
-        return self.refresh()
+        with memory_profiler.phase("refresh"):
+            return self.refresh()
     
+    @traced("eink.show_stats")
+    def show_stats(self, lines):
+        """Show lines of statistics in place of the card"""
+        if not self.display or not self._ensure_font():
+            return False
+
+        if self.stats_label is None:
+            from adafruit_display_text import label
+            self.stats_label = label.Label(self.font, text="", color=0xFFFFFF,
+                                           x=STATS_POSITION[0], y=STATS_POSITION[1],
+                                           scale=1, line_spacing=1.0)
+            self.stats_group = displayio.Group()
+            self.stats_group.append(self.stats_label)
+        self.stats_label.text = "\n".join(lines)
+
+        if len(self.group) != 1 or self.group[0] is not self.stats_group:
+            self._clear_display()
+            self.group.append(self.stats_group)
+
+        with memory_profiler.phase("refresh"):
+            return self.refresh()
+
     def cleanup(self):
         """Clean up resources"""
         try:
@@ -181,10 +314,12 @@ class EInkDisplay:
 
     def _show_startup_screen(self):
         """Show initial startup screen"""
-        if not self.display or not self.font:
+        if not self.display or not self._ensure_font():
             return False
             
         self._clear_display()
+
+        from adafruit_display_text import label
             
         title = label.Label(
             self.font, 
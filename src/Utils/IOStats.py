@@ -0,0 +1,157 @@
+"""
+File I/O accounting for MiniAnki
+Counts bytes and calls going to the SD card so storage layouts can be compared
+"""
+
+from Utils.Logger import log
+
+
+def _byte_len(data):
+    """Length of data in bytes as it is stored on disk"""
+    if isinstance(data, str):
+        return len(data.encode("utf-8"))
+    return len(data)
+
+
+class CountingFile:
+    """File wrapper that reports every read and write to an IOStats"""
+
+    def __init__(self, stats, path, f):
+        self.stats = stats
+        self.path = path
+        self.file = f
+        self.closed = False
+
+    def read(self, *args):
+        data = self.file.read(*args)
+        self.stats.add_read(self.path, _byte_len(data))
+        return data
+
+    def readline(self, *args):
+        data = self.file.readline(*args)
+        self.stats.add_read(self.path, _byte_len(data))
+        return data
+
+    def readinto(self, buffer, *args):
+        count = self.file.readinto(buffer, *args)
+        self.stats.add_read(self.path, count or 0)
+        return count
+
+    def write(self, data):
+        self.stats.add_write(self.path, _byte_len(data))
+        return self.file.write(data)
+
+    def seek(self, *args):
+        return self.file.seek(*args)
+
+    def tell(self):
+        return self.file.tell()
+
+    def flush(self):
+        return self.file.flush()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.stats.closes += 1
+            self.file.close()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+class IOStats:
+    def __init__(self):
+        """Initialize all counters to zero"""
+        self.reset()
+
+    def reset(self):
+        """Reset all counters"""
+        self.opens = 0
+        self.closes = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.read_calls = 0
+        self.write_calls = 0
+        self.reviews = 0
+        # Per path: [bytes read, bytes written]
+        self.files = {}
+
+    def open(self, path, mode="r", **kwargs):
+        """Open a file like the builtin open, counting all I/O on it"""
+        f = open(path, mode, **kwargs)
+        self.opens += 1
+        return CountingFile(self, path, f)
+
+    def add_read(self, path, count):
+        self.read_calls += 1
+        self.bytes_read += count
+        self._file_stats(path)[0] += count
+
+    def add_write(self, path, count):
+        self.write_calls += 1
+        self.bytes_written += count
+        self._file_stats(path)[1] += count
+
+    def add_review(self):
+        """Count a review, the denominator of write amplification"""
+        self.reviews += 1
+
+    def _file_stats(self, path):
+        stats = self.files.get(path)
+        if stats is None:
+            stats = self.files[path] = [0, 0]
+        return stats
+
+    def write_amplification(self):
+        """
+        Bytes written per review
+
+        Returns:
+            float: bytes written per review, or None before the first review
+        """
+        if not self.reviews:
+            return None
+        return self.bytes_written / self.reviews
+
+    def report(self):
+        """Return the counters as a dictionary"""
+        return {
+            "opens": self.opens,
+            "closes": self.closes,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "read_calls": self.read_calls,
+            "write_calls": self.write_calls,
+            "reviews": self.reviews,
+            "write_amplification": self.write_amplification()
+        }
+
+    def report_lines(self):
+        """Format the counters as text lines"""
+        lines = [f"io {key}: {value}" for key, value in self.report().items()]
+        for path, (read, written) in self.files.items():
+            lines.append(f"io {path}: read={read} written={written}")
+        return lines
+
+    def dump(self):
+        """Print the counters to serial"""
+        for line in self.report_lines():
+            log.info(line)
+
+
+# Shared counters for all file access on the device
+io_stats = IOStats()
@@ -0,0 +1,75 @@
+"""
+Leveled logging for MiniAnki
+Messages are only formatted when their level is enabled
+"""
+
+from Utils.Constants import *
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+
+LEVELS = {
+    "debug": DEBUG,
+    "info": INFO,
+    "warning": WARNING,
+    "error": ERROR,
+    "off": OFF
+}
+
+
+class Logger:
+    def __init__(self, level=LOG_LEVEL):
+        """Initialize the logger at the given level name or number"""
+        self.level = INFO
+        self.set_level(level)
+
+    def set_level(self, level):
+        """
+        Change the minimum level that is emitted
+
+        Args:
+            level: level number or name ("debug", "info", "warning", "error", "off")
+        """
+        if isinstance(level, str):
+            level = LEVELS[level.lower()]
+        self.level = level
+
+    def level_name(self):
+        """Return the name of the current level"""
+        for name, value in LEVELS.items():
+            if value == self.level:
+                return name
+        return str(self.level)
+
+    def enabled_for(self, level):
+        """Check whether a message at this level would be emitted"""
+        return level >= self.level
+
+    def _emit(self, prefix, message, args):
+        # Formatting only happens here, after the level check
+        if args:
+            message = message % args
+        print(prefix + message)
+
+    def debug(self, message, *args):
+        if self.level <= DEBUG:
+            self._emit("", message, args)
+
+    def info(self, message, *args):
+        if self.level <= INFO:
+            self._emit("", message, args)
+
+    def warning(self, message, *args):
+        if self.level <= WARNING:
+            self._emit("WARNING: ", message, args)
+
+    def error(self, message, *args):
+        if self.level <= ERROR:
+            self._emit("ERROR: ", message, args)
+
+
+# Shared logger, its level can be changed at runtime
+log = Logger()
@@ -0,0 +1,164 @@
+"""
+Memory profiling for MiniAnki
+Records free/allocated heap around each main loop phase
+"""
+
+import gc
+from Utils.Constants import *
+from Utils.Logger import log
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+def _memory_usage():
+    """
+    Get the current heap usage
+
+    Returns:
+        tuple: (bytes allocated, bytes free), free is None on the host
+    """
+    if hasattr(gc, "mem_alloc"):
+        return gc.mem_alloc(), gc.mem_free()
+    if tracemalloc and tracemalloc.is_tracing():
+        return tracemalloc.get_traced_memory()[0], None
+    return 0, None
+
+
+class _NoPhase:
+    """Stand-in returned when profiling is disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NO_PHASE = _NoPhase()
+
+
+class _Phase:
+    """Context manager measuring one phase"""
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.before = 0
+
+    def __enter__(self):
+        self.before = _memory_usage()[0]
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.record(self.name, self.before)
+        return False
+
+
+class MemoryProfiler:
+    def __init__(self, enabled=MEMORY_PROFILING, size=MEMORY_PROFILE_SIZE):
+        """Initialize the profiler with a ring buffer of the given size"""
+        self.enabled = False
+        self.size = size
+        self.clear()
+        if enabled:
+            self.enable()
+
+    def enable(self):
+        """Start recording phases"""
+        if not hasattr(gc, "mem_alloc") and tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.enabled = True
+
+    def disable(self):
+        """Stop recording phases, collected data is kept"""
+        self.enabled = False
+
+    def clear(self):
+        """Forget all recorded phases"""
+        # Each entry is (phase, allocated before, allocated after, free after)
+        self.records = [None] * self.size
+        self.index = 0
+        self.count = 0
+        self.high_water = 0
+        self.lowest_free = None
+        self.phases = {}
+
+    def phase(self, name):
+        """
+        Measure a phase with a with-statement
+
+        Example:
+            with memory_profiler.phase("load_cards"):
+                cards = self.load_cards()
+        """
+        if not self.enabled:
+            return _NO_PHASE
+        return _Phase(self, name)
+
+    def record(self, name, before):
+        """Store a finished phase in the ring buffer and update the totals"""
+        after, free = _memory_usage()
+        self.records[self.index] = (name, before, after, free)
+        self.index = (self.index + 1) % self.size
+        self.count += 1
+
+        if after > self.high_water:
+            self.high_water = after
+        if free is not None and (self.lowest_free is None or free < self.lowest_free):
+            self.lowest_free = free
+
+        # Per phase: calls, total delta, largest delta
+        delta = after - before
+        stats = self.phases.get(name)
+        if stats is None:
+            self.phases[name] = [1, delta, delta]
+        else:
+            stats[0] += 1
+            stats[1] += delta
+            if delta > stats[2]:
+                stats[2] = delta
+
+    def recent(self):
+        """Return the buffered records, oldest first"""
+        if self.count < self.size:
+            return self.records[:self.count]
+        return self.records[self.index:] + self.records[:self.index]
+
+    def report_lines(self):
+        """Format the collected data as text lines"""
+        lines = [f"memory high water: {self.high_water} bytes allocated"]
+        if self.lowest_free is not None:
+            lines.append(f"memory low water: {self.lowest_free} bytes free")
+        for name, (calls, total, largest) in self.phases.items():
+            lines.append(f"phase {name}: calls={calls} total_delta={total} max_delta={largest}")
+        for name, before, after, free in self.recent():
+            lines.append(f"{name}: {before} -> {after} ({after - before:+d}) free={free}")
+        return lines
+
+    def dump(self):
+        """Print the report to serial"""
+        for line in self.report_lines():
+            log.info(line)
+
+    def dump_to_file(self, path=MEMORY_PROFILE_PATH):
+        """
+        Append the report to a file, e.g. on the SD card
+
+        Returns:
+            bool: True if the report was written
+        """
+        try:
+            with open(path, "a") as f:
+                for line in self.report_lines():
+                    f.write(line + "\n")
+            return True
+        except Exception as e:
+            log.error("Error writing memory profile: %s", e)
+            return False
+
+
+# Shared profiler so display and scheduler phases land in one buffer
+memory_profiler = MemoryProfiler()
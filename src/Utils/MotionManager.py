@@ -0,0 +1,81 @@
+"""
+Presence detection for MiniAnki
+Reads a PIR sensor and remembers recent motion, so cards are only shown
+while someone is around
+"""
+
+import time
+import digitalio
+from Utils.Constants import *
+from Utils.Logger import log
+
+
+class MotionManager:
+    def __init__(self, pir_pin=PIR_PIN, timeout=MOTION_TIMEOUT_SEC):
+        """
+        Initialize the PIR sensor
+
+        Args:
+            pir_pin: pin name of the sensor output
+            timeout: seconds without motion before the room counts as empty
+        """
+        self.pin_name = pir_pin
+        self.timeout = timeout
+        # Count as present at boot so the first card is shown right away
+        self.present = True
+        self.last_motion_time = time.monotonic()
+        self._setup_sensor()
+        log.info("Motion manager initialized")
+
+    def _setup_sensor(self):
+        """Claim the sensor pin as an input, pulled low so an unconnected pin reads no motion"""
+        self.pir_sensor = digitalio.DigitalInOut(pin(self.pin_name))
+        self.pir_sensor.direction = digitalio.Direction.INPUT
+        self.pir_sensor.pull = digitalio.Pull.DOWN
+
+    def motion_detected(self):
+        """Check the sensor output, high while it sees motion"""
+        return self.pir_sensor.value
+
+    def mark_present(self):
+        """Record presence seen another way, e.g. a button press"""
+        self.last_motion_time = time.monotonic()
+        if not self.present:
+            log.info("Presence detected - resuming")
+        self.present = True
+
+    def is_present(self):
+        """
+        Update the presence state from the sensor
+
+        Returns:
+            bool: True if there was motion within the timeout
+        """
+        current_time = time.monotonic()
+        if self.motion_detected():
+            self.mark_present()
+        elif self.present and current_time - self.last_motion_time > self.timeout:
+            log.info("No motion for %ss - pausing", self.timeout)
+            self.present = False
+        return self.present
+
+    def create_pin_alarm(self, alarm):
+        """
+        Release the sensor pin and return an alarm firing on motion
+
+        Call restore_sensor() after sleeping to read the sensor again.
+
+        Args:
+            alarm: the alarm module
+        """
+        self.pir_sensor.deinit()
+        # pull=True pulls the pin away from the alarm value, i.e. low
+        return alarm.pin.PinAlarm(pin(self.pin_name), value=True, pull=True)
+
+    def restore_sensor(self):
+        """Reclaim the sensor pin after sleeping on its alarm"""
+        self._setup_sensor()
+
+    def cleanup(self):
+        """Clean up resources"""
+        self.pir_sensor.deinit()
@@ -0,0 +1,158 @@
+"""
+Power management for MiniAnki
+Sleeps until the next card is due, lowers the CPU clock while idle and
+estimates the average current draw
+"""
+
+import time
+from Utils.Constants import *
+from Utils.Logger import log
+from Utils.Tracer import traced
+
+try:
+    import alarm
+except ImportError:
+    # Host simulator: sleep in short steps and poll the buttons instead
+    alarm = None
+
+
+def _usb_connected():
+    """Check if a host is on the USB port, which may type console commands"""
+    try:
+        import supervisor
+        return supervisor.runtime.usb_connected
+    except (ImportError, AttributeError):
+        # Host simulator: the console is stdin
+        return True
+
+
+class PowerManager:
+    def __init__(self, button_manager, motion_manager=None):
+        """Initialize power management for the given buttons and PIR sensor"""
+        self.button_manager = button_manager
+        self.motion_manager = motion_manager
+        self.start_time = time.monotonic()
+        self.sleep_seconds = 0.0
+        self.low_clock_seconds = 0.0
+        self.full_frequency = None
+        # Called between sleep steps while USB is connected, e.g. to poll the console
+        self.idle_callback = None
+
+        try:
+            import microcontroller
+            self.cpu = microcontroller.cpu
+            self.full_frequency = self.cpu.frequency
+        except (ImportError, AttributeError):
+            self.cpu = None
+
+    def _set_frequency(self, frequency):
+        """Change the CPU clock where the port allows it"""
+        if self.cpu is None or not frequency:
+            return False
+        try:
+            self.cpu.frequency = frequency
+            return True
+        except (AttributeError, NotImplementedError, ValueError):
+            return False
+
+    @traced("power.sleep_until")
+    def sleep_until(self, deadline, wake_on_motion=False):
+        """
+        Sleep until the deadline (time.monotonic()) or a button press
+
+        Serial input cannot wake the board, so while USB is connected the
+        sleep is cut into CONSOLE_IDLE_STEP_SEC steps with idle_callback
+        run in between.
+
+        Args:
+            wake_on_motion: also wake when the PIR sensor sees motion
+
+        Returns:
+            bool: True if woken by a button or motion, False if the deadline was reached
+        """
+        start = time.monotonic()
+        if deadline <= start:
+            return False
+        motion = self.motion_manager if wake_on_motion else None
+
+        low_clock = self._set_frequency(IDLE_CPU_FREQUENCY)
+        try:
+            while True:
+                step = deadline
+                if self.idle_callback is not None and _usb_connected():
+                    step = min(deadline, time.monotonic() + CONSOLE_IDLE_STEP_SEC)
+                if alarm is not None:
+                    pressed = self._light_sleep(step, motion)
+                else:
+                    pressed = self._poll(step, motion)
+                if pressed or step >= deadline:
+                    break
+                self.idle_callback()
+        finally:
+            if low_clock:
+                self._set_frequency(self.full_frequency)
+
+        slept = time.monotonic() - start
+        self.sleep_seconds += slept
+        if low_clock:
+            self.low_clock_seconds += slept
+        return pressed
+
+    def _light_sleep(self, deadline, motion):
+        """Light sleep on a time alarm and one pin alarm per button and sensor"""
+        pin_alarms = self.button_manager.create_pin_alarms(alarm)
+        if motion is not None:
+            pin_alarms.append(motion.create_pin_alarm(alarm))
+        try:
+            time_alarm = alarm.time.TimeAlarm(monotonic_time=deadline)
+            woken_by = alarm.light_sleep_until_alarms(time_alarm, *pin_alarms)
+        finally:
+            # PinAlarms hold the pins until they are released
+            for pin_alarm in pin_alarms:
+                if hasattr(pin_alarm, "deinit"):
+                    pin_alarm.deinit()
+            self.button_manager.restore_buttons()
+            if motion is not None:
+                motion.restore_sensor()
+        return isinstance(woken_by, alarm.pin.PinAlarm)
+
+    def _poll(self, deadline, motion):
+        """Sleep in short steps, checking the buttons and sensor in between"""
+        while time.monotonic() < deadline:
+            if self.button_manager.is_any_button_pressed():
+                return True
+            if motion is not None and motion.motion_detected():
+                return True
+            time.sleep(min(IDLE_POLL_SEC, max(0, deadline - time.monotonic())))
+        return False
+
+    def estimated_current_ma(self):
+        """
+        Average current draw since start from time spent in each state
+
+        Returns:
+            float: estimated mA, i.e. mAh used per hour
+        """
+        elapsed = time.monotonic() - self.start_time
+        if elapsed <= 0:
+            return ACTIVE_CURRENT_MA
+        active = max(0.0, elapsed - self.sleep_seconds)
+        charge = active * ACTIVE_CURRENT_MA + self.sleep_seconds * SLEEP_CURRENT_MA
+        return charge / elapsed
+
+    def report(self):
+        """Return the power figures as a dictionary"""
+        elapsed = time.monotonic() - self.start_time
+        return {
+            "uptime_s": elapsed,
+            "sleep_s": self.sleep_seconds,
+            "low_clock_s": self.low_clock_seconds,
+            "sleep_ratio": self.sleep_seconds / elapsed if elapsed > 0 else 0.0,
+            "estimated_ma": self.estimated_current_ma()
+        }
+
+    def dump(self):
+        """Log the power figures"""
+        report = self.report()
+        log.info("Power: %.0fs up, %.0f%% asleep, ~%.1f mAh per hour",
+                 report["uptime_s"], report["sleep_ratio"] * 100, report["estimated_ma"])
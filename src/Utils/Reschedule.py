@@ -0,0 +1,140 @@
+"""
+Bulk rescheduling for MiniAnki
+Card transforms applied in a single pass over the hot cards and the cold tier
+"""
+
+import heapq
+
+from Utils.Constants import *
+from Utils.ColdStore import due_time
+
+
+def card_filter(current_time, overdue=False, min_interval=None, max_interval=None, card_ids=None):
+    """
+    Build a predicate selecting a subset of cards
+
+    Args:
+        overdue: only cards due at current_time
+        min_interval: only cards with at least this interval
+        max_interval: only cards with less than this interval
+        card_ids: only these cards (hanzi)
+
+    Returns:
+        function: card -> bool
+    """
+    def matches(card):
+        if card_ids is not None and card.hanzi not in card_ids:
+            return False
+        if overdue:
+            due = due_time(card)
+            if due is None or due > current_time:
+                return False
+        if min_interval is not None and card.interval < min_interval:
+            return False
+        if max_interval is not None and card.interval >= max_interval:
+            return False
+        return True
+    return matches
+
+
+def overdue_cutoff(cards, current_time, count=BACKLOG_DAILY_LIMIT):
+    """
+    Find the due time separating the count most overdue cards from the rest
+
+    Only a bounded heap of count due times is kept, so the cards can be
+    streamed from the cold tier.
+
+    Returns:
+        tuple: (cutoff due time, number of cards due exactly at the cutoff
+            among the most overdue), or None if no more than count cards are overdue
+    """
+    # Negated due times: the root is the least overdue card kept
+    heap = []
+    overdue = 0
+    for card in cards:
+        due = due_time(card)
+        if due is None or due > current_time:
+            continue
+        overdue += 1
+        if len(heap) < count:
+            heapq.heappush(heap, -due)
+        elif heap and -due > heap[0]:
+            heapq.heapreplace(heap, -due)
+    if overdue <= count:
+        return None
+    if not heap:
+        return (None, 0)
+    cutoff = -heap[0]
+    return (cutoff, sum(1 for due in heap if -due == cutoff))
+
+
+def spread_backlog(current_time, days, cutoff):
+    """
+    Transform spreading overdue cards over the next days
+
+    The most overdue cards, due before the cutoff of overdue_cutoff(), stay
+    due now; the rest go round-robin to days 1 to days - 1 in pass order.
+    The interval is kept and last_review moved, so the next review still
+    grows from the same interval.
+
+    Args:
+        cutoff: result of overdue_cutoff() over the same cards
+
+    Returns:
+        function: card -> bool (True if the card changed)
+    """
+    keep_before, ties = cutoff
+    state = [0, ties]
+
+    def transform(card):
+        due = due_time(card)
+        if due is None or due > current_time:
+            return False
+        if keep_before is not None:
+            if due < keep_before:
+                return False
+            if due == keep_before and state[1] > 0:
+                state[1] -= 1
+                return False
+        index = state[0]
+        state[0] += 1
+        day = 1 + index % (days - 1)
+        # Keep the order within the day stable but not all at the same second
+        offset = day * SECONDS_PER_DAY + index // (days - 1)
+        card.last_review = current_time + offset - card.interval
+        return True
+    return transform
+
+
+def postpone(factor, matches):
+    """
+    Transform stretching the interval of the selected cards
+
+    The due time moves by the same factor, counted from the last review.
+
+    Returns:
+        function: card -> bool (True if the card changed)
+    """
+    def transform(card):
+        if card.last_review is None or not matches(card):
+            return False
+        card.interval = max(MIN_INTERVAL, min(MAX_INTERVAL, int(card.interval * factor)))
+        return True
+    return transform
+
+
+def reset(matches):
+    """
+    Transform turning the selected cards back into new cards
+
+    Returns:
+        function: card -> bool (True if the card changed)
+    """
+    def transform(card):
+        if card.last_review is None or not matches(card):
+            return False
+        card.interval = MIN_INTERVAL
+        card.last_review = None
+        card.review_count = 0
+        return True
+    return transform
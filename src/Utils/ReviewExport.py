@@ -0,0 +1,150 @@
+"""
+Append-only review history for MiniAnki
+Every review is kept in a compact binary file on the SD card for
+review_ingest.py, unlike the deck files and the review ring which only keep
+the latest state of each card
+"""
+
+import json
+import struct
+from Utils.Constants import *
+from Utils.IOStats import io_stats
+from Utils.Logger import log
+from Utils.BoardId import board_id
+
+FILE_MAGIC = b"MRX1"
+RECORD_MAGIC = 0xA5
+# magic, payload length
+RECORD_HEADER_FORMAT = "<BH"
+# boot, sequence within the boot, review time, new interval, previous
+# interval, review count, response; followed by the deck and card names
+RECORD_FORMAT = "<IIdIIHB"
+
+
+def _pack_name(text):
+    data = text.encode("utf-8")[:255]
+    return bytes([len(data)]) + data
+
+
+class ReviewExport:
+    def __init__(self, path=REVIEW_EXPORT_PATH, state_path=REVIEW_EXPORT_STATE_PATH):
+        """Initialize the export, call open() before use"""
+        self.path = path
+        self.state_path = state_path
+        # Boot number and sequence within the boot identify a record, so
+        # the same file can be ingested again without duplicates
+        self.boot = 0
+        self.sequence = 0
+        self.buffer = bytearray()
+        self.ready = False
+
+    def open(self):
+        """
+        Start a new boot in the export, creating the file on first use
+
+        Returns:
+            bool: True if reviews can be exported
+        """
+        boot = None
+        try:
+            with io_stats.open(self.state_path, "r") as f:
+                boot = json.loads(f.read())["boot"] + 1
+        except OSError:
+            pass
+        except Exception as e:
+            log.error("Error loading review export state: %s", e)
+        if boot is None:
+            # Without the state, continue after the boots already in the file
+            last = self.last_boot()
+            boot = 0 if last is None else last + 1
+        self.boot = boot
+
+        try:
+            with io_stats.open(self.state_path, "w") as f:
+                f.write(json.dumps({"boot": self.boot}))
+            try:
+                with io_stats.open(self.path, "rb") as f:
+                    if f.read(len(FILE_MAGIC)) != FILE_MAGIC:
+                        raise ValueError("not a review export")
+            except OSError:
+                with io_stats.open(self.path, "wb") as f:
+                    f.write(FILE_MAGIC + _pack_name(board_id()))
+        except Exception as e:
+            log.error("Review export unavailable: %s", e)
+            return False
+
+        self.ready = True
+        log.info("Review export boot %d", self.boot)
+        return True
+
+    def last_boot(self):
+        """
+        Highest boot number in the file, reading only the record headers
+
+        Returns:
+            int: the boot, or None if the file is missing or has no records
+        """
+        header_size = struct.calcsize(RECORD_HEADER_FORMAT)
+        boot = None
+        try:
+            with io_stats.open(self.path, "rb") as f:
+                if f.read(len(FILE_MAGIC)) != FILE_MAGIC:
+                    return None
+                name = f.read(1)
+                if not name:
+                    return None
+                f.seek(name[0], 1)
+                while True:
+                    header = f.read(header_size)
+                    if len(header) < header_size:
+                        break
+                    magic, length = struct.unpack(RECORD_HEADER_FORMAT, header)
+                    data = f.read(4)
+                    # A record cut short by a power loss ends the file
+                    if magic != RECORD_MAGIC or length < 4 or len(data) < 4:
+                        break
+                    record_boot = struct.unpack("<I", data)[0]
+                    if boot is None or record_boot > boot:
+                        boot = record_boot
+                    f.seek(length - 4, 1)
+        except OSError:
+            return None
+        return boot
+
+    def add(self, card, prev_interval, response):
+        """Buffer one review, written out by flush()"""
+        if not self.ready:
+            return
+        payload = (struct.pack(RECORD_FORMAT, self.boot, self.sequence, card.last_review,
+                               int(card.interval), int(prev_interval), card.review_count, response)
+                   + _pack_name(card.deck or "") + _pack_name(card.hanzi))
+        self.buffer += struct.pack(RECORD_HEADER_FORMAT, RECORD_MAGIC, len(payload)) + payload
+        self.sequence += 1
+        if len(self.buffer) >= SD_BLOCK_SIZE:
+            self.flush()
+
+    def flush(self):
+        """
+        Append the buffered reviews to the file
+
+        Called with the deck saves, so a power cut loses at most the reviews
+        since the last save from the history; their card state is in the
+        review ring.
+
+        Returns:
+            bool: True if nothing is left in the buffer
+        """
+        if not self.buffer:
+            return True
+        try:
+            with io_stats.open(self.path, "ab") as f:
+                f.write(self.buffer)
+            self.buffer = bytearray()
+            return True
+        except OSError as e:
+            log.error("Error writing review export: %s", e)
+            if len(self.buffer) > SD_BLOCK_SIZE * 4:
+                # Keep RAM for the reviews, the history gets a gap
+                log.warning("Dropping %d bytes of review history", len(self.buffer))
+                self.buffer = bytearray()
+            return False
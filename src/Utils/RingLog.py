@@ -0,0 +1,253 @@
+"""
+Wear-aware review log for MiniAnki
+A preallocated file of fixed-size slots written round-robin on the SD card
+"""
+
+import struct
+from binascii import crc32
+from Utils.Constants import *
+from Utils.IOStats import io_stats
+from Utils.Logger import log
+
+RECORD_MAGIC = b"MR"
+# magic, record type, reserved, sequence number, payload length
+HEADER_FORMAT = "<2sBBIH"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+# interval, last_review (NEVER_REVIEWED for never), review_count, response
+REVIEW_FORMAT = "<IdHB"
+REVIEW_SIZE = struct.calcsize(REVIEW_FORMAT)
+
+RECORD_REVIEW = 1
+# Written after a deck is saved: every earlier review of the deck is in its file
+RECORD_CHECKPOINT = 2
+
+
+def _pack_name(text):
+    data = text.encode("utf-8")[:255]
+    return bytes([len(data)]) + data
+
+
+def _unpack_name(payload, offset):
+    length = payload[offset]
+    return str(payload[offset + 1:offset + 1 + length], "utf-8"), offset + 1 + length
+
+
+def _unpack_review(payload):
+    """
+    Decode a review record
+
+    Returns:
+        tuple: (deck, card id, interval, last_review, review_count, response)
+    """
+    interval, last_review, review_count, response = struct.unpack_from(REVIEW_FORMAT, payload, 0)
+    deck, offset = _unpack_name(payload, REVIEW_SIZE)
+    card_id, _ = _unpack_name(payload, offset)
+    return (deck, card_id, interval, None if last_review == NEVER_REVIEWED else last_review,
+            review_count, response)
+
+
+class RingLog:
+    def __init__(self, path=RING_LOG_PATH, slots=RING_SLOTS, slot_size=RING_SLOT_SIZE):
+        """Initialize the log, call open() before use"""
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+        self.file = None
+        # Slot the next record goes to and its sequence number
+        self.head = 0
+        self.sequence = 0
+
+    def open(self):
+        """
+        Open the log file, preallocating it on first use, and find the newest record
+
+        Returns:
+            bool: True if the log can be written
+        """
+        try:
+            self.file = io_stats.open(self.path, "r+b")
+            self.file.seek(0, 2)
+            if self.file.tell() != self.slots * self.slot_size:
+                self.file.close()
+                self.file = None
+        except OSError:
+            self.file = None
+
+        if self.file is None:
+            if not self._preallocate():
+                return False
+            self.file = io_stats.open(self.path, "r+b")
+
+        self._find_head()
+        log.info("Review log at slot %d, sequence %d", self.head, self.sequence)
+        return True
+
+    def _preallocate(self):
+        """Create the log at its final size so writes never grow the file"""
+        try:
+            empty = b"\xff" * self.slot_size
+            with io_stats.open(self.path, "wb") as f:
+                for _ in range(self.slots):
+                    f.write(empty)
+            return True
+        except OSError as e:
+            log.error("Error creating review log: %s", e)
+            return False
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def _read_slot(self, slot):
+        """
+        Read and verify one slot
+
+        Returns:
+            tuple: (record type, sequence, payload), or None if empty or torn
+        """
+        self.file.seek(slot * self.slot_size)
+        data = self.file.read(self.slot_size)
+        if len(data) < HEADER_SIZE + 4:
+            return None
+        magic, record_type, _, sequence, length = struct.unpack_from(HEADER_FORMAT, data, 0)
+        end = HEADER_SIZE + length
+        if magic != RECORD_MAGIC or end + 4 > len(data):
+            return None
+        if struct.unpack_from("<I", data, end)[0] != crc32(memoryview(data)[:end]):
+            return None
+        return record_type, sequence, data[HEADER_SIZE:end]
+
+    def _find_head(self):
+        """
+        Locate the newest record with a binary search over the slots
+
+        Slots before the head belong to the current pass and have sequence
+        numbers at least that of slot 0; the rest are older or empty. A
+        write torn at slot 0 after the ring wrapped leaves the previous pass
+        in slots 1 and up, so the search starts there and the numbering
+        continues from it.
+        """
+        anchor = 0
+        first = self._read_slot(0)
+        if first is None and self.slots > 1:
+            anchor = 1
+            first = self._read_slot(1)
+        if first is None:
+            self.head = 0
+            self.sequence = 0
+            return
+
+        low, high = anchor, self.slots - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            record = self._read_slot(middle)
+            if record is not None and record[1] >= first[1]:
+                low = middle
+            else:
+                high = middle - 1
+
+        newest = self._read_slot(low)
+        self.head = (low + 1) % self.slots
+        self.sequence = newest[1] + 1
+
+    def append(self, record_type, payload):
+        """
+        Write a record to the next slot
+
+        Returns:
+            bool: True if the record was written and flushed
+        """
+        if self.file is None or HEADER_SIZE + len(payload) + 4 > self.slot_size:
+            return False
+
+        record = struct.pack(HEADER_FORMAT, RECORD_MAGIC, record_type, 0,
+                             self.sequence, len(payload)) + payload
+        record += struct.pack("<I", crc32(record))
+        try:
+            # Whole slots keep every write sector aligned
+            self.file.seek(self.head * self.slot_size)
+            self.file.write(record + b"\xff" * (self.slot_size - len(record)))
+            self.file.flush()
+        except OSError as e:
+            log.error("Error writing review log: %s", e)
+            return False
+
+        self.head = (self.head + 1) % self.slots
+        self.sequence += 1
+        return True
+
+    def append_review(self, card, response):
+        """Log the card's state after a review"""
+        last_review = NEVER_REVIEWED if card.last_review is None else card.last_review
+        payload = (struct.pack(REVIEW_FORMAT, int(card.interval), last_review,
+                               card.review_count, response)
+                   + _pack_name(card.deck or "") + _pack_name(card.hanzi))
+        return self.append(RECORD_REVIEW, payload)
+
+    def append_checkpoint(self, deck):
+        """Log that a deck file now contains all of its earlier reviews"""
+        return self.append(RECORD_CHECKPOINT, _pack_name(deck))
+
+    def recover(self):
+        """
+        Collect reviews logged after each deck's last checkpoint
+
+        Walks backwards from the head, so only the records since the last
+        saves are read.
+
+        Returns:
+            dict: deck name -> list of (card id, interval, last_review,
+                review_count, response), oldest first
+        """
+        pending = {}
+        saved_decks = set()
+        slot = self.head
+        previous_sequence = self.sequence
+
+        for _ in range(self.slots):
+            slot = (slot - 1) % self.slots
+            record = self._read_slot(slot)
+            # Stop at empty slots, torn writes and the previous pass
+            if record is None or record[1] >= previous_sequence:
+                break
+            record_type, previous_sequence, payload = record
+
+            if record_type == RECORD_CHECKPOINT:
+                saved_decks.add(_unpack_name(payload, 0)[0])
+            elif record_type == RECORD_REVIEW:
+                review = _unpack_review(payload)
+                if review[0] not in saved_decks:
+                    pending.setdefault(review[0], []).append(review[1:])
+
+        for reviews in pending.values():
+            reviews.reverse()
+        return pending
+
+    def reviews_since(self, sequence):
+        """
+        Collect every review with a sequence number of at least sequence
+
+        Returns:
+            list: (sequence, deck, card id, interval, last_review,
+                review_count, response), oldest first, or None if the ring
+                no longer holds all of them
+        """
+        if sequence > self.sequence:
+            # The log was recreated since
+            return None
+        if self.sequence - sequence > self.slots:
+            return None
+
+        reviews = []
+        slot = self.head
+        for expected in range(self.sequence - 1, sequence - 1, -1):
+            slot = (slot - 1) % self.slots
+            record = self._read_slot(slot)
+            if record is None or record[1] != expected:
+                return None
+            if record[0] == RECORD_REVIEW:
+                reviews.append((expected,) + _unpack_review(record[2]))
+
+        reviews.reverse()
+        return reviews
@@ -0,0 +1,447 @@
+"""
+Card schedulers for MiniAnki
+Each deck has a scheduler that grades its cards, picks its next card and
+knows when its next card is due
+"""
+
+import heapq
+from Utils.Constants import *
+from Utils.Logger import log
+
+
+def overdue_factor(card, current_time):
+    """
+    Rank of a card against cards of other decks, higher goes first
+
+    Returns:
+        float: time since the last review in intervals, NEW_CARD_PRIORITY for new cards
+    """
+    if card.last_review is None:
+        return NEW_CARD_PRIORITY
+    return (current_time - card.last_review) / max(card.interval, 1)
+
+
+def _insert_ranked(ranked, factor, card, count):
+    """Keep the count highest ranked (factor, card) pairs, earlier cards first on ties"""
+    position = len(ranked)
+    while position > 0 and ranked[position - 1][0] < factor:
+        position -= 1
+    if position < count:
+        ranked.insert(position, (factor, card))
+        del ranked[count:]
+
+
+class Scheduler:
+    """
+    Interface of a deck scheduler
+
+    The cards stay Flashcard objects owned by the deck; a scheduler only
+    changes interval and last_review and may keep its own index of them.
+    """
+
+    name = None
+
+    def rebuild(self, cards, current_time):
+        """Index a deck's hot cards from scratch, after loading or promoting cards"""
+        raise NotImplementedError
+
+    def remove_card(self, card):
+        """Forget a card that left the hot set"""
+        raise NotImplementedError
+
+    def grade(self, card, response, current_time):
+        """Reschedule a card after a review"""
+        raise NotImplementedError
+
+    def next_card(self, current_time):
+        """
+        Return the card to review now
+
+        Returns:
+            Flashcard: the due card to show first, or None if none is due
+        """
+        raise NotImplementedError
+
+    def next_due_time(self, current_time):
+        """
+        Earliest time at which next_card could return a card
+
+        Returns:
+            float: time.monotonic() value, or None if the scheduler has no cards
+        """
+        raise NotImplementedError
+
+    def predict(self, current_card, predict_time, count):
+        """
+        Rank the cards next_card would return at predict_time
+
+        Returns:
+            list: up to count (overdue factor, card) pairs, best first
+        """
+        raise NotImplementedError
+
+
+class MultiplierScheduler(Scheduler):
+    """
+    Interval times a per-response multiplier, the most overdue card first
+
+    Selection scans the deck, which is fine for the hot set in RAM.
+    """
+
+    name = "multiplier"
+
+    def __init__(self, multiplier):
+        """
+        Args:
+            multiplier: function(card, response) -> interval multiplier
+        """
+        self.multiplier = multiplier
+        self.cards = []
+
+    def rebuild(self, cards, current_time):
+        # The deck's own list, so cards added or removed by the deck are seen
+        self.cards = cards
+
+    def remove_card(self, card):
+        pass
+
+    def grade(self, card, response, current_time):
+        interval = int(card.interval * self.multiplier(card, response))
+        card.interval = max(MIN_INTERVAL, min(MAX_INTERVAL, interval))
+        card.last_review = current_time
+
+    def next_card(self, current_time):
+        best = None
+        best_factor = 0
+        for card in self.cards:
+            if card.last_review is not None and current_time - card.last_review < card.interval:
+                continue
+            factor = overdue_factor(card, current_time)
+            if factor > best_factor:
+                best_factor = factor
+                best = card
+        return best
+
+    def next_due_time(self, current_time):
+        next_due = None
+        for card in self.cards:
+            if card.last_review is None:
+                return current_time
+            due = card.last_review + card.interval
+            if next_due is None or due < next_due:
+                next_due = due
+        return next_due
+
+    def predict(self, current_card, predict_time, count):
+        ranked = []
+        for card in self.cards:
+            if card is current_card:
+                continue
+            if card.last_review is not None and predict_time - card.last_review < card.interval:
+                continue
+            _insert_ranked(ranked, overdue_factor(card, predict_time), card, count)
+        return ranked
+
+
+class CardQueue:
+    """
+    FIFO of cards with lazy removal
+
+    Entries are [card, due] lists; removed cards have their entry's card set
+    to None and are skipped when they reach the front.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.head = 0
+
+    def push(self, entry):
+        self.entries.append(entry)
+
+    def front(self):
+        """First live entry, or None if the queue is empty"""
+        entries = self.entries
+        while self.head < len(entries) and entries[self.head][0] is None:
+            self.head += 1
+        if self.head >= len(entries):
+            self.entries = []
+            self.head = 0
+            return None
+        # Drop the skipped prefix once it is half the list
+        if self.head > 32 and self.head * 2 > len(entries):
+            del entries[:self.head]
+            self.head = 0
+        return entries[self.head]
+
+    def live(self):
+        """Iterate over the live entries, front first"""
+        for index in range(self.head, len(self.entries)):
+            entry = self.entries[index]
+            if entry[0] is not None:
+                yield entry
+
+
+class LeitnerScheduler(Scheduler):
+    """
+    Leitner boxes with one FIFO queue per box
+
+    A card's box follows from its interval, which is always one of
+    LEITNER_BOX_INTERVALS. All cards in a box share that interval, so cards
+    graded later are due later and each queue stays sorted by due time:
+    the front of each queue is its next due card. Picking and grading a
+    card only touch the queue fronts, O(1) in the deck size.
+
+    Cards reviewed "in the future", e.g. moved out by a backlog spread,
+    would break that order and wait in a small heap instead.
+    """
+
+    name = "leitner"
+
+    def __init__(self, box_intervals=LEITNER_BOX_INTERVALS, steps=LEITNER_STEPS):
+        """
+        Args:
+            box_intervals: interval of each box, increasing
+            steps: response -> boxes moved up, None moves the card back to the first box
+        """
+        self.box_intervals = box_intervals
+        self.steps = steps
+        self.new_cards = CardQueue()
+        self.boxes = [CardQueue() for _ in box_intervals]
+        # (due, order, entry) of cards with a last_review after the rebuild
+        self.deferred = []
+        # id(card) -> the card's live queue entry
+        self.entries = {}
+
+    def box_of(self, interval):
+        """Highest box whose interval is not above interval"""
+        box = 0
+        while box + 1 < len(self.box_intervals) and self.box_intervals[box + 1] <= interval:
+            box += 1
+        return box
+
+    def _queue(self, card, current_time):
+        """Add a card to the back of its queue"""
+        if card.last_review is None:
+            entry = [card, None]
+            self.new_cards.push(entry)
+        else:
+            entry = [card, card.last_review + card.interval]
+            if card.last_review > current_time:
+                heapq.heappush(self.deferred, (entry[1], len(self.entries), entry))
+            else:
+                self.boxes[self.box_of(card.interval)].push(entry)
+        self.entries[id(card)] = entry
+
+    def rebuild(self, cards, current_time):
+        """Sort the deck into the boxes, snapping intervals to their box's interval"""
+        self.new_cards = CardQueue()
+        self.boxes = [CardQueue() for _ in self.box_intervals]
+        self.deferred = []
+        self.entries = {}
+
+        reviewed = []
+        for card in cards:
+            if card.last_review is None:
+                self._queue(card, current_time)
+            else:
+                card.interval = self.box_intervals[self.box_of(card.interval)]
+                reviewed.append(card)
+        # Only here do the queues need sorting, grading appends in due order
+        reviewed.sort(key=lambda card: card.last_review)
+        for card in reviewed:
+            self._queue(card, current_time)
+
+    def remove_card(self, card):
+        entry = self.entries.pop(id(card), None)
+        if entry is not None:
+            entry[0] = None
+
+    def grade(self, card, response, current_time):
+        self.remove_card(card)
+        step = self.steps.get(response)
+        if step is None:
+            box = 0
+        else:
+            # A new card answered with one step up lands in the first box
+            current = -1 if card.last_review is None else self.box_of(card.interval)
+            box = max(0, min(len(self.box_intervals) - 1, current + step))
+        card.interval = self.box_intervals[box]
+        card.last_review = current_time
+        self._queue(card, current_time)
+
+    def _fronts(self):
+        """Front entries of the reviewed card boxes and the deferred heap"""
+        for queue in self.boxes:
+            entry = queue.front()
+            if entry is not None:
+                yield entry
+        while self.deferred and self.deferred[0][2][0] is None:
+            heapq.heappop(self.deferred)
+        if self.deferred:
+            yield self.deferred[0][2]
+
+    def next_card(self, current_time):
+        best = None
+        best_factor = 0
+        entry = self.new_cards.front()
+        if entry is not None:
+            best = entry[0]
+            best_factor = NEW_CARD_PRIORITY
+
+        for entry in self._fronts():
+            if entry[1] > current_time:
+                continue
+            factor = overdue_factor(entry[0], current_time)
+            if factor > best_factor:
+                best_factor = factor
+                best = entry[0]
+        return best
+
+    def next_due_time(self, current_time):
+        if self.new_cards.front() is not None:
+            return current_time
+        next_due = None
+        for entry in self._fronts():
+            if next_due is None or entry[1] < next_due:
+                next_due = entry[1]
+        return next_due
+
+    def predict(self, current_card, predict_time, count):
+        ranked = []
+        sources = [queue.live() for queue in [self.new_cards] + self.boxes]
+        # Deferred cards are rarely due soon, their earliest one is enough
+        sources.append([entry for _, _, entry in self.deferred[:1] if entry[0] is not None])
+        for entries in sources:
+            taken = 0
+            for card, due in entries:
+                if taken >= count or (due is not None and due > predict_time):
+                    break
+                if card is current_card:
+                    continue
+                _insert_ranked(ranked, overdue_factor(card, predict_time), card, count)
+                taken += 1
+        return ranked
+
+
+class IndexedMultiplierScheduler(MultiplierScheduler):
+    """
+    The multiplier rule with the cards indexed by due time
+
+    Cards wait in a heap until they are due and then move to a pool of due
+    cards. Overdue factors change with time, so the most overdue card is
+    still found by a scan, but only over the due pool. Grading is
+    O(log n); for large decks or many decks at once, e.g. sync hosts.
+    """
+
+    name = "indexed"
+
+    def __init__(self, multiplier):
+        super().__init__(multiplier)
+        self.new_cards = CardQueue()
+        # (due, order, entry) of cards not due yet
+        self.waiting = []
+        # Entries of due cards
+        self.due = []
+        self.order = 0
+        # id(card) -> the card's live entry
+        self.entries = {}
+
+    def _queue(self, card):
+        """Index a card by its due time"""
+        if card.last_review is None:
+            entry = [card, None]
+            self.new_cards.push(entry)
+        else:
+            entry = [card, card.last_review + card.interval]
+            heapq.heappush(self.waiting, (entry[1], self.order, entry))
+            self.order += 1
+        self.entries[id(card)] = entry
+
+    def _collect_due(self, current_time):
+        """Move the cards that became due into the due pool"""
+        waiting = self.waiting
+        while waiting and waiting[0][0] <= current_time:
+            entry = heapq.heappop(waiting)[2]
+            if entry[0] is not None:
+                self.due.append(entry)
+
+    def rebuild(self, cards, current_time):
+        self.cards = cards
+        self.new_cards = CardQueue()
+        self.waiting = []
+        self.due = []
+        self.entries = {}
+        for card in cards:
+            self._queue(card)
+
+    def remove_card(self, card):
+        entry = self.entries.pop(id(card), None)
+        if entry is not None:
+            entry[0] = None
+
+    def grade(self, card, response, current_time):
+        self.remove_card(card)
+        super().grade(card, response, current_time)
+        self._queue(card)
+
+    def next_card(self, current_time):
+        self._collect_due(current_time)
+        # Removed entries are dropped while scanning
+        self.due = [entry for entry in self.due if entry[0] is not None]
+        best = None
+        best_factor = 0
+        entry = self.new_cards.front()
+        if entry is not None:
+            best = entry[0]
+            best_factor = NEW_CARD_PRIORITY
+        for entry in self.due:
+            factor = overdue_factor(entry[0], current_time)
+            if factor > best_factor:
+                best_factor = factor
+                best = entry[0]
+        return best
+
+    def next_due_time(self, current_time):
+        self._collect_due(current_time)
+        if self.new_cards.front() is not None:
+            return current_time
+        for entry in self.due:
+            if entry[0] is not None:
+                return current_time
+        while self.waiting and self.waiting[0][2][0] is None:
+            heapq.heappop(self.waiting)
+        return self.waiting[0][0] if self.waiting else None
+
+    def predict(self, current_card, predict_time, count):
+        ranked = []
+        candidates = [entry for entry in self.new_cards.live()]
+        candidates += self.due
+        candidates += [item[2] for item in self.waiting if item[0] <= predict_time]
+        for card, _ in candidates:
+            if card is None or card is current_card:
+                continue
+            _insert_ranked(ranked, overdue_factor(card, predict_time), card, count)
+        return ranked
+
+
+SCHEDULERS = (MultiplierScheduler.name, LeitnerScheduler.name, IndexedMultiplierScheduler.name)
+
+
+def create_scheduler(kind, multiplier):
+    """
+    Create a scheduler by name, falling back to DEFAULT_SCHEDULER
+
+    Args:
+        kind: one of SCHEDULERS
+        multiplier: response multiplier function for the multiplier scheduler
+    """
+    if kind is None:
+        kind = DEFAULT_SCHEDULER
+    elif kind not in SCHEDULERS:
+        log.warning("Unknown scheduler %s, using %s", kind, DEFAULT_SCHEDULER)
+        kind = DEFAULT_SCHEDULER
+    if kind == LeitnerScheduler.name:
+        return LeitnerScheduler()
+    if kind == IndexedMultiplierScheduler.name:
+        return IndexedMultiplierScheduler(multiplier)
+    return MultiplierScheduler(multiplier)
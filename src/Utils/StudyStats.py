@@ -0,0 +1,233 @@
+"""
+Study statistics for MiniAnki
+Running due, interval and review counters, updated per review instead of
+by scanning the cards
+"""
+
+import heapq
+import json
+from Utils.Constants import *
+from Utils.IOStats import io_stats
+from Utils.Logger import log
+
+# Daily counter columns
+DAY_EASY = 0
+DAY_MEDIUM = 1
+DAY_HARD = 2
+# Reviews of cards seen before, and how many of those were not answered hard
+DAY_RECALL_ATTEMPTS = 3
+DAY_RECALLED = 4
+DAY_COLUMNS = 5
+
+
+def _interval_bucket(interval):
+    """Index of the histogram bucket an interval falls in"""
+    for index, bound in enumerate(STATS_INTERVAL_BUCKETS):
+        if interval < bound:
+            return index
+    return len(STATS_INTERVAL_BUCKETS)
+
+
+def _bucket_label(index):
+    """Short label of a histogram bucket, e.g. <1d or 30d+"""
+    bounds = STATS_INTERVAL_BUCKETS
+    seconds = bounds[index] if index < len(bounds) else bounds[-1]
+    if seconds >= SECONDS_PER_DAY:
+        text = "%dd" % (seconds // SECONDS_PER_DAY)
+    elif seconds >= 3600:
+        text = "%dh" % (seconds // 3600)
+    else:
+        text = "%dm" % (seconds // 60)
+    return "<" + text if index < len(bounds) else text + "+"
+
+
+class StudyStats:
+    def __init__(self, resolution=STATS_DUE_RESOLUTION_SEC, history_days=STATS_HISTORY_DAYS):
+        """
+        Initialize empty statistics, call rebuild() once the cards are loaded
+
+        Args:
+            resolution: seconds per due time slot; due counts lag by at most this
+            history_days: number of daily counter rows kept
+        """
+        self.resolution = resolution
+        self.history_days = history_days
+
+        # Hot cards never reviewed, and a histogram of the others' intervals
+        self.new_count = 0
+        self.histogram = [0] * (len(STATS_INTERVAL_BUCKETS) + 1)
+
+        # Reviewed cards are counted in the due slot of their due time and
+        # moved to due_count once that slot has passed
+        self.due_count = 0
+        self.due_slots = {}
+        self.slot_heap = []
+        self.passed_slot = None
+
+        # Daily counter rows, today last
+        self.day_start = None
+        self.days = []
+        self.changes = 0
+
+    def _count(self, last_review, interval, step):
+        """Add (step 1) or remove (step -1) a card state from the counters"""
+        if last_review is None:
+            self.new_count += step
+            return
+        self.histogram[_interval_bucket(interval)] += step
+        slot = int((last_review + interval) // self.resolution)
+        if self.passed_slot is not None and slot <= self.passed_slot:
+            self.due_count += step
+        elif slot in self.due_slots:
+            # Emptied slots stay on the heap and count as zero
+            self.due_slots[slot] += step
+        else:
+            self.due_slots[slot] = step
+            heapq.heappush(self.slot_heap, slot)
+
+    def rebuild(self, cards, current_time):
+        """Count the hot cards from scratch, after loading or switching decks"""
+        self.new_count = 0
+        self.histogram = [0] * (len(STATS_INTERVAL_BUCKETS) + 1)
+        self.due_count = 0
+        self.due_slots = {}
+        self.slot_heap = []
+        self.passed_slot = None
+        for card in cards:
+            self._count(card.last_review, card.interval, 1)
+        self.update_due(current_time)
+        self.changes += 1
+
+    def update_due(self, current_time):
+        """
+        Move the cards of passed due slots into the due count
+
+        Returns:
+            int: number of reviewed hot cards due now
+        """
+        passed = int(current_time // self.resolution) - 1
+        while self.slot_heap and self.slot_heap[0] <= passed:
+            slot = heapq.heappop(self.slot_heap)
+            self.due_count += self.due_slots.pop(slot, 0)
+        if self.passed_slot is None or passed > self.passed_slot:
+            self.passed_slot = passed
+        return self.due_count
+
+    def _today(self, current_time):
+        """Counter row of the current day, starting a new one when the day is over"""
+        # A restarted clock also starts a new day
+        if (self.day_start is None or current_time - self.day_start >= SECONDS_PER_DAY
+                or current_time < self.day_start):
+            self.day_start = current_time
+            self.days.append([0] * DAY_COLUMNS)
+            del self.days[:-self.history_days]
+        return self.days[-1]
+
+    def record_review(self, card, old_interval, old_last_review, response, current_time):
+        """
+        Update the counters for one review
+
+        Args:
+            card: the reviewed card, already rescheduled
+            old_interval: interval before the review
+            old_last_review: last_review before the review
+            response: RESPONSE_EASY, RESPONSE_MEDIUM or RESPONSE_HARD
+        """
+        self._count(old_last_review, old_interval, -1)
+        self._count(card.last_review, card.interval, 1)
+
+        today = self._today(current_time)
+        today[response - RESPONSE_EASY] += 1
+        if old_last_review is not None:
+            today[DAY_RECALL_ATTEMPTS] += 1
+            if response != RESPONSE_HARD:
+                today[DAY_RECALLED] += 1
+        self.changes += 1
+
+    def remove_card(self, card):
+        """Stop counting a card that left the hot set, e.g. moved to the cold tier"""
+        self._count(card.last_review, card.interval, -1)
+        self.changes += 1
+
+    def summary(self, current_time, cold_stores=None):
+        """
+        Return the current statistics
+
+        Args:
+            cold_stores: cold tiers of the active decks, their summaries are added
+
+        Returns:
+            dict: counters; retention is None before any recall attempt
+        """
+        today = self._today(current_time)
+        attempts = sum(day[DAY_RECALL_ATTEMPTS] for day in self.days)
+        recalled = sum(day[DAY_RECALLED] for day in self.days)
+
+        cold = 0
+        cold_unseen = 0
+        for store in (cold_stores or ()):
+            cold += store.count
+            cold_unseen += store.unseen
+
+        return {
+            "due": self.update_due(current_time),
+            "new": self.new_count,
+            "cold": cold,
+            "cold_new": cold_unseen,
+            "reviews_today": today[DAY_EASY] + today[DAY_MEDIUM] + today[DAY_HARD],
+            "responses_today": today[:DAY_RECALL_ATTEMPTS],
+            "retention_today": (today[DAY_RECALLED] / today[DAY_RECALL_ATTEMPTS]
+                                if today[DAY_RECALL_ATTEMPTS] else None),
+            "retention": recalled / attempts if attempts else None,
+            "histogram": list(self.histogram),
+        }
+
+    def report_lines(self, current_time, cold_stores=None):
+        """Format the statistics as short text lines that fit the display"""
+        summary = self.summary(current_time, cold_stores)
+        easy, medium, hard = summary["responses_today"]
+        retention = summary["retention"]
+        lines = [
+            "Due %d  New %d  Cold %d" % (summary["due"], summary["new"], summary["cold"]),
+            "Today %d: %d/%d/%d" % (summary["reviews_today"], easy, medium, hard),
+            "Retention %s (%dd)" % ("-" if retention is None else "%d%%" % (retention * 100),
+                                   len(self.days)),
+            " ".join("%s:%d" % (_bucket_label(index), count)
+                     for index, count in enumerate(summary["histogram"])),
+        ]
+        return lines
+
+    def dump(self, current_time, cold_stores=None):
+        """Print the statistics to serial"""
+        for line in self.report_lines(current_time, cold_stores):
+            log.info("stats %s", line)
+
+    def load(self, current_time, path=STATS_PATH):
+        """
+        Load the daily counters saved by save()
+
+        The clock restarts at boot, so today continues from the time already
+        spent in it; time the board was off is not counted
+        """
+        try:
+            with io_stats.open(path, "r") as f:
+                saved = json.loads(f.read())
+            self.days = saved.get("days", [])[-self.history_days:]
+            elapsed = saved.get("day_elapsed")
+            if self.days and elapsed is not None:
+                self.day_start = current_time - elapsed
+        except OSError:
+            log.info("No study statistics found")
+        except Exception as e:
+            log.error("Error loading study statistics: %s", e)
+
+    def save(self, current_time, path=STATS_PATH):
+        """Persist the daily counters and how far into today they are; card counts are rebuilt at boot"""
+        elapsed = None if self.day_start is None else current_time - self.day_start
+        try:
+            with io_stats.open(path, "w") as f:
+                f.write(json.dumps({"days": self.days, "day_elapsed": elapsed}))
+            return True
+        except Exception as e:
+            log.error("Error saving study statistics: %s", e)
+            return False
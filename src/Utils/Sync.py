@@ -0,0 +1,207 @@
+"""
+Delta sync for MiniAnki
+Exchanges review records and changed cards with the desktop companion
+(sync_server.py) over the USB data serial port
+
+Each side remembers how far the other has seen: the device the desktop's
+card version, the desktop the device's review log sequence number. A sync
+only moves what changed since, so its size follows activity, not deck size.
+Desktop cards come SYNC_PAGE_CARDS per reply; a cursor (version, deck, card
+id) marks how far into a version the device got, so a large version, e.g.
+a freshly imported deck, arrives over several requests.
+"""
+
+import json
+from Utils.Constants import *
+from Utils.IOStats import io_stats
+from Utils.Logger import log
+from Utils.BoardId import board_id
+from Utils.Tracer import traced
+
+SYNC_PROTOCOL = 1
+# Card text is edited on the desktop, schedule fields change with reviews
+CONTENT_FIELDS = ("hanzi", "pinyin", "english", "part_of_speech", "example")
+SCHEDULE_FIELDS = ("interval", "last_review", "review_count")
+
+
+def resolve(device_card, desktop_card):
+    """
+    Merge two versions of a card the same way on both sides
+
+    Text comes from the desktop. The schedule comes from the copy with more
+    reviews, the device's on a tie since reviews happen there.
+
+    Args:
+        device_card: card dictionary as the device has it
+        desktop_card: card dictionary as the desktop has it
+
+    Returns:
+        dict: the merged card
+    """
+    merged = {}
+    for field in CONTENT_FIELDS:
+        merged[field] = desktop_card.get(field, device_card.get(field))
+    schedule = device_card
+    if desktop_card.get("review_count", 0) > device_card.get("review_count", 0):
+        schedule = desktop_card
+    for field in SCHEDULE_FIELDS:
+        merged[field] = schedule.get(field)
+    return merged
+
+
+class SerialTransport:
+    """JSON lines over the usb_cdc data port, see usb_cdc.enable() in boot.py"""
+
+    def __init__(self, timeout=SYNC_TIMEOUT_SEC):
+        import usb_cdc
+        self.serial = usb_cdc.data
+        if self.serial is None:
+            raise RuntimeError("USB data port disabled, enable it in boot.py")
+        self.serial.timeout = timeout
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    @property
+    def connected(self):
+        """True while the desktop has the port open"""
+        return self.serial.connected
+
+    def request(self, message):
+        """
+        Send one message and wait for the reply
+
+        Returns:
+            dict: the reply
+        """
+        data = json.dumps(message).encode("utf-8") + b"\n"
+        self.serial.reset_input_buffer()
+        self.serial.write(data)
+        self.bytes_sent += len(data)
+
+        reply = self.serial.readline()
+        if not reply or not reply.endswith(b"\n"):
+            raise OSError("no reply from sync server")
+        self.bytes_received += len(reply)
+        return json.loads(reply)
+
+
+class SyncClient:
+    def __init__(self, transport, state_path=SYNC_STATE_PATH):
+        """
+        Initialize the sync client
+
+        Args:
+            transport: object with request(message) -> reply
+            state_path: file keeping the sync vector between boots
+        """
+        self.transport = transport
+        self.state_path = state_path
+        self.device_id = None
+        # Review log sequence the desktop has acknowledged
+        self.acked_seq = 0
+        # Newest desktop card version applied here in full
+        self.version = 0
+        # [version, deck, card id] of the last card of a partly received version
+        self.cursor = None
+        self.load_state()
+
+    def load_state(self):
+        """Load the sync vector, creating a device id on first use"""
+        try:
+            with io_stats.open(self.state_path, "r") as f:
+                state = json.loads(f.read())
+            self.device_id = state.get("device")
+            self.acked_seq = state.get("acked_seq", 0)
+            self.version = state.get("version", 0)
+            self.cursor = state.get("cursor")
+        except OSError:
+            log.info("No sync state found")
+        except Exception as e:
+            log.error("Error loading sync state: %s", e)
+
+        if self.device_id is None:
+            self.device_id = board_id()
+
+    def save_state(self):
+        """Persist the sync vector"""
+        state = {"device": self.device_id, "acked_seq": self.acked_seq, "version": self.version,
+                 "cursor": self.cursor}
+        try:
+            with io_stats.open(self.state_path, "w") as f:
+                f.write(json.dumps(state))
+            return True
+        except Exception as e:
+            log.error("Error saving sync state: %s", e)
+            return False
+
+    def _request(self, sequence):
+        """Sync request without reviews or cards, see sync()"""
+        return {
+            "protocol": SYNC_PROTOCOL,
+            "device": self.device_id,
+            "acked_seq": self.acked_seq,
+            "seq": sequence,
+            "version": self.version,
+            "cursor": self.cursor,
+            "limit": SYNC_PAGE_CARDS,
+        }
+
+    @traced("sync.sync")
+    def sync(self, store):
+        """
+        Run one sync against a card store
+
+        The store provides review_sequence(), reviews_since(sequence),
+        reviewed_cards() and apply_cards(deck, card_dicts); MiniAnkiSync is
+        the device implementation. The first request carries the reviews,
+        further ones only fetch the remaining pages of desktop cards.
+
+        Returns:
+            dict: counts of what was sent and received
+        """
+        sequence = store.review_sequence()
+        request = self._request(sequence)
+
+        reviews = store.reviews_since(self.acked_seq)
+        if reviews is None:
+            # The log no longer covers everything since the last sync
+            log.warning("Review log incomplete since %d, sending full card state", self.acked_seq)
+            cards = {}
+            for deck, card_dict in store.reviewed_cards():
+                cards.setdefault(deck, []).append(card_dict)
+            request["cards"] = cards
+        else:
+            request["reviews"] = [list(review) for review in reviews]
+        cards_sent = sum(len(cards) for cards in request.get("cards", {}).values())
+
+        received = 0
+        pages = 0
+        while True:
+            reply = self.transport.request(request)
+            if reply.get("protocol") != SYNC_PROTOCOL:
+                raise ValueError("sync protocol mismatch: %s" % reply.get("protocol"))
+            if "error" in reply:
+                raise ValueError(reply["error"])
+
+            for deck, card_dicts in reply.get("cards", {}).items():
+                store.apply_cards(deck, card_dicts)
+                received += len(card_dicts)
+
+            self.acked_seq = reply["acked_seq"]
+            self.version = reply["version"]
+            self.cursor = reply.get("cursor")
+            # Saved per page, an interrupted sync resumes where it stopped
+            self.save_state()
+            pages += 1
+            if not reply.get("more"):
+                break
+            request = self._request(sequence)
+
+        result = {
+            "reviews_sent": len(reviews) if reviews is not None else 0,
+            "cards_sent": cards_sent,
+            "cards_received": received,
+            "pages": pages,
+        }
+        log.info("Sync done: %s", result)
+        return result
@@ -0,0 +1,163 @@
+"""
+Timing spans for MiniAnki
+Keeps per-span statistics and exports Chrome trace JSON
+"""
+
+import time
+import json
+from Utils.Constants import *
+from Utils.Logger import log
+
+if hasattr(time, "perf_counter_ns"):
+    _now_ns = time.perf_counter_ns
+elif hasattr(time, "monotonic_ns"):
+    _now_ns = time.monotonic_ns
+else:
+    def _now_ns():
+        return int(time.monotonic() * 1000000000)
+
+
+class _NoSpan:
+    """Stand-in returned when tracing is disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span:
+    """Context manager timing one span"""
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = _now_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.tracer.record(self.name, self.start, _now_ns())
+        return False
+
+
+class Tracer:
+    def __init__(self, enabled=TRACING, size=TRACE_BUFFER_SIZE):
+        """Initialize the tracer with a ring buffer of trace events"""
+        self.enabled = enabled
+        self.size = size
+        self.clear()
+
+    def clear(self):
+        """Forget all recorded spans"""
+        # Each event is (name, start ns, end ns)
+        self.events = [None] * self.size
+        self.index = 0
+        self.count = 0
+        # Per span: [count, total ns, min ns, max ns]
+        self.stats = {}
+        self.origin = _now_ns()
+
+    def span(self, name):
+        """
+        Time a block with a with-statement
+
+        Example:
+            with tracer.span("refresh"):
+                self.display.refresh()
+        """
+        if not self.enabled:
+            return _NO_SPAN
+        return _Span(self, name)
+
+    def record(self, name, start, end):
+        """Store a finished span"""
+        self.events[self.index] = (name, start, end)
+        self.index = (self.index + 1) % self.size
+        self.count += 1
+
+        duration = end - start
+        stats = self.stats.get(name)
+        if stats is None:
+            self.stats[name] = [1, duration, duration, duration]
+        else:
+            stats[0] += 1
+            stats[1] += duration
+            if duration < stats[2]:
+                stats[2] = duration
+            if duration > stats[3]:
+                stats[3] = duration
+
+    def recent(self):
+        """Return the buffered events, oldest first"""
+        if self.count < self.size:
+            return self.events[:self.count]
+        return self.events[self.index:] + self.events[:self.index]
+
+    def report_lines(self):
+        """Format per-span count and min/mean/max in milliseconds"""
+        lines = []
+        for name, (count, total, shortest, longest) in self.stats.items():
+            lines.append(
+                f"span {name}: count={count} min={shortest / 1000000:.1f}ms "
+                f"mean={total / count / 1000000:.1f}ms max={longest / 1000000:.1f}ms"
+            )
+        return lines
+
+    def dump(self):
+        """Print the span statistics to serial"""
+        for line in self.report_lines():
+            log.info(line)
+
+    def export_chrome_trace(self, path=TRACE_PATH):
+        """
+        Write buffered spans as Chrome trace JSON (chrome://tracing, Perfetto)
+
+        Returns:
+            bool: True if the trace was written
+        """
+        try:
+            with open(path, "w") as f:
+                f.write('{"traceEvents":[')
+                first = True
+                for name, start, end in self.recent():
+                    # Complete events, timestamps in microseconds
+                    event = {
+                        "name": name,
+                        "ph": "X",
+                        "ts": (start - self.origin) // 1000,
+                        "dur": (end - start) // 1000,
+                        "pid": 1,
+                        "tid": 1
+                    }
+                    if not first:
+                        f.write(",")
+                    f.write(json.dumps(event))
+                    first = False
+                f.write("]}")
+            return True
+        except Exception as e:
+            log.error("Error writing trace: %s", e)
+            return False
+
+
+# Shared tracer so every module records into one timeline
+tracer = Tracer()
+
+
+def traced(name):
+    """Decorator timing every call of a function as a span"""
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with _Span(tracer, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,396 @@
+import argparse
+import json
+import math
+import os
+
+import numpy as np
+
+from optimizer import load_review_log, RESPONSES, RESPONSE_HARD, MIN_MULTIPLIER, MAX_MULTIPLIER
+from review_ingest import ReviewStore
+from Utils.Constants import (RESPONSE_EASY_MULTIPLIER, RESPONSE_MEDIUM_MULTIPLIER,
+                             RESPONSE_HARD_MULTIPLIER)
+
+"""
+MiniAnki Review Analytics
+
+This script reports how well the scheduler works from recorded reviews:
+
+- forgetting curves: the share of reviews not answered "hard" against the
+  time since the previous review, per previous response
+- per-response outcomes: the interval change each response actually gave
+  and how the next review went, next to the multipliers in Utils/Constants.py
+- per-card difficulty: each card's hard rate, flagging cards whose hard
+  rate is clearly off the target, with the interval scale that would bring
+  them back to it (the per-card "cards" scale of optimizer.py)
+
+Everything is computed with whole-array numpy operations, so millions of
+reviews take seconds.
+
+Usage:
+    python analytics.py SOURCE [--json report.json] [--plots DIR]
+
+Example:
+    python analytics.py fleet_store --retention 0.85 --plots plots
+
+SOURCE is a review log CSV (optimizer.py format) or a review_ingest.py
+store directory. --plots needs matplotlib.
+"""
+
+CONSTANT_MULTIPLIERS = {1: RESPONSE_EASY_MULTIPLIER, 2: RESPONSE_MEDIUM_MULTIPLIER,
+                        3: RESPONSE_HARD_MULTIPLIER}
+RESPONSE_NAMES = {1: 'easy', 2: 'medium', 3: 'hard'}
+# Forgetting curve bins: edges in seconds, from one minute to 90 days
+CURVE_EDGES = np.geomspace(60, 60 * 60 * 24 * 90, 25)
+# z for the 95% Wilson interval used when flagging cards
+CONFIDENCE_Z = 1.96
+
+
+def load_csv(file_path):
+    """
+    Read a review log CSV
+
+    Reviews of a card from different devices or boots are kept apart when
+    the log has device and boot columns.
+
+    Returns:
+        tuple: (log column dictionary, card labels)
+    """
+    log = load_review_log(file_path)
+    labels, card = np.unique((log['deck'].astype(str).astype(object) + '/'
+                              + log['card_id'].astype(str).astype(object)).astype(str),
+                             return_inverse=True)
+    # load_review_log sorts by device, boot, deck and card, then time
+    same = np.zeros(len(card), dtype=bool)
+    same[1:] = card[1:] == card[:-1]
+    for name in ('device', 'boot'):
+        same[1:] &= log[name][1:] == log[name][:-1]
+    return {
+        # Reviews of one card on one clock, sorted by time
+        'group': np.cumsum(~same),
+        'card': card,
+        'timestamp': log['timestamp'],
+        'response': log['response'],
+        'prev_interval': log['prev_interval'],
+    }, labels
+
+
+def load_store(path):
+    """
+    Read a review_ingest.py store
+
+    Reviews of a card from different devices or boots are kept apart,
+    their monotonic clocks cannot be compared.
+
+    Returns:
+        tuple: (log column dictionary, card labels)
+    """
+    store = ReviewStore(path)
+    columns = store.load()
+    order = np.lexsort((columns['seq'], columns['boot'], columns['card'],
+                        columns['deck'], columns['device']))
+    columns = {name: column[order] for name, column in columns.items()}
+
+    # A card is a deck and card name pair, whichever device reviewed it
+    size = max(1, len(store.cards.names))
+    pairs, card = np.unique(columns['deck'].astype(np.int64) * size + columns['card'],
+                            return_inverse=True)
+    labels = np.array([f"{store.decks.names[code // size]}/{store.cards.names[code % size]}"
+                       for code in pairs.tolist()])
+
+    same = np.zeros(len(order), dtype=bool)
+    same[1:] = True
+    for name in ('device', 'deck', 'card', 'boot'):
+        same[1:] &= columns[name][1:] == columns[name][:-1]
+    group = np.cumsum(~same)
+    return {
+        'group': group,
+        'card': card,
+        'timestamp': columns['timestamp'],
+        'response': columns['response'].astype(np.int64),
+        'prev_interval': columns['prev_interval'].astype(np.float64),
+    }, labels
+
+
+def review_pairs(log):
+    """
+    Pair every review with the previous review in its group
+
+    Returns:
+        tuple: (previous review indexes, current review indexes, elapsed seconds)
+    """
+    same = log['group'][1:] == log['group'][:-1]
+    elapsed = log['timestamp'][1:] - log['timestamp'][:-1]
+    keep = same & (elapsed > 0)
+    prev = np.nonzero(keep)[0]
+    return prev, prev + 1, elapsed[keep]
+
+
+def forgetting_curves(log, prev, cur, elapsed, edges=CURVE_EDGES):
+    """
+    Recall rate against elapsed time, per previous response
+
+    Returns:
+        dict: bin edges, and per response the review count and recall rate of each bin
+    """
+    bins = len(edges) + 1
+    index = np.digitize(elapsed, edges)
+    recalled = log['response'][cur] != RESPONSE_HARD
+    slot = (log['response'][prev] - 1) * bins + index
+    counts = np.bincount(slot, minlength=len(RESPONSES) * bins).reshape(len(RESPONSES), bins)
+    hits = np.bincount(slot, weights=recalled,
+                       minlength=len(RESPONSES) * bins).reshape(len(RESPONSES), bins)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rates = hits / counts
+    return {
+        'edges': edges,
+        'curves': {response: {'count': counts[i], 'recall': rates[i]}
+                   for i, response in enumerate(RESPONSES)},
+    }
+
+
+def response_outcomes(log, prev, cur, elapsed):
+    """
+    What each response did to the interval and how the next review went
+
+    The interval a response gave is the prev_interval of the next review.
+
+    Returns:
+        dict: response -> count, median multiplier, recall rate, median elapsed / interval
+    """
+    given = log['prev_interval'][cur]
+    before = log['prev_interval'][prev]
+    valid = (given > 0) & (before > 0)
+    multiplier = np.where(valid, given / np.where(before > 0, before, 1), np.nan)
+    overdue = np.where(given > 0, elapsed / np.where(given > 0, given, 1), np.nan)
+    recalled = log['response'][cur] != RESPONSE_HARD
+
+    outcomes = {}
+    for response in RESPONSES:
+        mask = log['response'][prev] == response
+        count = int(np.count_nonzero(mask))
+        outcomes[response] = {
+            'count': count,
+            'constant': CONSTANT_MULTIPLIERS[response],
+            'multiplier': float(np.nanmedian(multiplier[mask])) if count else None,
+            'recall': float(np.mean(recalled[mask])) if count else None,
+            'overdue': float(np.nanmedian(overdue[mask])) if count else None,
+        }
+    return outcomes
+
+
+def wilson_bounds(hits, counts, z=CONFIDENCE_Z):
+    """Lower and upper 95% bounds of hits / counts, element-wise"""
+    counts = np.maximum(counts, 1)
+    rate = hits / counts
+    centre = rate + z * z / (2 * counts)
+    spread = z * np.sqrt(rate * (1 - rate) / counts + z * z / (4 * counts * counts))
+    scale = 1 + z * z / counts
+    return (centre - spread) / scale, (centre + spread) / scale
+
+
+def card_difficulty(log, cur, n_cards, retention, min_reviews):
+    """
+    Hard rate per card over its repeat reviews, flagging cards off the target
+
+    The target hard rate is 1 - retention. A card is flagged when its 95%
+    interval lies entirely above (too hard) or below (too easy) the target.
+    With recall falling as 2^(-t/h), scaling the card's intervals by
+    ln(retention) / ln(1 - hard rate) moves it back to the target.
+
+    Returns:
+        dict: per-card arrays and the flagged card indexes
+    """
+    card = log['card'][cur]
+    hard = log['response'][cur] == RESPONSE_HARD
+    attempts = np.bincount(card, minlength=n_cards)
+    hard_count = np.bincount(card, weights=hard, minlength=n_cards)
+    reviews = np.bincount(log['card'], minlength=n_cards)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        hard_rate = hard_count / attempts
+    lower, upper = wilson_bounds(hard_count, attempts)
+
+    target = 1.0 - retention
+    enough = attempts >= min_reviews
+    too_hard = enough & (lower > target)
+    too_easy = enough & (upper < target)
+
+    clipped = np.clip(np.nan_to_num(hard_rate, nan=target), 0.01, 0.99)
+    scale = np.clip(math.log(retention) / np.log(1.0 - clipped), MIN_MULTIPLIER, MAX_MULTIPLIER)
+
+    flagged = np.nonzero(too_hard | too_easy)[0]
+    # Clearest cases first: distance from the target in standard errors
+    distance = np.abs(hard_rate[flagged] - target) * np.sqrt(attempts[flagged])
+    flagged = flagged[np.argsort(-distance, kind='stable')]
+    return {
+        'reviews': reviews,
+        'attempts': attempts,
+        'hard_rate': hard_rate,
+        'too_hard': too_hard,
+        'scale': scale,
+        'flagged': flagged,
+    }
+
+
+def analyze(log, labels, retention=0.9, min_reviews=5):
+    """
+    Compute every report section
+
+    Returns:
+        dict: forgetting curves, response outcomes and card difficulty
+    """
+    prev, cur, elapsed = review_pairs(log)
+    return {
+        'reviews': int(len(log['response'])),
+        'pairs': int(len(cur)),
+        'retention': retention,
+        'curves': forgetting_curves(log, prev, cur, elapsed),
+        'outcomes': response_outcomes(log, prev, cur, elapsed),
+        'cards': card_difficulty(log, cur, len(labels), retention, min_reviews),
+        'labels': labels,
+    }
+
+
+def _duration(seconds):
+    for unit, size in (('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds >= size:
+            return f"{seconds / size:.0f}{unit}"
+    return f"{seconds:.0f}s"
+
+
+def report_lines(report, max_cards=20):
+    """Format the analysis as text"""
+    lines = [f"{report['reviews']} reviews, {report['pairs']} repeat reviews, "
+             f"target retention {report['retention']:.0%}", "", "Response outcomes:"]
+    for response, outcome in report['outcomes'].items():
+        if not outcome['count']:
+            lines.append(f"  {RESPONSE_NAMES[response]}: no repeat reviews")
+            continue
+        lines.append(f"  {RESPONSE_NAMES[response]}: {outcome['count']} reviews, "
+                     f"multiplier {outcome['multiplier']:.2f} (constant {outcome['constant']}), "
+                     f"next recall {outcome['recall']:.0%}, "
+                     f"reviewed at {outcome['overdue']:.2f}x the interval")
+
+    lines += ["", "Forgetting curves (recall by time since previous review):"]
+    edges = report['curves']['edges']
+    for response, curve in report['curves']['curves'].items():
+        points = []
+        for index in np.nonzero(curve['count'])[0]:
+            upper = _duration(edges[index]) if index < len(edges) else '+'
+            points.append(f"<{upper}:{curve['recall'][index]:.0%}({curve['count'][index]})")
+        lines.append(f"  after {RESPONSE_NAMES[response]}: " + (' '.join(points) or 'no data'))
+
+    cards = report['cards']
+    flagged = cards['flagged']
+    lines += ["", f"{len(flagged)} cards off the target hard rate "
+                  f"{1 - report['retention']:.0%}:"]
+    for index in flagged[:max_cards]:
+        kind = 'too hard' if cards['too_hard'][index] else 'too easy'
+        lines.append(f"  {report['labels'][index]}: {kind}, hard {cards['hard_rate'][index]:.0%} "
+                     f"of {cards['attempts'][index]}, interval scale {cards['scale'][index]:.2f}")
+    if len(flagged) > max_cards:
+        lines.append(f"  ... {len(flagged) - max_cards} more")
+    return lines
+
+
+def report_json(report):
+    """JSON friendly version of the analysis, flagged cards only"""
+    cards = report['cards']
+    curves = report['curves']
+    return {
+        'reviews': report['reviews'],
+        'pairs': report['pairs'],
+        'retention': report['retention'],
+        'outcomes': {RESPONSE_NAMES[r]: o for r, o in report['outcomes'].items()},
+        'curves': {
+            'edges': curves['edges'].tolist(),
+            **{RESPONSE_NAMES[r]: {'count': c['count'].tolist(),
+                                   'recall': [None if math.isnan(v) else round(v, 4)
+                                              for v in c['recall'].tolist()]}
+               for r, c in curves['curves'].items()},
+        },
+        'flagged': [{
+            'card': str(report['labels'][i]),
+            'too_hard': bool(cards['too_hard'][i]),
+            'hard_rate': round(float(cards['hard_rate'][i]), 4),
+            'reviews': int(cards['attempts'][i]),
+            'scale': round(float(cards['scale'][i]), 3),
+        } for i in cards['flagged']],
+    }
+
+
+def save_plots(report, directory):
+    """Write the forgetting curves and the card hard rate histogram as PNG files"""
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        raise RuntimeError("matplotlib is required for --plots (pip install matplotlib)")
+
+    os.makedirs(directory, exist_ok=True)
+    edges = report['curves']['edges']
+    # Plot each bin at its upper edge, the open last bin is left out
+    figure, axes = plt.subplots()
+    for response, curve in report['curves']['curves'].items():
+        mask = curve['count'][:len(edges)] > 0
+        axes.plot(edges[mask] / 3600, curve['recall'][:len(edges)][mask], marker='o',
+                  label=f"after {RESPONSE_NAMES[response]}")
+    axes.axhline(report['retention'], color='grey', linestyle='--', label='target')
+    axes.set_xscale('log')
+    axes.set_xlabel('hours since previous review')
+    axes.set_ylabel('recall (not hard)')
+    axes.legend()
+    figure.savefig(os.path.join(directory, 'forgetting_curves.png'), dpi=120)
+    plt.close(figure)
+
+    cards = report['cards']
+    rated = cards['attempts'] > 0
+    figure, axes = plt.subplots()
+    axes.hist(cards['hard_rate'][rated], bins=20, range=(0, 1))
+    axes.axvline(1 - report['retention'], color='grey', linestyle='--')
+    axes.set_xlabel('hard rate per card')
+    axes.set_ylabel('cards')
+    figure.savefig(os.path.join(directory, 'card_hard_rates.png'), dpi=120)
+    plt.close(figure)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report retention and workload from MiniAnki reviews')
+    parser.add_argument('source', help='Review log CSV or review_ingest.py store directory')
+    parser.add_argument('--retention', type=float, default=0.9,
+                        help='Target probability of not answering hard (default: 0.9)')
+    parser.add_argument('--min-reviews', type=int, default=5,
+                        help='Minimum repeat reviews before a card is flagged')
+    parser.add_argument('--max-cards', type=int, default=20, help='Flagged cards to print')
+    parser.add_argument('--json', help='Write the report as JSON')
+    parser.add_argument('--plots', help='Directory to write PNG plots to')
+
+    args = parser.parse_args()
+
+    try:
+        if not 0 < args.retention < 1:
+            raise ValueError("retention must be between 0 and 1")
+
+        if os.path.isdir(args.source):
+            log, labels = load_store(args.source)
+        else:
+            log, labels = load_csv(args.source)
+        if len(log['response']) == 0:
+            raise ValueError("no reviews found")
+
+        report = analyze(log, labels, args.retention, args.min_reviews)
+        print('\n'.join(report_lines(report, args.max_cards)))
+
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(report_json(report), f, ensure_ascii=False, indent=2)
+            print(f"Saved report to {args.json}")
+        if args.plots:
+            save_plots(report, args.plots)
+            print(f"Saved plots to {args.plots}")
+
+    except Exception as e:
+        print(f"Error: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+import argparse
+import csv
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+import zipfile
+
+from Utils.Constants import MIN_INTERVAL, MAX_INTERVAL
+from Utils.DeckFile import write_deck
+from parser import add_to_manifest
+
+"""
+Anki Package to MiniAnki Deck Importer
+
+This script reads Anki's native .apkg packages (a zip holding the collection
+SQLite database) or a collection .anki2 file directly, without a CSV export.
+Notes are streamed from the database one row at a time and written straight
+into a device deck file, so large collections are never held in memory.
+
+Fields are mapped by name or position, e.g. --fields hanzi=Simplified,pinyin=2.
+Review cards keep their Anki interval and review count. Their last review
+time is stored relative to the import, since the device counts time from
+boot: a card reviewed a day before the import has last_review -86400.
+Anki's review history can be written to the review log CSV optimizer.py reads.
+
+Usage:
+    python apkg_import.py input.apkg output.json [--fields MAPPING] [--anki-deck NAME]
+
+Example:
+    python apkg_import.py HSK1.apkg decks/hsk1.json --fields hanzi=Hanzi,pinyin=Pinyin,english=Meaning --manifest decks/manifest.json --review-log review_log.csv
+
+Packages from Anki 2.1.50+ store the collection zstd-compressed
+(collection.anki21b); reading those needs the zstandard package.
+"""
+
+# Collection files inside an .apkg, newest format first
+COLLECTION_NAMES = ['collection.anki21b', 'collection.anki21', 'collection.anki2']
+
+CARD_FIELDS = ('hanzi', 'pinyin', 'english', 'part_of_speech', 'example')
+DEFAULT_FIELDS = 'hanzi=0,pinyin=1,english=2'
+
+# Anki card types
+CARD_TYPE_NEW = 0
+CARD_TYPE_LEARNING = 1
+# Anki queue of suspended cards
+QUEUE_SUSPENDED = -1
+
+# Anki answer buttons (again, hard, good, easy) to MiniAnki responses
+# (1=Easy, 2=Medium, 3=Hard); only "again" is a failed recall
+EASE_TO_RESPONSE = {1: 3, 2: 2, 3: 2, 4: 1}
+
+SECONDS_PER_DAY = 60 * 60 * 24
+
+# Anki separates note fields with the unit separator
+FIELD_SEPARATOR = '\x1f'
+
+
+def clean_field(text):
+    """Strip HTML tags, sound references and entities from a note field"""
+    text = re.sub(r'\[sound:[^\]]*\]', '', text)
+    text = re.sub(r'<br\s*/?>', ' ', text)
+    text = re.sub(r'<[^>]+>', '', text)
+    text = text.replace('&nbsp;', ' ').replace('&amp;', '&').replace('&lt;', '<').replace('&gt;', '>')
+    return text.strip()
+
+
+def anki_interval_seconds(ivl):
+    """Anki stores review intervals in days and learning steps as negative seconds"""
+    return -ivl if ivl < 0 else ivl * SECONDS_PER_DAY
+
+
+def open_collection(input_file, work_dir):
+    """
+    Get an SQLite connection to the collection in a package or collection file
+
+    The collection is copied out of the zip in chunks, since SQLite can only
+    open files.
+
+    Returns:
+        sqlite3.Connection
+    """
+    if not zipfile.is_zipfile(input_file):
+        return sqlite3.connect(f'file:{input_file}?mode=ro', uri=True)
+
+    with zipfile.ZipFile(input_file) as package:
+        names = set(package.namelist())
+        name = next((name for name in COLLECTION_NAMES if name in names), None)
+        if name is None:
+            raise ValueError(f"no Anki collection in {input_file}")
+
+        path = os.path.join(work_dir, 'collection.sqlite')
+        with package.open(name) as source, open(path, 'wb') as target:
+            if name.endswith('b'):
+                try:
+                    import zstandard
+                except ImportError:
+                    raise RuntimeError("this package needs the zstandard package (pip install zstandard)")
+                zstandard.ZstdDecompressor().copy_stream(source, target)
+            else:
+                shutil.copyfileobj(source, target)
+
+    return sqlite3.connect(path)
+
+
+def has_table(connection, name):
+    row = connection.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone()
+    return row is not None
+
+
+def load_note_fields(connection):
+    """
+    Field names of every note type
+
+    Returns:
+        dict: note type id -> list of field names in order
+    """
+    fields = {}
+    if has_table(connection, 'fields'):
+        for notetype_id, ordinal, name in connection.execute(
+                "SELECT ntid, ord, name FROM fields ORDER BY ntid, ord"):
+            fields.setdefault(notetype_id, []).append(name)
+        return fields
+
+    # Older collections keep note types as JSON in the col table
+    models = json.loads(connection.execute("SELECT models FROM col").fetchone()[0])
+    for model_id, model in models.items():
+        fields[int(model_id)] = [field['name'] for field in model['flds']]
+    return fields
+
+
+def load_deck_ids(connection, deck_name):
+    """
+    Ids of the Anki deck with the given name and its subdecks
+
+    Returns:
+        list: deck ids
+    """
+    if has_table(connection, 'decks'):
+        decks = connection.execute("SELECT id, name FROM decks").fetchall()
+        # Newer collections separate deck levels with the unit separator
+        decks = [(deck_id, name.replace(FIELD_SEPARATOR, '::')) for deck_id, name in decks]
+    else:
+        decks = [(int(deck_id), deck['name']) for deck_id, deck in
+                 json.loads(connection.execute("SELECT decks FROM col").fetchone()[0]).items()]
+
+    deck_ids = [deck_id for deck_id, name in decks
+                if name == deck_name or name.startswith(deck_name + '::')]
+    if not deck_ids:
+        raise ValueError(f"no Anki deck named {deck_name}")
+    return deck_ids
+
+
+def parse_field_mapping(mapping):
+    """
+    Parse a field mapping such as "hanzi=Simplified,pinyin=1"
+
+    Returns:
+        dict: card field -> note field name or position
+    """
+    result = {}
+    for item in mapping.split(','):
+        card_field, _, note_field = item.partition('=')
+        card_field = card_field.strip()
+        if card_field not in CARD_FIELDS or not note_field:
+            raise ValueError(f"bad field mapping '{item}', expected one of {', '.join(CARD_FIELDS)}")
+        note_field = note_field.strip()
+        result[card_field] = int(note_field) if note_field.isdigit() else note_field
+    if 'hanzi' not in result:
+        raise ValueError("the field mapping needs a hanzi field")
+    return result
+
+
+class FieldMapper:
+    """Turns a note's field string into card fields, per note type"""
+
+    def __init__(self, mapping, note_fields):
+        self.mapping = mapping
+        self.note_fields = note_fields
+        self.positions = {}
+
+    def _positions(self, notetype_id):
+        positions = self.positions.get(notetype_id)
+        if positions is None:
+            names = self.note_fields.get(notetype_id, [])
+            positions = {}
+            for card_field, note_field in self.mapping.items():
+                if isinstance(note_field, int):
+                    positions[card_field] = note_field
+                elif note_field in names:
+                    positions[card_field] = names.index(note_field)
+            self.positions[notetype_id] = positions
+        return positions
+
+    def map(self, notetype_id, flds):
+        """
+        Returns:
+            dict: card text fields, or None if the note has no hanzi
+        """
+        values = flds.split(FIELD_SEPARATOR)
+        card = {}
+        for card_field in CARD_FIELDS:
+            position = self._positions(notetype_id).get(card_field)
+            card[card_field] = clean_field(values[position]) if position is not None and position < len(values) else ''
+        return card if card['hanzi'] else None
+
+
+def card_query(deck_ids, card_ordinal, include_suspended):
+    """
+    SQL for one card per note with its latest review time
+
+    Returns:
+        tuple: (query, parameters)
+    """
+    query = ("SELECT n.mid, n.flds, c.type, c.queue, c.ivl, c.reps, "
+             "(SELECT MAX(r.id) FROM revlog r WHERE r.cid = c.id) "
+             "FROM cards c JOIN notes n ON c.nid = n.id WHERE c.ord = ?")
+    parameters = [card_ordinal]
+    if not include_suspended:
+        query += " AND c.queue != ?"
+        parameters.append(QUEUE_SUSPENDED)
+    if deck_ids:
+        query += f" AND c.did IN ({','.join('?' * len(deck_ids))})"
+        parameters.extend(deck_ids)
+    return query + " ORDER BY n.id", parameters
+
+
+def stream_cards(connection, mapper, deck_ids=None, card_ordinal=0,
+                 include_suspended=False, import_time=None, stats=None):
+    """
+    Yield MiniAnki card dictionaries one note at a time
+
+    Notes whose hanzi was already seen are skipped, since the device uses
+    hanzi as the card id.
+    """
+    import_time = time.time() if import_time is None else import_time
+    stats = {} if stats is None else stats
+    seen = set()
+    query, parameters = card_query(deck_ids, card_ordinal, include_suspended)
+
+    for notetype_id, flds, card_type, queue, ivl, reps, last_review_ms in connection.execute(query, parameters):
+        card = mapper.map(notetype_id, flds)
+        if card is None or card['hanzi'] in seen:
+            stats['skipped'] = stats.get('skipped', 0) + 1
+            continue
+        seen.add(card['hanzi'])
+
+        if card_type == CARD_TYPE_NEW or last_review_ms is None:
+            card.update(interval=MIN_INTERVAL, last_review=None, review_count=0)
+        else:
+            interval = MIN_INTERVAL if card_type == CARD_TYPE_LEARNING else anki_interval_seconds(ivl)
+            card.update(interval=max(MIN_INTERVAL, min(MAX_INTERVAL, interval)),
+                        last_review=round(last_review_ms / 1000.0 - import_time, 3),
+                        review_count=reps)
+            stats['reviewed'] = stats.get('reviewed', 0) + 1
+
+        stats['cards'] = stats.get('cards', 0) + 1
+        yield card
+
+
+def export_review_log(connection, mapper, output_file, deck_ids=None, card_ordinal=0, deck='default'):
+    """
+    Write Anki's review history as a review log CSV for optimizer.py
+
+    Rows are streamed from the revlog table in card and time order.
+
+    Returns:
+        int: number of reviews written
+    """
+    query = ("SELECT n.mid, n.flds, r.id, r.ease, r.lastIvl FROM revlog r "
+             "JOIN cards c ON r.cid = c.id JOIN notes n ON c.nid = n.id WHERE c.ord = ?")
+    parameters = [card_ordinal]
+    if deck_ids:
+        query += f" AND c.did IN ({','.join('?' * len(deck_ids))})"
+        parameters.extend(deck_ids)
+    query += " ORDER BY r.cid, r.id"
+
+    count = 0
+    with open(output_file, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['card_id', 'timestamp', 'response', 'prev_interval', 'deck'])
+        for notetype_id, flds, review_ms, ease, last_ivl in connection.execute(query, parameters):
+            card = mapper.map(notetype_id, flds)
+            response = EASE_TO_RESPONSE.get(ease)
+            if card is None or response is None:
+                continue
+            writer.writerow([card['hanzi'], review_ms / 1000.0, response,
+                             anki_interval_seconds(last_ivl), deck])
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import an Anki package into a MiniAnki deck')
+    parser.add_argument('input_file', help='Path to the .apkg package or collection .anki2 file')
+    parser.add_argument('output_file', help='Path for the output deck file')
+    parser.add_argument('--fields', default=DEFAULT_FIELDS,
+                        help=f'Card field to note field name or position (default: {DEFAULT_FIELDS})')
+    parser.add_argument('--anki-deck', help='Only import this Anki deck and its subdecks')
+    parser.add_argument('--card-ord', type=int, default=0,
+                        help='Which card of each note carries the schedule (default: 0)')
+    parser.add_argument('--include-suspended', action='store_true', help='Also import suspended cards')
+    parser.add_argument('--review-log', help='Write the Anki review history to this CSV')
+    parser.add_argument('--manifest', help='Deck manifest to register the output file in')
+    parser.add_argument('--deck', help='Deck name in the manifest (default: output file name)')
+
+    args = parser.parse_args()
+
+    try:
+        mapping = parse_field_mapping(args.fields)
+        with tempfile.TemporaryDirectory() as work_dir:
+            connection = open_collection(args.input_file, work_dir)
+            try:
+                mapper = FieldMapper(mapping, load_note_fields(connection))
+                deck_ids = load_deck_ids(connection, args.anki_deck) if args.anki_deck else None
+                deck = args.deck or os.path.splitext(os.path.basename(args.output_file))[0]
+
+                stats = {}
+                cards = stream_cards(connection, mapper, deck_ids, args.card_ord,
+                                     args.include_suspended, stats=stats)
+                if write_deck(args.output_file, cards) is None:
+                    raise RuntimeError(f"could not write {args.output_file}")
+                print(f"Imported {stats.get('cards', 0)} cards ({stats.get('reviewed', 0)} reviewed, "
+                      f"{stats.get('skipped', 0)} skipped) to {args.output_file}")
+
+                if args.review_log:
+                    count = export_review_log(connection, mapper, args.review_log,
+                                              deck_ids, args.card_ord, deck)
+                    print(f"Wrote {count} reviews to {args.review_log}")
+            finally:
+                connection.close()
+
+        if args.manifest:
+            name = add_to_manifest(args.manifest, args.output_file, args.deck)
+            print(f"Registered deck '{name}' in {args.manifest}")
+
+    except Exception as e:
+        print(f"Error: {e}")
+
+if __name__ == "__main__":
+    main()
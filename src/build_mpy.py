@@ -0,0 +1,149 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+"""
+MiniAnki Precompiled Bundle Builder
+
+This script compiles the device packages (MiniAnki/ and Utils/) to .mpy
+bytecode with mpy-cross, so CircuitPython does not compile them on the
+heap at every boot. The bundle keeps the same package layout; main.py and
+import_report.py stay as source since CircuitPython only runs .py entry points.
+
+mpy-cross must match the CircuitPython version on the device. Download it
+from the CircuitPython release page or install the mpy-cross pip package.
+
+Usage:
+    python build_mpy.py [--output DIR] [--mpy-cross PATH]
+    python build_mpy.py --compare import_report_py.json import_report_mpy.json
+
+Example:
+    python build_mpy.py --output build/CIRCUITPY
+
+Copy the output directory to the CIRCUITPY drive, reset the board and run
+import_report.py on both deployments to produce the files for --compare.
+"""
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Packages compiled to .mpy
+DEVICE_PACKAGES = ["MiniAnki", "Utils"]
+
+# Files copied as source
+DEVICE_SOURCES = ["main.py", "import_report.py"]
+
+
+def find_mpy_cross(path=None):
+    """Locate the mpy-cross compiler"""
+    if path:
+        return [path]
+    executable = shutil.which("mpy-cross")
+    if executable:
+        return [executable]
+    try:
+        import mpy_cross
+        return [sys.executable, "-m", "mpy_cross"]
+    except ImportError:
+        raise RuntimeError("mpy-cross not found, pass --mpy-cross or install the mpy-cross package")
+
+
+def build_bundle(output_dir, mpy_cross, optimize=0):
+    """
+    Compile the device packages into output_dir
+
+    Returns:
+        list: (relative path, source bytes, output bytes) for every file
+    """
+    results = []
+    os.makedirs(output_dir, exist_ok=True)
+
+    for package in DEVICE_PACKAGES:
+        package_dir = os.path.join(SOURCE_DIR, package)
+        target_dir = os.path.join(output_dir, package)
+        os.makedirs(target_dir, exist_ok=True)
+
+        for name in sorted(os.listdir(package_dir)):
+            if not name.endswith(".py"):
+                continue
+            source = os.path.join(package_dir, name)
+            target = os.path.join(target_dir, name[:-3] + ".mpy")
+
+            # The source path is recorded in tracebacks, keep it relative
+            command = mpy_cross + [f"-O{optimize}", "-s", f"{package}/{name}",
+                                   "-o", target, source]
+            subprocess.run(command, check=True)
+            results.append((f"{package}/{name[:-3]}.mpy", os.path.getsize(source),
+                            os.path.getsize(target)))
+
+    for name in DEVICE_SOURCES:
+        source = os.path.join(SOURCE_DIR, name)
+        shutil.copyfile(source, os.path.join(output_dir, name))
+        size = os.path.getsize(source)
+        results.append((name, size, size))
+
+    return results
+
+
+def compare_reports(source_report, mpy_report):
+    """
+    Compare two import reports written by import_report.py
+
+    Returns:
+        list: lines of the comparison table
+    """
+    with open(source_report, 'r', encoding='utf-8') as f:
+        source = json.load(f)
+    with open(mpy_report, 'r', encoding='utf-8') as f:
+        mpy = json.load(f)
+
+    lines = [f"{'module':<28}{'py ms':>10}{'mpy ms':>10}{'py free':>12}{'mpy free':>12}"]
+    mpy_modules = {entry['module']: entry for entry in mpy['modules']}
+    for entry in source['modules']:
+        other = mpy_modules.get(entry['module'])
+        if other is None:
+            continue
+        lines.append(f"{entry['module']:<28}{entry['ms']:>10.1f}{other['ms']:>10.1f}"
+                     f"{entry['mem_free']:>12}{other['mem_free']:>12}")
+
+    lines.append(f"{'total':<28}{source['total_ms']:>10.1f}{mpy['total_ms']:>10.1f}"
+                 f"{source['mem_free']:>12}{mpy['mem_free']:>12}")
+    saved_ms = source['total_ms'] - mpy['total_ms']
+    saved_bytes = mpy['mem_free'] - source['mem_free']
+    lines.append(f"mpy saves {saved_ms:.1f} ms of import time and {saved_bytes} bytes of RAM")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build a precompiled .mpy bundle of MiniAnki')
+    parser.add_argument('--output', default=os.path.join('build', 'CIRCUITPY'),
+                        help='Directory for the bundle (default: build/CIRCUITPY)')
+    parser.add_argument('--mpy-cross', help='Path to the mpy-cross executable')
+    parser.add_argument('--optimize', type=int, default=0, choices=range(4),
+                        help='mpy-cross optimisation level, 3 strips asserts and line numbers')
+    parser.add_argument('--compare', nargs=2, metavar=('PY_REPORT', 'MPY_REPORT'),
+                        help='Compare import reports from the source and .mpy deployments')
+
+    args = parser.parse_args()
+
+    try:
+        if args.compare:
+            for line in compare_reports(*args.compare):
+                print(line)
+            return
+
+        results = build_bundle(args.output, find_mpy_cross(args.mpy_cross), args.optimize)
+        for path, source_size, output_size in results:
+            print(f"{path}: {source_size} -> {output_size} bytes")
+
+        total_source = sum(source_size for _, source_size, _ in results)
+        total_output = sum(output_size for _, _, output_size in results)
+        print(f"Built {len(results)} files in {args.output} ({total_source} -> {total_output} bytes)")
+
+    except Exception as e:
+        print(f"Error: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Import time and memory report for MiniAnki
+Run on the device from the REPL with "import import_report" to compare
+the source and .mpy deployments (see build_mpy.py)
+"""
+
+import gc
+import sys
+import time
+import json
+
+# Imported in dependency order, so each entry only measures its own module
+MODULES = [
+    "Utils.Constants",
+    "Utils.Logger",
+    "Utils.IOStats",
+    "Utils.Tracer",
+    "Utils.MemoryProfiler",
+    "Utils.Flashcard",
+    "Utils.DeckFile",
+    "Utils.Checkpoint",
+    "Utils.RingLog",
+    "Utils.BoardId",
+    "Utils.ReviewExport",
+    "Utils.ColdStore",
+    "Utils.Reschedule",
+    "Utils.Scheduler",
+    "Utils.StudyStats",
+    "Utils.Sync",
+    "Utils.Console",
+    "Utils.ButtonManager",
+    "Utils.MotionManager",
+    "Utils.PowerManager",
+    "Utils.EInkDisplay",
+    "MiniAnki.MiniAnkiSetup",
+    "MiniAnki.MiniAnkiCore",
+    "MiniAnki.MiniAnkiTiers",
+    "MiniAnki.MiniAnkiSync",
+    "MiniAnki.MiniAnkiBulk",
+    "MiniAnki.MiniAnkiConsole",
+    "MiniAnki.MiniAnki",
+]
+
+
+def _mem_free():
+    return gc.mem_free() if hasattr(gc, "mem_free") else 0
+
+
+def run_report():
+    """
+    Import every device module and record time and free memory after each
+
+    Returns:
+        dict: report with per-module and total figures
+    """
+    entries = []
+    gc.collect()
+    start = time.monotonic()
+
+    for name in MODULES:
+        before = time.monotonic()
+        __import__(name)
+        elapsed = time.monotonic() - before
+        gc.collect()
+        entries.append({"module": name, "ms": elapsed * 1000, "mem_free": _mem_free()})
+
+    # .mpy modules report the .mpy path as their file
+    module_file = getattr(sys.modules[MODULES[-1]], "__file__", "") or ""
+    return {
+        "kind": "mpy" if module_file.endswith(".mpy") else "py",
+        "modules": entries,
+        "total_ms": (time.monotonic() - start) * 1000,
+        "mem_free": _mem_free()
+    }
+
+
+def main():
+    report = run_report()
+    for entry in report["modules"]:
+        print(f"{entry['module']}: {entry['ms']:.1f} ms, {entry['mem_free']} bytes free")
+    print(f"total: {report['total_ms']:.1f} ms, {report['mem_free']} bytes free")
+
+    from Utils.Constants import SD_CARD_PATH
+    path = f"{SD_CARD_PATH}/import_report_{report['kind']}.json"
+    try:
+        with open(path, "w") as f:
+            f.write(json.dumps(report))
+        print(f"Report written to {path}")
+    except OSError as e:
+        # SD card not mounted, print the report so it can be copied from serial
+        print(f"Could not write report: {e}")
+        print(json.dumps(report))
+
+main()
@@ -3,54 +3,98 @@ Main module for MiniAnki flashcard application
 Handles main application loop and integrates all components
 """
 
+import time
+
+# Taken before the other imports so startup metrics include them
+BOOT_TIME = time.monotonic()
+
 from MiniAnki.MiniAnki import MiniAnki
 from Utils.Constants import *
-import time
+from Utils.MemoryProfiler import memory_profiler
+from Utils.Tracer import tracer
+from Utils.Logger import log
 
 def main():
     """Main application loop"""
-    print("\n----- MiniAnki Starting -----\n")
+    log.info("\n----- MiniAnki Starting -----\n")
     
-    mini_anki = MiniAnki()
+    mini_anki = MiniAnki(boot_time=BOOT_TIME)
     
-    print("\n----- System Ready -----\n")
+    log.info("\n----- System Ready -----\n")
     
     try:
         # Main loop
         while True:
-            # Get the next card to show
-            print("\nChecking for due cards...")
-            card = mini_anki.get_next_card()
+            # One span per iteration so the trace shows where the time goes
+            with tracer.span("loop"):
+                # Diagnostics commands typed into the serial console
+                mini_anki.poll_console()
+
+                # Nobody around: no refreshes and no new cards
+                if not mini_anki.is_present():
+                    with tracer.span("idle"):
+                        mini_anki.idle_until_present()
+                    continue
+
+                # A card left unanswered earlier comes first
+                card = mini_anki.resume_held_card()
+
+                if card is None:
+                    # Get the next card to show
+                    log.debug("\nChecking for due cards...")
+                    with memory_profiler.phase("get_next_card"):
+                        card = mini_anki.get_next_card()
+
+                    if card:
+                        # Wait before showing the card and preload card
+                        mini_anki.wait_for_random_interval(card)
+                        if not mini_anki.is_present():
+                            mini_anki.hold_card(card)
+                            continue
+
+                        log.info("Showing card: %s", card.hanzi)
+                        # mini_anki.show_card(card)
+
+                        # log.info("Waiting for button press to reveal answer...")
+                        # mini_anki.wait_for_any_button()
+
+                        log.info("Revealing Card: %s", card.pinyin)
+                        mini_anki.reveal_card(card)
 
-            if card:
-                # Wait before showing the card and preload card
-                mini_anki.wait_for_random_interval(card)
+                if card:
+                    # Prepare the likely next card while the panel refreshes
+                    mini_anki.prefetch_next(card)
 
-                print(f"Showing card: {card.hanzi}")
-                # mini_anki.show_card(card)
+                    log.debug("Waiting for Response...")
+                    response = mini_anki.wait_for_response()
+                    if response is None:
+                        # Keep the card on screen, unanswered, for later
+                        mini_anki.hold_card(card)
+                        continue
 
-                # print(f"Waiting for button press to reveal answer...")
-                # mini_anki.wait_for_any_button()
+                    log.info("Processing response: %s", response)
+                    with memory_profiler.phase("process_response"):
+                        mini_anki.process_response(card, response)
 
-                print(f"Revealing Card: {card.pinyin}")
-                mini_anki.reveal_card(card)
-                
-                print(f"Waiting for Response...")
-                response = mini_anki.wait_for_response()
+                else:
+                    # Nothing to review: show the statistics instead
+                    mini_anki.show_stats()
 
-                print(f"Processing response: {response}")
-                mini_anki.process_response(card, response)
+                    # A good moment to sync with the desktop
+                    mini_anki.sync_if_connected()
 
-            time.sleep(5)
+                    # Sleep until the next card is due instead of polling
+                    with tracer.span("idle"):
+                        mini_anki.idle_until_due()
 
     except KeyboardInterrupt:
-        print("\n\nUser interrupted - exiting")
+        log.info("\n\nUser interrupted - exiting")
     except Exception as e:
-        print(f"\n\nError in main loop: {str(e)}")
+        log.error("\n\nError in main loop: %s", e)
     finally:
         # Cleanup and exit
-        print("\nCleaning up before exit...")
+        log.info("\nCleaning up before exit...")
         mini_anki.cleanup()
-        print("\n----- MiniAnki Shutdown Complete -----")
+        log.info("\n----- MiniAnki Shutdown Complete -----")
         
 main()
\ No newline at end of file
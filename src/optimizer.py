@@ -0,0 +1,282 @@
+import csv
+import json
+import argparse
+import math
+
+import numpy as np
+
+"""
+MiniAnki Scheduler Parameter Optimizer
+
+This script fits the response multipliers used by MiniAnkiCore.process_response
+from recorded review logs, instead of relying on the fixed constants in
+Utils/Constants.py.
+
+Each log row holds: card_id, timestamp, response, prev_interval
+(and optionally deck, device and boot columns). prev_interval is the
+interval the card had when it was reviewed, before the response was
+applied. Timestamps are the device's monotonic clock, so only reviews of
+the same device and boot are compared.
+
+Recall is modelled with half-life regression: the chance of not answering
+"hard" after waiting t seconds is 2^(-t / h), where the half-life h is the
+interval before the previous review scaled by 2^(theta[previous response]).
+The thetas (per deck, plus optional per-card offsets) are fitted with
+full-batch gradient steps over all reviews at once, then turned into the
+multiplier that hits the target retention.
+
+Usage:
+    python optimizer.py review_log.csv scheduler_params.json
+
+Example:
+    python optimizer.py review_log.csv scheduler_params.json --per-card --retention 0.85
+
+Copy the output file to the SD card (see SCHEDULER_PARAMS_PATH) and MiniAnki
+will load it at startup.
+"""
+
+RESPONSE_EASY = 1
+RESPONSE_MEDIUM = 2
+RESPONSE_HARD = 3
+RESPONSES = (RESPONSE_EASY, RESPONSE_MEDIUM, RESPONSE_HARD)
+
+# Multipliers outside this range are clamped before export
+MIN_MULTIPLIER = 0.1
+MAX_MULTIPLIER = 10.0
+
+
+def load_review_log(file_path):
+    """
+    Read a review log CSV into column arrays
+
+    Returns:
+        dict: column name -> numpy array, sorted by device, boot, deck and
+            card, then timestamp
+    """
+    card_ids = []
+    timestamps = []
+    responses = []
+    prev_intervals = []
+    decks = []
+    devices = []
+    boots = []
+
+    with open(file_path, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+
+        for row in reader:
+            # Skip empty rows or malformed data
+            try:
+                response = int(row['response'])
+                timestamp = float(row['timestamp'])
+                prev_interval = float(row['prev_interval'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if response not in RESPONSES or prev_interval <= 0:
+                continue
+
+            card_ids.append(row['card_id'])
+            timestamps.append(timestamp)
+            responses.append(response)
+            prev_intervals.append(prev_interval)
+            decks.append(row.get('deck') or 'default')
+            devices.append(row.get('device') or '')
+            boots.append(row.get('boot') or '')
+
+    card_ids = np.array(card_ids, dtype=object)
+    timestamps = np.array(timestamps, dtype=np.float64)
+    decks = np.array(decks, dtype=object)
+    devices = np.array(devices, dtype=object)
+    boots = np.array(boots, dtype=object)
+    order = np.lexsort((timestamps, card_ids.astype(str), decks.astype(str),
+                        boots.astype(str), devices.astype(str)))
+
+    return {
+        'card_id': card_ids[order],
+        'timestamp': timestamps[order],
+        'response': np.array(responses, dtype=np.int64)[order],
+        'prev_interval': np.array(prev_intervals, dtype=np.float64)[order],
+        'deck': decks[order],
+        'device': devices[order],
+        'boot': boots[order],
+    }
+
+
+def build_training_set(log):
+    """
+    Pair every review with the previous review of the same card on the same clock
+
+    Returns:
+        dict: arrays describing each (previous review, current review) pair
+    """
+    card_ids = log['card_id']
+    same_card = card_ids[1:] == card_ids[:-1]
+    for name in ('deck', 'device', 'boot'):
+        same_card &= log[name][1:] == log[name][:-1]
+    elapsed = log['timestamp'][1:] - log['timestamp'][:-1]
+
+    # Monotonic clocks restart on reboot, so negative gaps are dropped
+    keep = same_card & (elapsed > 0)
+    prev = np.nonzero(keep)[0]
+    cur = prev + 1
+
+    return {
+        'card_id': card_ids[cur],
+        'deck': log['deck'][cur],
+        'elapsed': elapsed[keep],
+        'base_interval': log['prev_interval'][prev],
+        'prev_response': log['response'][prev] - 1,
+        'recalled': (log['response'][cur] != RESPONSE_HARD).astype(np.float64),
+    }
+
+
+def fit_half_life(samples, card_index, n_cards, steps=2000, learning_rate=0.05,
+                  card_l2=0.1):
+    """
+    Fit response thetas (and per-card offsets) with full-batch gradient descent
+
+    Args:
+        samples: training pairs from build_training_set
+        card_index: per-sample card index, or None to skip per-card offsets
+        n_cards: number of distinct cards in card_index
+        steps: number of gradient steps
+        learning_rate: step size (Adam)
+        card_l2: L2 penalty pulling per-card offsets towards 0
+
+    Returns:
+        tuple: (theta per response, per-card offsets or None, final loss)
+    """
+    ln2 = math.log(2.0)
+    elapsed = samples['elapsed']
+    log_base = np.log2(samples['base_interval'])
+    prev_response = samples['prev_response']
+    recalled = samples['recalled']
+    n = len(recalled)
+
+    # Start from the half-life implied by waiting exactly the base interval
+    theta = np.zeros(len(RESPONSES))
+    offsets = np.zeros(n_cards) if card_index is not None else None
+    params = [theta] if offsets is None else [theta, offsets]
+    moments = [(np.zeros_like(p), np.zeros_like(p)) for p in params]
+    beta1, beta2, eps = 0.9, 0.999, 1e-8
+    loss = 0.0
+
+    for step in range(1, steps + 1):
+        log_half_life = log_base + theta[prev_response]
+        if offsets is not None:
+            log_half_life = log_half_life + offsets[card_index]
+
+        ratio = elapsed * np.exp2(-log_half_life)
+        p = np.clip(np.exp2(-ratio), 1e-4, 1 - 1e-4)
+        error = p - recalled
+        loss = float(np.mean(error ** 2))
+
+        # d(loss)/d(log2 half-life) for every sample at once
+        dz = 2.0 * error * p * ln2 * ln2 * ratio / n
+        grads = [np.bincount(prev_response, weights=dz, minlength=len(RESPONSES))]
+        if offsets is not None:
+            grads.append(np.bincount(card_index, weights=dz, minlength=n_cards)
+                         + 2.0 * card_l2 * offsets / n)
+            loss += float(card_l2 * np.sum(offsets ** 2) / n)
+
+        for param, grad, (m, v) in zip(params, grads, moments):
+            m *= beta1
+            m += (1 - beta1) * grad
+            v *= beta2
+            v += (1 - beta2) * grad ** 2
+            m_hat = m / (1 - beta1 ** step)
+            v_hat = v / (1 - beta2 ** step)
+            param -= learning_rate * m_hat / (np.sqrt(v_hat) + eps)
+
+    return theta, offsets, loss
+
+
+def theta_to_multipliers(theta, retention):
+    """Convert fitted thetas to the interval multiplier that hits the target retention"""
+    factor = -math.log2(retention)
+    multipliers = {}
+    for response, value in zip(RESPONSES, theta):
+        multiplier = float(np.clip(2.0 ** value * factor, MIN_MULTIPLIER, MAX_MULTIPLIER))
+        multipliers[str(response)] = round(multiplier, 3)
+    return multipliers
+
+
+def optimize(samples, retention, per_deck=False, per_card=False, min_reviews=5,
+             steps=2000, learning_rate=0.05):
+    """
+    Fit scheduler parameters for the whole log
+
+    Returns:
+        dict: parameter file contents
+    """
+    theta, _, loss = fit_half_life(samples, None, 0, steps, learning_rate)
+    params = {
+        'retention': retention,
+        'multipliers': theta_to_multipliers(theta, retention),
+        'reviews': int(len(samples['recalled'])),
+        'loss': round(loss, 6),
+    }
+
+    if per_deck:
+        params['decks'] = {}
+        for deck in np.unique(samples['deck']):
+            mask = samples['deck'] == deck
+            if np.count_nonzero(mask) < min_reviews:
+                continue
+            subset = {key: value[mask] for key, value in samples.items()}
+            deck_theta, _, _ = fit_half_life(subset, None, 0, steps, learning_rate)
+            params['decks'][str(deck)] = theta_to_multipliers(deck_theta, retention)
+
+    if per_card:
+        cards, card_index, counts = np.unique(samples['card_id'].astype(str),
+                                              return_inverse=True, return_counts=True)
+        _, offsets, _ = fit_half_life(samples, card_index, len(cards), steps, learning_rate)
+        # Cards are stored as a scale on top of the deck multipliers
+        params['cards'] = {
+            str(card): round(float(2.0 ** offset), 3)
+            for card, offset, count in zip(cards, offsets, counts)
+            if count >= min_reviews and abs(offset) > 0.01
+        }
+
+    return params
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fit MiniAnki scheduler parameters from review logs')
+    parser.add_argument('input_file', help='Path to the review log CSV file')
+    parser.add_argument('output_file', help='Path for the output parameter JSON file')
+    parser.add_argument('--retention', type=float, default=0.9,
+                        help='Target probability of not answering hard (default: 0.9)')
+    parser.add_argument('--per-deck', action='store_true', help='Also fit multipliers per deck')
+    parser.add_argument('--per-card', action='store_true', help='Also fit a scale per card')
+    parser.add_argument('--min-reviews', type=int, default=5,
+                        help='Minimum reviews before a deck or card gets its own parameters')
+    parser.add_argument('--steps', type=int, default=2000, help='Number of gradient steps')
+    parser.add_argument('--learning-rate', type=float, default=0.05, help='Gradient step size')
+
+    args = parser.parse_args()
+
+    try:
+        if not 0 < args.retention < 1:
+            raise ValueError("retention must be between 0 and 1")
+
+        log = load_review_log(args.input_file)
+        samples = build_training_set(log)
+        if len(samples['recalled']) == 0:
+            raise ValueError("no consecutive reviews of the same card in the log")
+
+        params = optimize(samples, args.retention, args.per_deck, args.per_card,
+                          args.min_reviews, args.steps, args.learning_rate)
+
+        # Compact output, the file is read on the device
+        with open(args.output_file, 'w', encoding='utf-8') as f:
+            json.dump(params, f, ensure_ascii=False, separators=(',', ':'))
+
+        print(f"Fitted {params['reviews']} reviews, multipliers: {params['multipliers']}")
+        print(f"Saved scheduler parameters to {args.output_file}")
+
+    except Exception as e:
+        print(f"Error: {e}")
+
+if __name__ == "__main__":
+    main()
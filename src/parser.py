@@ -1,6 +1,7 @@
 import csv
 import json
 import argparse
+import os
 import re
 
 """
@@ -16,7 +17,14 @@ Usage:
 Example:
     python parser.py Mandarin_Vocabulary_csv.csv flashcards.json
 
-The output JSON file can be loaded directly into MiniAnki
+The output JSON file can be loaded directly into MiniAnki.
+To add it as one deck of a multi-deck SD card, write it next to the deck
+manifest and register it:
+
+    python parser.py hsk1.csv decks/hsk1.json --manifest decks/manifest.json
+
+Decks use the interval multiplier scheduler unless --scheduler picks
+another, e.g. --scheduler leitner for Leitner boxes.
 """
 
 def parse_anki_csv_export(file_path):
@@ -65,10 +73,37 @@ def parse_anki_csv_export(file_path):
     
     return flashcards
 
+def add_to_manifest(manifest_path, deck_file, deck_name=None, scheduler=None):
+    """
+    Register a deck shard in the deck manifest, creating the manifest if needed
+    """
+    manifest = {'active': [], 'decks': {}}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+    # Shards are stored relative to the manifest's directory
+    file_name = os.path.relpath(deck_file, os.path.dirname(os.path.abspath(manifest_path)))
+    name = deck_name or os.path.splitext(os.path.basename(deck_file))[0]
+    manifest.setdefault('decks', {})[name] = file_name.replace(os.sep, '/')
+    if not manifest.get('active'):
+        manifest['active'] = [name]
+    if scheduler:
+        manifest.setdefault('schedulers', {})[name] = scheduler
+
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    return name
+
 def main():
     parser = argparse.ArgumentParser(description='Convert Anki CSV export to JSON for MiniAnki')
     parser.add_argument('input_file', help='Path to the Anki export CSV file')
     parser.add_argument('output_file', help='Path for the output JSON file')
+    parser.add_argument('--manifest', help='Deck manifest to register the output file in')
+    parser.add_argument('--deck', help='Deck name in the manifest (default: output file name)')
+    parser.add_argument('--scheduler', choices=['multiplier', 'indexed', 'leitner'],
+                        help='Scheduler the device uses for the deck (default: multiplier)')
     
     args = parser.parse_args()
     
@@ -80,6 +115,10 @@ def main():
             json.dump(flashcards, f, ensure_ascii=False, indent=2)
         
         print(f"Successfully converted {len(flashcards)} flashcards to {args.output_file}")
+
+        if args.manifest:
+            name = add_to_manifest(args.manifest, args.output_file, args.deck, args.scheduler)
+            print(f"Registered deck '{name}' in {args.manifest}")
     
     except Exception as e:
         print(f"Error: {e}")
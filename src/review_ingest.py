@@ -0,0 +1,280 @@
+import argparse
+import csv
+import json
+import os
+import struct
+import time
+
+import numpy as np
+
+from Utils.ReviewExport import FILE_MAGIC, RECORD_MAGIC, RECORD_HEADER_FORMAT, RECORD_FORMAT
+
+"""
+MiniAnki Fleet Review Log Ingestion
+
+This script collects the review history files (reviews.mrx, see
+Utils/ReviewExport.py) from SD card dumps of many devices into one columnar
+store: a directory of numpy column segments plus a table of the device,
+deck and card names the integer columns refer to.
+
+Each review is identified by device, boot and sequence number, so dumps
+can be ingested again, or overlap, without duplicating rows. Each run adds
+one segment with only the new rows.
+
+Usage:
+    python review_ingest.py STORE DUMP [DUMP ...] [--csv review_log.csv]
+
+Example:
+    python review_ingest.py fleet_store /media/sd1 /media/sd2 --csv review_log.csv
+
+DUMP is a copy of a device's SD card or a single .mrx file. --csv writes
+every stored review in the review log format optimizer.py reads.
+"""
+
+# Column name -> dtype, deck, card and device hold indexes into the name table
+COLUMNS = {
+    'device': np.int32,
+    'boot': np.uint32,
+    'seq': np.uint32,
+    'timestamp': np.float64,
+    'interval': np.uint32,
+    'prev_interval': np.uint32,
+    'review_count': np.uint16,
+    'response': np.uint8,
+    'deck': np.int32,
+    'card': np.int32,
+}
+# The fixed part of a record, in file order
+RECORD_DTYPE = np.dtype([('boot', '<u4'), ('seq', '<u4'), ('timestamp', '<f8'),
+                         ('interval', '<u4'), ('prev_interval', '<u4'),
+                         ('review_count', '<u2'), ('response', 'u1')])
+REVIEW_LOG_COLUMNS = ['card_id', 'timestamp', 'response', 'prev_interval', 'deck', 'device', 'boot']
+EXPORT_SUFFIX = '.mrx'
+
+
+class NameTable:
+    """Names stored once, referred to by index from the columns"""
+
+    def __init__(self, names=()):
+        self.names = list(names)
+        self.index = {name.encode('utf-8'): i for i, name in enumerate(self.names)}
+
+    def code(self, raw):
+        """Index of a UTF-8 encoded name, adding it if new"""
+        code = self.index.get(raw)
+        if code is None:
+            code = len(self.names)
+            self.names.append(raw.decode('utf-8'))
+            self.index[raw] = code
+        return code
+
+
+def read_export(file_path, devices, decks, cards):
+    """
+    Parse one review history file
+
+    A record cut short by a power loss ends the file.
+
+    Returns:
+        dict: column name -> numpy array
+    """
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    if data[:len(FILE_MAGIC)] != FILE_MAGIC:
+        raise ValueError(f"{file_path} is not a MiniAnki review export")
+
+    offset = len(FILE_MAGIC)
+    device = devices.code(data[offset + 1:offset + 1 + data[offset]])
+    offset += 1 + data[offset]
+
+    header = struct.Struct(RECORD_HEADER_FORMAT)
+    fixed_size = struct.calcsize(RECORD_FORMAT)
+    # Fixed parts are gathered and decoded with numpy in one go
+    fixed = bytearray()
+    deck_codes = []
+    card_codes = []
+    end = len(data)
+    while offset + header.size <= end:
+        magic, length = header.unpack_from(data, offset)
+        start = offset + header.size
+        offset = start + length
+        if magic != RECORD_MAGIC or offset > end or length < fixed_size + 2:
+            break
+        fixed += data[start:start + fixed_size]
+        position = start + fixed_size
+        name_end = position + 1 + data[position]
+        deck_codes.append(decks.code(data[position + 1:name_end]))
+        card_codes.append(cards.code(data[name_end + 1:name_end + 1 + data[name_end]]))
+
+    records = np.frombuffer(bytes(fixed), dtype=RECORD_DTYPE)
+    columns = {name: records[name].astype(COLUMNS[name]) for name in RECORD_DTYPE.names}
+    columns['device'] = np.full(len(records), device, dtype=COLUMNS['device'])
+    columns['deck'] = np.array(deck_codes, dtype=COLUMNS['deck'])
+    columns['card'] = np.array(card_codes, dtype=COLUMNS['card'])
+    return columns
+
+
+def find_exports(paths):
+    """Review history files in the given files and directories"""
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for directory, _, file_names in os.walk(path):
+            for file_name in sorted(file_names):
+                if file_name.endswith(EXPORT_SUFFIX):
+                    yield os.path.join(directory, file_name)
+
+
+def _concat(parts):
+    """Join column dictionaries, empty columns if there are none"""
+    return {name: np.concatenate([part[name] for part in parts]) if parts
+            else np.zeros(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+
+
+def new_rows(existing, incoming):
+    """
+    Find the incoming rows that are not stored yet, nor repeated earlier in incoming
+
+    Rows are sorted by device, then boot and sequence, with the stored rows
+    first, so a row is a duplicate exactly when it equals its predecessor.
+
+    Returns:
+        numpy.ndarray: indexes into incoming, in incoming order
+    """
+    stored = len(existing['device'])
+    device = np.concatenate([existing['device'], incoming['device']])
+    key = np.concatenate([
+        (existing['boot'].astype(np.uint64) << np.uint64(32)) | existing['seq'],
+        (incoming['boot'].astype(np.uint64) << np.uint64(32)) | incoming['seq']])
+    source = np.arange(len(device))
+
+    order = np.lexsort((source, key, device))
+    device = device[order]
+    key = key[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = (device[1:] != device[:-1]) | (key[1:] != key[:-1])
+    keep = order[first & (order >= stored)] - stored
+    keep.sort()
+    return keep
+
+
+class ReviewStore:
+    """Columnar store of reviews from many devices"""
+
+    def __init__(self, path):
+        self.path = path
+        self.devices = NameTable()
+        self.decks = NameTable()
+        self.cards = NameTable()
+        self.segments = []
+
+        names_path = os.path.join(path, 'names.json')
+        if os.path.exists(names_path):
+            with open(names_path, 'r', encoding='utf-8') as f:
+                names = json.load(f)
+            self.devices = NameTable(names['devices'])
+            self.decks = NameTable(names['decks'])
+            self.cards = NameTable(names['cards'])
+            self.segments = names['segments']
+
+    def load(self):
+        """
+        Read every stored column
+
+        Returns:
+            dict: column name -> numpy array
+        """
+        parts = []
+        for segment in self.segments:
+            with np.load(os.path.join(self.path, segment)) as data:
+                parts.append({name: data[name] for name in COLUMNS})
+        return _concat(parts)
+
+    def ingest(self, paths):
+        """
+        Add the reviews of the given dumps that are not stored yet
+
+        Returns:
+            tuple: (rows added, duplicate rows skipped)
+        """
+        parts = []
+        for file_path in find_exports(paths):
+            parts.append(read_export(file_path, self.devices, self.decks, self.cards))
+        incoming = _concat(parts)
+        keep = new_rows(self.load(), incoming)
+        skipped = len(incoming['device']) - len(keep)
+        if len(keep):
+            self._write_segment({name: column[keep] for name, column in incoming.items()})
+        return len(keep), skipped
+
+    def _write_segment(self, columns):
+        """Store new rows as a segment and record it with the names"""
+        os.makedirs(self.path, exist_ok=True)
+        segment = 'part-%05d.npz' % len(self.segments)
+        np.savez(os.path.join(self.path, segment), **columns)
+        self.segments.append(segment)
+
+        # The names file is replaced last, so a failed run leaves no segment in use
+        names_path = os.path.join(self.path, 'names.json')
+        with open(names_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'devices': self.devices.names, 'decks': self.decks.names,
+                       'cards': self.cards.names, 'segments': self.segments},
+                      f, ensure_ascii=False)
+        os.replace(names_path + '.tmp', names_path)
+
+    def export_review_log(self, file_path):
+        """
+        Write every review as an optimizer.py review log, per device in review order
+
+        The device and boot columns tell the consumers which timestamps share
+        a clock.
+
+        Returns:
+            int: number of rows written
+        """
+        columns = self.load()
+        order = np.lexsort((columns['seq'], columns['boot'], columns['device']))
+        cards = np.array(self.cards.names, dtype=object)[columns['card'][order]]
+        decks = np.array(self.decks.names, dtype=object)[columns['deck'][order]]
+        devices = np.array(self.devices.names, dtype=object)[columns['device'][order]]
+        with open(file_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(REVIEW_LOG_COLUMNS)
+            writer.writerows(zip(cards, columns['timestamp'][order].tolist(),
+                                 columns['response'][order].tolist(),
+                                 columns['prev_interval'][order].tolist(), decks, devices,
+                                 columns['boot'][order].tolist()))
+        return len(order)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Collect MiniAnki review histories into a columnar store')
+    parser.add_argument('store', help='Store directory, created if needed')
+    parser.add_argument('dumps', nargs='*', help='SD card dumps or .mrx files to ingest')
+    parser.add_argument('--csv', help='Write all stored reviews as a review log CSV for optimizer.py')
+
+    args = parser.parse_args()
+
+    try:
+        store = ReviewStore(args.store)
+        if args.dumps:
+            start = time.perf_counter()
+            added, skipped = store.ingest(args.dumps)
+            print(f"Added {added} reviews, skipped {skipped} already stored "
+                  f"({time.perf_counter() - start:.2f}s)")
+
+        columns = store.load()
+        counts = np.bincount(columns['device'], minlength=len(store.devices.names))
+        for device, count in zip(store.devices.names, counts):
+            print(f"{device}: {count} reviews")
+
+        if args.csv:
+            rows = store.export_review_log(args.csv)
+            print(f"Wrote {rows} reviews to {args.csv}")
+
+    except Exception as e:
+        print(f"Error: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,609 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from Utils.Constants import *
+from Utils.DeckFile import parse_deck, read_deck, write_deck
+from Utils.Flashcard import Flashcard
+from Utils.Scheduler import SCHEDULERS, IndexedMultiplierScheduler, create_scheduler
+
+"""
+MiniAnki Multi-User Scheduling Service
+
+This script serves the device's scheduling rules (Utils/Scheduler.py) over
+HTTP to many learners at once from one asyncio event loop. Each learner has
+their own copy of a template deck and their own scheduler, indexed by due
+time so picking and grading a card does not scan the deck.
+
+Learners are read and built in one worker thread, so the event loop keeps
+serving loaded learners while others load; --warm loads every saved
+learner before the service starts listening.
+
+Reviews change the learners in memory; a background task saves them in
+batches (write-behind) and unloads learners that have been idle. As on the
+device's review ring, a save appends only the cards reviewed since the last
+one to the learner's journal; the whole deck (Utils/DeckFile.py) is
+rewritten once the journal is as long as the deck.
+
+Endpoints (JSON):
+    GET  /users/USER/next     next card, or null and the next due time
+    POST /users/USER/review   {"card": HANZI, "response": 1-3}
+    GET  /users/USER/stats    card, due and new counts
+    GET  /health              service counters
+
+Usage:
+    python schedule_server.py --deck flashcards.json --data DIR [--port 8080]
+    python schedule_server.py --load USERS [--duration SECONDS] [--port 8080]
+
+Example:
+    python schedule_server.py --deck hsk1.json --data learners --params scheduler_params.json
+    python schedule_server.py --deck hsk1.json --data learners --warm
+    python schedule_server.py --load 2000 --duration 30
+
+--load runs a load generator against a running service: USERS learners on
+their own keep-alive connections, each fetching and reviewing cards with
+a random think time, then prints throughput and latency percentiles.
+"""
+
+USER_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+MAX_HEADER_BYTES = 8192
+MAX_BODY_BYTES = 4096
+# Seconds a keep-alive connection may wait for its next request
+IDLE_TIMEOUT = 60
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+def load_multipliers(params_path):
+    """
+    Response multiplier function from an optimizer.py parameters file
+
+    Same rules as MiniAnkiSetup.response_multiplier: deck multipliers
+    override the global ones, card scales apply on top.
+    """
+    multipliers = {
+        RESPONSE_EASY: RESPONSE_EASY_MULTIPLIER,
+        RESPONSE_MEDIUM: RESPONSE_MEDIUM_MULTIPLIER,
+        RESPONSE_HARD: RESPONSE_HARD_MULTIPLIER
+    }
+    card_scales = {}
+    deck_multipliers = {}
+    if params_path:
+        with open(params_path, 'r', encoding='utf-8') as f:
+            params = json.load(f)
+        for response, multiplier in params.get('multipliers', {}).items():
+            if int(response) in multipliers:
+                multipliers[int(response)] = float(multiplier)
+        card_scales = params.get('cards', {})
+        for deck, fitted in params.get('decks', {}).items():
+            deck_multipliers[deck] = dict(multipliers)
+            for response, multiplier in fitted.items():
+                if int(response) in multipliers:
+                    deck_multipliers[deck][int(response)] = float(multiplier)
+
+    def response_multiplier(card, response):
+        return deck_multipliers.get(card.deck, multipliers)[response] * card_scales.get(card.hanzi, 1.0)
+    return response_multiplier
+
+
+class Learner:
+    """One learner's cards and scheduler"""
+
+    def __init__(self, user, cards, scheduler, current_time):
+        self.user = user
+        self.cards = cards
+        self.by_hanzi = {card.hanzi: card for card in cards}
+        self.scheduler = scheduler
+        self.scheduler.rebuild(cards, current_time)
+        # Cards reviewed since the last save
+        self.changed = set()
+        self.journal_records = 0
+        self.last_used = time.monotonic()
+
+
+class ScheduleService:
+    def __init__(self, template_path, data_dir, scheduler_kind=IndexedMultiplierScheduler.name,
+                 params_path=None, flush_interval=5.0, idle_seconds=600, flush_batch=20000):
+        """
+        Initialize the service, call serve() to start it
+
+        Args:
+            template_path: deck every new learner starts from (parser.py output)
+            data_dir: directory of the learners' deck files
+            flush_interval: seconds between write-behind batches
+            idle_seconds: learners unused this long and saved are unloaded
+            flush_batch: cards snapshotted per event loop turn while flushing
+        """
+        with open(template_path, 'rb') as f:
+            self.template = parse_deck(f.read())
+        self.deck_name = os.path.splitext(os.path.basename(template_path))[0]
+        self.data_dir = data_dir
+        self.scheduler_kind = scheduler_kind
+        self.multiplier = load_multipliers(params_path)
+        self.flush_interval = flush_interval
+        self.idle_seconds = idle_seconds
+        self.flush_batch = flush_batch
+
+        self.learners = {}
+        # user -> future of a load in progress, so concurrent requests load once
+        self.loading = {}
+        # One worker builds the decks: the event loop keeps serving loaded
+        # learners, and only one build at a time contends for the interpreter lock
+        self.load_executor = ThreadPoolExecutor(max_workers=1)
+        self.dirty = set()
+        self.counters = {'requests': 0, 'reviews': 0, 'loads': 0, 'saves': 0,
+                         'save_errors': 0, 'evictions': 0}
+
+    def deck_path(self, user):
+        return os.path.join(self.data_dir, user + '.json')
+
+    def journal_path(self, user):
+        return os.path.join(self.data_dir, user + '.log')
+
+    def _read_learner(self, user):
+        """
+        Learner's saved deck and journal, the template if there is no deck
+
+        Returns:
+            tuple: (card dictionaries, journal records)
+        """
+        try:
+            card_dicts = read_deck(self.deck_path(user))
+        except OSError:
+            card_dicts = self.template
+        records = []
+        try:
+            with open(self.journal_path(user), 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # A save cut short ends the journal
+                        break
+        except OSError:
+            pass
+        return card_dicts, records
+
+    def _build_cards(self, card_dicts, records):
+        """Cards with the journaled reviews applied"""
+        cards = [Flashcard.from_dict(card_dict) for card_dict in card_dicts]
+        by_hanzi = {}
+        for card in cards:
+            card.deck = self.deck_name
+            by_hanzi[card.hanzi] = card
+        for hanzi, interval, last_review, review_count in records:
+            card = by_hanzi.get(hanzi)
+            # Records older than the deck file are left over from a checkpoint
+            if card is not None and review_count > card.review_count:
+                card.interval = interval
+                card.last_review = last_review
+                card.review_count = review_count
+        return cards
+
+    def _load_learner(self, user):
+        """Read and build a learner (runs in the load worker thread)"""
+        card_dicts, records = self._read_learner(user)
+        learner = Learner(user, self._build_cards(card_dicts, records),
+                          create_scheduler(self.scheduler_kind, self.multiplier), time.time())
+        learner.journal_records = len(records)
+        return learner
+
+    async def learner(self, user):
+        """Loaded learner, reading their deck without blocking the event loop"""
+        learner = self.learners.get(user)
+        if learner is None:
+            pending = self.loading.get(user)
+            if pending is None:
+                pending = asyncio.get_running_loop().create_future()
+                self.loading[user] = pending
+                try:
+                    learner = await asyncio.get_running_loop().run_in_executor(
+                        self.load_executor, self._load_learner, user)
+                    self.learners[user] = learner
+                    self.counters['loads'] += 1
+                    pending.set_result(learner)
+                except Exception as e:
+                    pending.set_exception(e)
+                    # Retrieved here so an unawaited failure is not reported twice
+                    pending.exception()
+                    raise
+                finally:
+                    del self.loading[user]
+            else:
+                learner = await pending
+        learner.last_used = time.monotonic()
+        return learner
+
+    async def warm_up(self):
+        """
+        Load every learner with a saved deck or journal
+
+        Returns:
+            int: number of learners loaded
+        """
+        users = set()
+        for file_name in os.listdir(self.data_dir):
+            user, extension = os.path.splitext(file_name)
+            if extension in ('.json', '.log') and USER_PATTERN.match(user):
+                users.add(user)
+        await asyncio.gather(*(self.learner(user) for user in sorted(users)))
+        return len(users)
+
+    def next_card(self, learner):
+        current_time = time.time()
+        card = learner.scheduler.next_card(current_time)
+        if card is None:
+            return {'card': None, 'next_due': learner.scheduler.next_due_time(current_time)}
+        return {'card': card.to_dict(), 'next_due': current_time}
+
+    def review(self, learner, hanzi, response):
+        card = learner.by_hanzi.get(hanzi)
+        if card is None:
+            return 404, {'error': 'no card %s' % hanzi}
+        if response not in (RESPONSE_EASY, RESPONSE_MEDIUM, RESPONSE_HARD):
+            return 400, {'error': 'response must be %d, %d or %d' % (
+                RESPONSE_EASY, RESPONSE_MEDIUM, RESPONSE_HARD)}
+        prev_interval = card.interval
+        learner.scheduler.grade(card, response, time.time())
+        card.review_count += 1
+        learner.changed.add(card)
+        self.dirty.add(learner.user)
+        self.counters['reviews'] += 1
+        return 200, {'card': hanzi, 'prev_interval': prev_interval, 'interval': card.interval,
+                     'due': card.last_review + card.interval}
+
+    def learner_stats(self, learner):
+        current_time = time.time()
+        due = sum(1 for card in learner.cards if card.last_review is not None
+                  and card.last_review + card.interval <= current_time)
+        new = sum(1 for card in learner.cards if card.last_review is None)
+        return {'cards': len(learner.cards), 'due': due, 'new': new,
+                'reviews': sum(card.review_count for card in learner.cards),
+                'scheduler': learner.scheduler.name,
+                'next_due': learner.scheduler.next_due_time(current_time)}
+
+    async def route(self, method, target, body):
+        """
+        Handle one request
+
+        Returns:
+            tuple: (status, JSON-serializable payload)
+        """
+        parts = target.split('?', 1)[0].strip('/').split('/')
+        if parts == ['health']:
+            return 200, dict(self.counters, loaded=len(self.learners), dirty=len(self.dirty))
+        if len(parts) != 3 or parts[0] != 'users':
+            return 404, {'error': 'not found'}
+        user, action = parts[1], parts[2]
+        if not USER_PATTERN.match(user):
+            return 400, {'error': 'bad user id'}
+
+        if action == 'next' and method == 'GET':
+            return 200, self.next_card(await self.learner(user))
+        if action == 'stats' and method == 'GET':
+            return 200, self.learner_stats(await self.learner(user))
+        if action == 'review':
+            if method != 'POST':
+                return 405, {'error': 'use POST'}
+            try:
+                request = json.loads(body)
+                hanzi = request['card']
+                response = int(request['response'])
+            except (ValueError, KeyError, TypeError):
+                return 400, {'error': 'expected {"card": HANZI, "response": 1-3}'}
+            return self.review(await self.learner(user), hanzi, response)
+        return 404, {'error': 'not found'}
+
+    async def handle_connection(self, reader, writer):
+        """Serve HTTP/1.1 requests on one keep-alive connection"""
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), IDLE_TIMEOUT)
+                except asyncio.LimitOverrunError:
+                    await self.respond(writer, 413, {'error': 'headers too long'}, False)
+                    break
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+
+                lines = head.decode('latin-1').split('\r\n')
+                request_line = lines[0].split(' ')
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(':')
+                    if value:
+                        headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                try:
+                    length = int(headers.get('content-length', 0))
+                except ValueError:
+                    length = -1
+                if len(request_line) != 3 or length < 0:
+                    await self.respond(writer, 400, {'error': 'bad request'}, False)
+                    break
+                if length > MAX_BODY_BYTES:
+                    await self.respond(writer, 413, {'error': 'body too long'}, False)
+                    break
+                try:
+                    body = await reader.readexactly(length) if length else b''
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+
+                self.counters['requests'] += 1
+                try:
+                    status, payload = await self.route(request_line[0], request_line[1], body)
+                except Exception as e:
+                    status, payload = 500, {'error': str(e)}
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep_alive):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        writer.write(('HTTP/1.1 %d %s\r\nContent-Type: application/json\r\n'
+                      'Content-Length: %d\r\nConnection: %s\r\n\r\n' % (
+                          status, STATUS_TEXT.get(status, ''), len(data),
+                          'keep-alive' if keep_alive else 'close')).encode() + data)
+        await writer.drain()
+
+    def _write_batch(self, batch):
+        """
+        Save snapshotted learners (runs in a worker thread)
+
+        Returns:
+            list: users whose save failed
+        """
+        failed = []
+        for user, records, card_dicts in batch:
+            try:
+                if card_dicts is not None:
+                    if write_deck(self.deck_path(user), card_dicts) is None:
+                        raise OSError("deck not written")
+                    # The deck now holds every journaled review
+                    if os.path.exists(self.journal_path(user)):
+                        os.remove(self.journal_path(user))
+                else:
+                    with open(self.journal_path(user), 'a', encoding='utf-8') as f:
+                        f.write(''.join(json.dumps(record, ensure_ascii=False) + '\n'
+                                        for record in records))
+            except OSError as e:
+                print(f"Error saving {user}: {e}")
+                failed.append(user)
+        return failed
+
+    async def flush(self):
+        """
+        Save every learner reviewed since the last flush
+
+        Snapshots are taken on the event loop, about flush_batch cards per
+        turn so requests keep being served, and written in a worker thread.
+        Cards reviewed after their snapshot are saved by the next flush.
+        """
+        users = list(self.dirty)
+        self.dirty.clear()
+        batch = []
+        snapshotted = 0
+        for user in users:
+            learner = self.learners.get(user)
+            if learner is None or not learner.changed:
+                continue
+            records = [[card.hanzi, card.interval, card.last_review, card.review_count]
+                       for card in learner.changed]
+            learner.changed = set()
+            learner.journal_records += len(records)
+            card_dicts = None
+            if learner.journal_records >= len(learner.cards):
+                card_dicts = [card.to_dict() for card in learner.cards]
+                learner.journal_records = 0
+            batch.append((user, records, card_dicts))
+
+            snapshotted += len(records) if card_dicts is None else len(card_dicts)
+            if snapshotted >= self.flush_batch:
+                snapshotted = 0
+                await asyncio.sleep(0)
+        if not batch:
+            return
+        failed = await asyncio.get_running_loop().run_in_executor(None, self._write_batch, batch)
+        self.counters['saves'] += len(batch) - len(failed)
+        self.counters['save_errors'] += len(failed)
+        for user, records, _ in batch:
+            learner = self.learners.get(user)
+            if learner is not None and user in failed:
+                # Saved again with the next flush, as a whole deck to be safe
+                learner.changed.update(learner.by_hanzi[record[0]] for record in records)
+                learner.journal_records = len(learner.cards)
+                self.dirty.add(user)
+
+    def evict_idle(self):
+        """Unload saved learners that have not been used for idle_seconds"""
+        cutoff = time.monotonic() - self.idle_seconds
+        for user in [user for user, learner in self.learners.items()
+                     if not learner.changed and learner.last_used < cutoff]:
+            del self.learners[user]
+            self.counters['evictions'] += 1
+
+    async def flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error saving learners: {e}")
+            self.evict_idle()
+
+    async def serve(self, host, port, warm=False):
+        os.makedirs(self.data_dir, exist_ok=True)
+        if warm:
+            start = time.perf_counter()
+            count = await self.warm_up()
+            print(f"Loaded {count} learners in {time.perf_counter() - start:.1f}s")
+        server = await asyncio.start_server(self.handle_connection, host, port,
+                                            limit=MAX_HEADER_BYTES, backlog=4096)
+        flusher = asyncio.create_task(self.flush_loop())
+        stop = asyncio.Event()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            try:
+                asyncio.get_running_loop().add_signal_handler(signal_number, stop.set)
+            except (NotImplementedError, RuntimeError):
+                # Windows: Ctrl+C still stops asyncio.run, the finally below saves
+                pass
+        print(f"Serving {len(self.template)} cards per learner on {host}:{port}, "
+              f"{self.scheduler_kind} scheduler, decks in {self.data_dir}")
+        try:
+            await stop.wait()
+        finally:
+            # Open keep-alive connections are not waited for, the reviews they
+            # made are in memory and saved here
+            server.close()
+            flusher.cancel()
+            await self.flush()
+            print(f"Saved, {self.counters['reviews']} reviews served")
+
+
+async def _request(reader, writer, method, path, payload=None):
+    """One keep-alive request from the load generator, returns (status, JSON)"""
+    body = b'' if payload is None else json.dumps(payload).encode('utf-8')
+    writer.write(('%s %s HTTP/1.1\r\nHost: localhost\r\nContent-Length: %d\r\n\r\n' % (
+        method, path, len(body))).encode() + body)
+    await writer.drain()
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    length = 0
+    for line in head.split(b'\r\n'):
+        if line.lower().startswith(b'content-length:'):
+            length = int(line.split(b':', 1)[1])
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def _simulate_learner(host, port, user, deadline, think, latencies, first_latencies, errors):
+    """
+    Fetch and review cards as one learner until the deadline
+
+    The first request loads the learner on the service, so it is timed
+    separately.
+    """
+    # Spread the connections out so the start is not one burst
+    await asyncio.sleep(random.uniform(0, think))
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        errors['connect'] = errors.get('connect', 0) + 1
+        return
+    try:
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            status, result = await _request(reader, writer, 'GET', '/users/%s/next' % user)
+            (latencies if first_latencies is None else first_latencies).append(time.perf_counter() - start)
+            first_latencies = None
+            if status != 200:
+                errors[status] = errors.get(status, 0) + 1
+            elif result['card'] is not None:
+                # Mostly remembered, like a learner partway through a deck
+                response = random.choices((RESPONSE_EASY, RESPONSE_MEDIUM, RESPONSE_HARD), (5, 3, 2))[0]
+                start = time.perf_counter()
+                status, _ = await _request(reader, writer, 'POST', '/users/%s/review' % user,
+                                           {'card': result['card']['hanzi'], 'response': response})
+                latencies.append(time.perf_counter() - start)
+                if status != 200:
+                    errors[status] = errors.get(status, 0) + 1
+            await asyncio.sleep(random.uniform(0, 2 * think))
+    except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+        errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+    finally:
+        writer.close()
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+async def run_load(host, port, users, duration, think):
+    """
+    Run the load generator and report latency percentiles, loads aside
+
+    Returns:
+        dict: requests, throughput and latency figures in milliseconds
+    """
+    latencies = []
+    first_latencies = []
+    errors = {}
+    start = time.monotonic()
+    deadline = start + duration
+    await asyncio.gather(*(_simulate_learner(host, port, 'load-%05d' % i, deadline, think,
+                                             latencies, first_latencies, errors) for i in range(users)))
+    elapsed = time.monotonic() - start
+    latencies.sort()
+    first_latencies.sort()
+    return {
+        'users': users,
+        'requests': len(latencies) + len(first_latencies),
+        'requests_per_second': (len(latencies) + len(first_latencies)) / elapsed,
+        'p50_ms': _percentile(latencies, 0.50) * 1000,
+        'p95_ms': _percentile(latencies, 0.95) * 1000,
+        'p99_ms': _percentile(latencies, 0.99) * 1000,
+        'max_ms': (latencies[-1] if latencies else 0.0) * 1000,
+        'first_p50_ms': _percentile(first_latencies, 0.50) * 1000,
+        'first_max_ms': (first_latencies[-1] if first_latencies else 0.0) * 1000,
+        'errors': errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve MiniAnki scheduling to many learners over HTTP')
+    parser.add_argument('--deck', help='Template deck every new learner starts from')
+    parser.add_argument('--data', default='learners', help='Directory of the learners\' decks')
+    parser.add_argument('--params', help='Scheduler parameters from optimizer.py')
+    parser.add_argument('--scheduler', choices=SCHEDULERS, default=IndexedMultiplierScheduler.name,
+                        help='Scheduler for every learner (default: indexed)')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on or load')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on or load')
+    parser.add_argument('--flush-interval', type=float, default=5.0,
+                        help='Seconds between writes of changed learners')
+    parser.add_argument('--idle', type=float, default=600, help='Seconds before an unused learner is unloaded')
+    parser.add_argument('--warm', action='store_true',
+                        help='Load every saved learner before serving, instead of on first request')
+    parser.add_argument('--load', type=int, metavar='USERS', help='Run the load generator with USERS learners')
+    parser.add_argument('--duration', type=float, default=30, help='Load generator run time in seconds')
+    parser.add_argument('--think', type=float, default=1.0, help='Mean seconds between a learner\'s reviews')
+
+    args = parser.parse_args()
+
+    try:
+        if args.load:
+            report = asyncio.run(run_load(args.host, args.port, args.load, args.duration, args.think))
+            print(f"{report['users']} learners, {report['requests']} requests, "
+                  f"{report['requests_per_second']:.0f}/s")
+            print(f"latency p50 {report['p50_ms']:.2f}ms, p95 {report['p95_ms']:.2f}ms, "
+                  f"p99 {report['p99_ms']:.2f}ms, max {report['max_ms']:.2f}ms")
+            print(f"first request per learner (loads it): p50 {report['first_p50_ms']:.2f}ms, "
+                  f"max {report['first_max_ms']:.2f}ms")
+            if report['errors']:
+                print(f"errors: {report['errors']}")
+            return
+
+        if not args.deck:
+            parser.error('--deck is required to serve')
+        service = ScheduleService(args.deck, args.data, args.scheduler, args.params,
+                                  args.flush_interval, args.idle)
+        try:
+            asyncio.run(service.serve(args.host, args.port, args.warm))
+        except KeyboardInterrupt:
+            pass
+
+    except Exception as e:
+        print(f"Error: {e}")
+
+if __name__ == "__main__":
+    main()
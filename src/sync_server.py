@@ -0,0 +1,403 @@
+import argparse
+import csv
+import json
+import os
+import tempfile
+
+from Utils.DeckFile import parse_deck
+from Utils.Sync import SYNC_PROTOCOL, CONTENT_FIELDS, SCHEDULE_FIELDS, SyncClient, resolve
+
+"""
+MiniAnki Desktop Sync Companion
+
+This script keeps a desktop copy of the decks and syncs it with the device
+over the USB data serial port. Each sync moves only the reviews logged on the
+device since the last sync and the cards changed on the desktop since the
+device last saw them, so its size follows activity, not deck size.
+
+Conflicts are resolved the same way on both sides (Utils/Sync.py: resolve):
+card text comes from the desktop, the schedule from the copy with more
+reviews, the device's on a tie.
+
+Applied reviews are appended to a review log CSV that optimizer.py reads.
+
+Usage:
+    python sync_server.py --import flashcards.json --deck hsk1
+    python sync_server.py --serial PORT [--review-log review_log.csv]
+    python sync_server.py --loopback flashcards.json
+
+Example:
+    python sync_server.py --serial /dev/ttyACM1 --review-log review_log.csv
+
+The device needs usb_cdc.enable(console=True, data=True) in boot.py; PORT is
+the second serial port it shows. --loopback runs a simulated device against a
+scratch store and prints the bytes moved per sync.
+"""
+
+REVIEW_LOG_COLUMNS = ['card_id', 'timestamp', 'response', 'prev_interval', 'deck']
+
+
+def after_cursor(version, deck, card_id, cursor):
+    """
+    Check whether a card version is past a device's sync cursor
+
+    Args:
+        cursor: [version, deck, card id] of the last card the device got,
+            deck and card id None once the whole version was received
+    """
+    cursor_version, cursor_deck, cursor_card = cursor
+    if version != cursor_version:
+        return version > cursor_version
+    return cursor_deck is not None and (deck, card_id) > (cursor_deck, cursor_card)
+
+
+class SyncStore:
+    """Desktop copy of the decks plus what each device has seen"""
+
+    def __init__(self, path=None, review_log=None):
+        self.path = path
+        self.review_log = review_log
+        # Bumped by every change; each card records the version that last changed it
+        self.version = 0
+        # deck -> card id -> card dictionary plus _v (version) and _by (device or None)
+        self.decks = {}
+        # device id -> {"acked_seq": next review sequence not yet received}
+        self.devices = {}
+
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.version = data.get('version', 0)
+            self.decks = data.get('decks', {})
+            self.devices = data.get('devices', {})
+
+    def save(self):
+        if not self.path:
+            return
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.version, 'decks': self.decks, 'devices': self.devices},
+                      f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+    def import_deck(self, file_path, deck):
+        """
+        Add or update cards from a parser.py output file or a device deck file
+
+        Only card text is taken over; schedules stay as the devices left them.
+
+        Returns:
+            int: number of new or changed cards
+        """
+        with open(file_path, 'rb') as f:
+            card_dicts = parse_deck(f.read())
+
+        version = self.version + 1
+        cards = self.decks.setdefault(deck, {})
+        changed = 0
+        for card_dict in card_dicts:
+            card = cards.get(card_dict['hanzi'])
+            if card is None:
+                card = {field: card_dict.get(field) for field in CONTENT_FIELDS + SCHEDULE_FIELDS}
+                card['interval'] = card['interval'] or 300
+                card['review_count'] = card['review_count'] or 0
+                cards[card_dict['hanzi']] = card
+            elif all(card.get(field) == card_dict.get(field) for field in CONTENT_FIELDS):
+                continue
+            for field in CONTENT_FIELDS:
+                card[field] = card_dict.get(field)
+            card['_v'] = version
+            card['_by'] = None
+            changed += 1
+
+        if changed:
+            self.version = version
+        return changed
+
+    def _mark_changed(self, card, deck, card_id, device, cursor, version):
+        """
+        Record a change made by a device
+
+        The change is not echoed back to that device unless the card also
+        had a change the device has not seen yet. A card the same request
+        changed already counts as seen.
+        """
+        seen = (not after_cursor(card.get('_v', 0), deck, card_id, cursor)
+                or (card.get('_v') == version and card.get('_by') == device))
+        card['_v'] = version
+        card['_by'] = device if seen else None
+
+    def _apply_review(self, device, review, cursor, version, log_rows):
+        """
+        Apply one review record from a device
+
+        Returns:
+            bool: True if the card changed
+        """
+        _, deck, card_id, interval, last_review, review_count, response = review
+        card = self.decks.get(deck, {}).get(card_id)
+        if card is None:
+            return False
+
+        log_rows.append([card_id, last_review, response, card['interval'], deck])
+        if review_count <= card.get('review_count', 0):
+            # Another device got further with this card already
+            return False
+        card['interval'] = interval
+        card['last_review'] = last_review
+        card['review_count'] = review_count
+        self._mark_changed(card, deck, card_id, device, cursor, version)
+        return True
+
+    def _merge_device_card(self, device, deck, card_dict, cursor, version):
+        """
+        Merge a full card state sent by a device
+
+        Returns:
+            bool: True if the desktop copy changed
+        """
+        cards = self.decks.setdefault(deck, {})
+        card = cards.get(card_dict['hanzi'])
+        if card is None:
+            card = {field: card_dict.get(field) for field in CONTENT_FIELDS + SCHEDULE_FIELDS}
+            cards[card_dict['hanzi']] = card
+            self._mark_changed(card, deck, card_dict['hanzi'], device, cursor, version)
+            return True
+
+        merged = resolve(card_dict, card)
+        if all(card.get(field) == value for field, value in merged.items()):
+            return False
+        card.update(merged)
+        self._mark_changed(card, deck, card_dict['hanzi'], device, cursor, version)
+        return True
+
+    def handle(self, request):
+        """
+        Answer one sync request from a device
+
+        At most the request's limit of cards are returned, in (version,
+        deck, card id) order; with more to come the reply has "more" and
+        the cursor to send next instead of a new version.
+
+        Returns:
+            dict: the reply
+        """
+        if request.get('protocol') != SYNC_PROTOCOL:
+            return {'protocol': SYNC_PROTOCOL, 'error': 'unsupported protocol'}
+
+        device = request['device']
+        since = request.get('version', 0)
+        cursor = request.get('cursor') or [since, None, None]
+        limit = request.get('limit')
+        state = self.devices.setdefault(device, {'acked_seq': 0})
+        version = self.version + 1
+        changed = False
+        log_rows = []
+
+        for review in request.get('reviews', []):
+            # Reviews received before a lost reply are not applied twice
+            if review[0] < state['acked_seq']:
+                continue
+            changed |= self._apply_review(device, review, cursor, version, log_rows)
+
+        for deck, card_dicts in request.get('cards', {}).items():
+            for card_dict in card_dicts:
+                changed |= self._merge_device_card(device, deck, card_dict, cursor, version)
+
+        if changed:
+            self.version = version
+        state['acked_seq'] = request['seq']
+
+        pending = sorted((card.get('_v', 0), deck, card_id)
+                         for deck, cards in self.decks.items() for card_id, card in cards.items()
+                         if after_cursor(card.get('_v', 0), deck, card_id, cursor))
+        reply_cards = {}
+        sent = 0
+        last = None
+        for key in pending:
+            if limit is not None and sent >= limit:
+                break
+            last = key
+            card = self.decks[key[1]][key[2]]
+            if card.get('_by') != device:
+                reply_cards.setdefault(key[1], []).append(
+                    {field: card.get(field) for field in CONTENT_FIELDS + SCHEDULE_FIELDS})
+                sent += 1
+
+        self.append_review_log(log_rows)
+        self.save()
+        reply = {'protocol': SYNC_PROTOCOL, 'acked_seq': state['acked_seq'], 'cards': reply_cards}
+        if last is not None and last != pending[-1]:
+            reply.update(version=since, cursor=list(last), more=True)
+        else:
+            reply.update(version=self.version, cursor=None)
+        return reply
+
+    def append_review_log(self, rows):
+        """Append applied reviews to the optimizer's review log CSV"""
+        if not self.review_log or not rows:
+            return
+        new_file = not os.path.exists(self.review_log)
+        with open(self.review_log, 'a', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(REVIEW_LOG_COLUMNS)
+            writer.writerows(rows)
+
+
+def serve_serial(store, port, baud=115200):
+    """Answer sync requests arriving on a serial port, one JSON line each"""
+    try:
+        import serial
+    except ImportError:
+        raise RuntimeError("pyserial is required for --serial (pip install pyserial)")
+
+    with serial.Serial(port, baud, timeout=1) as connection:
+        print(f"Waiting for the device on {port}")
+        while True:
+            line = connection.readline()
+            if not line.strip():
+                continue
+            try:
+                reply = store.handle(json.loads(line))
+            except (ValueError, KeyError, TypeError) as e:
+                reply = {'protocol': SYNC_PROTOCOL, 'error': str(e)}
+            connection.write(json.dumps(reply, ensure_ascii=False).encode('utf-8') + b'\n')
+            print(f"Synced {reply.get('cards') and sum(map(len, reply['cards'].values())) or 0} "
+                  f"cards out, acked sequence {reply.get('acked_seq')}")
+
+
+class LoopbackTransport:
+    """Sends requests straight to a SyncStore, through JSON like the serial link"""
+
+    def __init__(self, store):
+        self.store = store
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.connected = True
+
+    def request(self, message):
+        data = json.dumps(message).encode('utf-8') + b'\n'
+        self.bytes_sent += len(data)
+        reply = json.dumps(self.store.handle(json.loads(data))).encode('utf-8') + b'\n'
+        self.bytes_received += len(reply)
+        return json.loads(reply)
+
+
+class LoopbackDevice:
+    """
+    In-memory stand-in for the device's card store
+
+    Implements the store interface SyncClient.sync() uses on the device
+    (MiniAnkiSync), with reviews kept in a list instead of the ring log.
+    """
+
+    def __init__(self, deck, card_dicts):
+        self.deck = deck
+        self.cards = {card['hanzi']: dict(card) for card in card_dicts}
+        self.reviews = []
+
+    def review(self, card_id, response, interval, timestamp):
+        card = self.cards[card_id]
+        card['interval'] = interval
+        card['last_review'] = timestamp
+        card['review_count'] = (card.get('review_count') or 0) + 1
+        self.reviews.append((len(self.reviews), self.deck, card_id, interval, timestamp,
+                             card['review_count'], response))
+
+    def review_sequence(self):
+        return len(self.reviews)
+
+    def reviews_since(self, sequence):
+        return self.reviews[sequence:]
+
+    def reviewed_cards(self):
+        for card in self.cards.values():
+            if card.get('review_count'):
+                yield self.deck, card
+
+    def apply_cards(self, deck, card_dicts):
+        for incoming in card_dicts:
+            card = self.cards.get(incoming['hanzi'])
+            self.cards[incoming['hanzi']] = resolve(card, incoming) if card else dict(incoming)
+
+
+def run_loopback(deck_file, deck='default', reviews=20):
+    """
+    Sync a simulated device with a scratch store and report the traffic
+
+    Returns:
+        list: (step, bytes sent, bytes received)
+    """
+    with open(deck_file, 'rb') as f:
+        card_dicts = parse_deck(f.read())
+
+    store = SyncStore()
+    store.import_deck(deck_file, deck)
+    device = LoopbackDevice(deck, card_dicts)
+    transport = LoopbackTransport(store)
+    state_dir = tempfile.TemporaryDirectory()
+    client = SyncClient(transport, state_path=os.path.join(state_dir.name, 'sync.json'))
+    client.device_id = 'loopback'
+
+    results = []
+
+    def step(name):
+        sent, received = transport.bytes_sent, transport.bytes_received
+        client.sync(device)
+        results.append((name, transport.bytes_sent - sent, transport.bytes_received - received))
+
+    step('first sync')
+    card_ids = list(device.cards)
+    for i in range(reviews):
+        device.review(card_ids[i % len(card_ids)], 1 + i % 3, 300 * (i + 1), float(i * 60))
+    step(f'{reviews} reviews')
+    step('no changes')
+
+    # A desktop edit travels back to the device
+    store.decks[deck][card_ids[0]]['english'] = 'edited on desktop'
+    store.decks[deck][card_ids[0]]['_v'] = store.version = store.version + 1
+    store.decks[deck][card_ids[0]]['_by'] = None
+    step('one desktop edit')
+    assert device.cards[card_ids[0]]['english'] == 'edited on desktop'
+    assert all(store.decks[deck][card_id]['review_count'] == card['review_count']
+               for card_id, card in device.cards.items())
+    state_dir.cleanup()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sync MiniAnki progress with a desktop copy')
+    parser.add_argument('--store', default='sync_store.json',
+                        help='Desktop copy of the decks (default: sync_store.json)')
+    parser.add_argument('--review-log', help='Review log CSV to append synced reviews to')
+    parser.add_argument('--import', dest='import_file', help='Deck JSON file to add to the store')
+    parser.add_argument('--deck', default='default', help='Deck name for --import and --loopback')
+    parser.add_argument('--serial', help='Serial port of the device to serve')
+    parser.add_argument('--baud', type=int, default=115200, help='Serial baud rate')
+    parser.add_argument('--loopback', metavar='DECK_FILE',
+                        help='Sync a simulated device holding DECK_FILE and print the traffic')
+
+    args = parser.parse_args()
+
+    try:
+        if args.loopback:
+            for name, sent, received in run_loopback(args.loopback, args.deck):
+                print(f"{name}: {sent} bytes sent, {received} bytes received")
+            return
+
+        store = SyncStore(args.store, args.review_log)
+        if args.import_file:
+            changed = store.import_deck(args.import_file, args.deck)
+            store.save()
+            print(f"Imported {changed} new or changed cards into deck {args.deck}")
+        if args.serial:
+            serve_serial(store, args.serial, args.baud)
+
+    except KeyboardInterrupt:
+        print("Stopped")
+    except Exception as e:
+        print(f"Error: {e}")
+
+if __name__ == "__main__":
+    main()
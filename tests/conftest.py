@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The host scripts run from src and import Utils from there
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
@@ -0,0 +1,85 @@
+import csv
+
+import numpy as np
+
+from optimizer import (RESPONSE_EASY, RESPONSE_MEDIUM, RESPONSE_HARD, build_training_set,
+                       fit_half_life, load_review_log, optimize)
+
+TRUE_THETA = np.array([1.0, 0.3, -1.0])
+
+
+def write_synthetic_log(path, cards=300, reviews=12, seed=0):
+    """Review log drawn from the half-life model with TRUE_THETA"""
+    rng = np.random.default_rng(seed)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['card_id', 'timestamp', 'response', 'prev_interval', 'deck'])
+        for card in range(cards):
+            timestamp = 0.0
+            prev_interval = float(rng.choice([300, 3600, 86400]))
+            response = int(rng.choice([RESPONSE_EASY, RESPONSE_MEDIUM, RESPONSE_HARD]))
+            writer.writerow(['c%d' % card, timestamp, response, prev_interval, 'hsk1'])
+            for _ in range(reviews - 1):
+                half_life = prev_interval * 2.0 ** TRUE_THETA[response - 1]
+                elapsed = prev_interval * rng.uniform(0.2, 3.0)
+                recalled = rng.random() < 2.0 ** (-elapsed / half_life)
+                response = int(rng.choice([RESPONSE_EASY, RESPONSE_MEDIUM])) if recalled else RESPONSE_HARD
+                timestamp += elapsed
+                prev_interval = float(rng.choice([300, 3600, 86400]))
+                writer.writerow(['c%d' % card, timestamp, response, prev_interval, 'hsk1'])
+
+
+def test_fit_recovers_thetas(tmp_path):
+    path = tmp_path / 'review_log.csv'
+    write_synthetic_log(path)
+    samples = build_training_set(load_review_log(path))
+
+    theta, _, _ = fit_half_life(samples, None, 0)
+
+    assert np.allclose(theta, TRUE_THETA, atol=0.25)
+
+
+def test_easy_gets_the_largest_multiplier(tmp_path):
+    path = tmp_path / 'review_log.csv'
+    write_synthetic_log(path, cards=150)
+    samples = build_training_set(load_review_log(path))
+
+    params = optimize(samples, 0.9, per_deck=True)
+    multipliers = params['multipliers']
+
+    assert float(multipliers['1']) > float(multipliers['2']) > float(multipliers['3'])
+    assert set(params['decks']) == {'hsk1'}
+
+
+def test_pairs_stay_within_a_card(tmp_path):
+    path = tmp_path / 'review_log.csv'
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['card_id', 'timestamp', 'response', 'prev_interval'])
+        writer.writerows([['a', 100, 1, 300], ['a', 500, 2, 600], ['a', 50, 1, 900],
+                          ['b', 700, 3, 300]])
+
+    samples = build_training_set(load_review_log(path))
+
+    # Sorted by time per card, b's single review has no pair
+    assert samples['card_id'].tolist() == ['a', 'a']
+    assert samples['elapsed'].tolist() == [50.0, 400.0]
+    assert samples['base_interval'].tolist() == [900.0, 300.0]
+
+
+def test_pairs_stay_on_one_clock(tmp_path):
+    path = tmp_path / 'review_log.csv'
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['card_id', 'timestamp', 'response', 'prev_interval', 'deck',
+                         'device', 'boot'])
+        # Two boards and a reboot: the clocks cannot be compared
+        writer.writerows([['a', 100, 1, 300, 'hsk1', 'board1', 0],
+                          ['a', 400, 2, 600, 'hsk1', 'board1', 0],
+                          ['a', 200, 1, 900, 'hsk1', 'board1', 1],
+                          ['a', 300, 3, 300, 'hsk1', 'board2', 0],
+                          ['a', 900, 1, 300, 'hsk2', 'board2', 0]])
+
+    samples = build_training_set(load_review_log(path))
+
+    assert samples['elapsed'].tolist() == [300.0]
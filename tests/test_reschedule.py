@@ -0,0 +1,42 @@
+from Utils import Reschedule
+from Utils.ColdStore import due_time
+from Utils.Constants import SECONDS_PER_DAY
+from Utils.Flashcard import Flashcard
+
+NOW = 10 * SECONDS_PER_DAY
+
+
+def overdue_card(hanzi, days_overdue):
+    return Flashcard(hanzi, 'pinyin', 'english', 'noun', interval=SECONDS_PER_DAY,
+                     last_review=NOW - SECONDS_PER_DAY - days_overdue * SECONDS_PER_DAY,
+                     review_count=1)
+
+
+def spread(cards, per_day, days=4):
+    cutoff = Reschedule.overdue_cutoff(cards, NOW, per_day)
+    transform = Reschedule.spread_backlog(NOW, days, cutoff)
+    return [card.hanzi for card in cards if not transform(card)]
+
+
+def test_most_overdue_cards_stay_due():
+    # File order is not overdue order
+    cards = [overdue_card('c%d' % days, days) for days in (1, 5, 2, 8, 3, 7)]
+
+    kept = spread(cards, per_day=3)
+
+    assert sorted(kept) == ['c5', 'c7', 'c8']
+    assert all(due_time(card) > NOW for card in cards if card.hanzi not in kept)
+
+
+def test_ties_at_the_cutoff_keep_exactly_per_day():
+    cards = [overdue_card('c%d' % i, 2) for i in range(5)] + [overdue_card('old', 6)]
+
+    kept = spread(cards, per_day=3)
+
+    assert kept == ['c0', 'c1', 'old']
+
+
+def test_small_backlog_is_left_alone():
+    cards = [overdue_card('c%d' % i, i) for i in range(3)]
+
+    assert Reschedule.overdue_cutoff(cards, NOW, 3) is None
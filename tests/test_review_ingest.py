@@ -0,0 +1,57 @@
+import csv
+
+from review_ingest import ReviewStore
+from Utils import ReviewExport as export_module
+from Utils.ReviewExport import ReviewExport
+from Utils.Flashcard import Flashcard
+
+
+def record_reviews(directory, boots, reviews):
+    """Write a review export with the given number of boots and reviews per boot"""
+    for boot in range(boots):
+        export = ReviewExport(str(directory / 'reviews.mrx'), str(directory / 'reviews_export.json'))
+        assert export.open()
+        for review in range(reviews):
+            card = Flashcard('card%d' % review, 'pinyin', 'english', 'noun',
+                             interval=600, last_review=100.0 * (review + 1), review_count=1)
+            card.deck = 'hsk1'
+            export.add(card, 300, 1)
+        export.flush()
+
+
+def test_ingesting_a_dump_again_adds_nothing(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_module, 'board_id', lambda: 'board1')
+    dump = tmp_path / 'sd'
+    dump.mkdir()
+    record_reviews(dump, boots=2, reviews=3)
+    store = ReviewStore(str(tmp_path / 'store'))
+
+    assert store.ingest([str(dump)]) == (6, 0)
+    # A later dump of the same card holds the old reviews and new ones
+    record_reviews(dump, boots=1, reviews=2)
+    assert ReviewStore(str(tmp_path / 'store')).ingest([str(dump), str(dump)]) == (2, 14)
+
+
+def test_review_log_names_the_clock(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_module, 'board_id', lambda: 'board1')
+    dump = tmp_path / 'sd'
+    dump.mkdir()
+    record_reviews(dump, boots=2, reviews=1)
+    store = ReviewStore(str(tmp_path / 'store'))
+    store.ingest([str(dump)])
+
+    assert store.export_review_log(str(tmp_path / 'review_log.csv')) == 2
+    with open(tmp_path / 'review_log.csv', newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert [(row['device'], row['boot']) for row in rows] == [('board1', '0'), ('board1', '1')]
+
+
+def test_lost_export_state_continues_the_boots(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_module, 'board_id', lambda: 'board1')
+    record_reviews(tmp_path, boots=3, reviews=2)
+    (tmp_path / 'reviews_export.json').write_text('{"bo')
+
+    export = ReviewExport(str(tmp_path / 'reviews.mrx'), str(tmp_path / 'reviews_export.json'))
+    assert export.open()
+
+    assert export.boot == 3
@@ -0,0 +1,64 @@
+from MiniAnki.MiniAnkiSetup import MiniAnkiSetup
+from Utils.Flashcard import Flashcard
+from Utils.RingLog import RingLog
+
+SLOTS = 8
+SLOT_SIZE = 128
+
+
+def open_ring(tmp_path):
+    ring = RingLog(str(tmp_path / 'reviews.log'), SLOTS, SLOT_SIZE)
+    assert ring.open()
+    return ring
+
+
+def log_reviews(ring, count, start=1):
+    for review_count in range(start, start + count):
+        card = Flashcard('card', 'pinyin', 'english', 'noun', interval=300 * review_count,
+                         last_review=100.0 * review_count, review_count=review_count)
+        card.deck = 'hsk1'
+        assert ring.append_review(card, 1)
+
+
+def tear_slot(tmp_path, slot):
+    with open(tmp_path / 'reviews.log', 'r+b') as f:
+        f.seek(slot * SLOT_SIZE + 10)
+        f.write(b'\x00' * 4)
+
+
+def test_torn_slot_zero_after_wrap_keeps_the_reviews(tmp_path):
+    ring = open_ring(tmp_path)
+    log_reviews(ring, SLOTS)
+    ring.close()
+    # Power cut while the next pass rewrites slot 0
+    tear_slot(tmp_path, 0)
+
+    ring = open_ring(tmp_path)
+    assert (ring.head, ring.sequence) == (0, SLOTS)
+    assert [review[3] for review in ring.recover()['hsk1']] == list(range(2, SLOTS + 1))
+
+    log_reviews(ring, 1, start=SLOTS + 1)
+    ring.close()
+    ring = open_ring(tmp_path)
+    assert (ring.head, ring.sequence) == (1, SLOTS + 1)
+    assert ring.recover()['hsk1'][-1][3] == SLOTS + 1
+
+
+class Device(MiniAnkiSetup):
+    def __init__(self, pending_reviews):
+        self.pending_reviews = pending_reviews
+        self.logged_decks = set()
+        self.logged_reviews = 0
+
+
+def test_replay_skips_reviews_the_deck_already_has():
+    card = Flashcard('card', 'pinyin', 'english', 'noun', interval=900,
+                     last_review=500.0, review_count=5)
+    device = Device({'hsk1': [('card', 300, 100.0, 4, 1), ('card', 1200, 600.0, 6, 1)]})
+
+    device.replay_reviews('hsk1', [card])
+
+    assert (card.interval, card.last_review, card.review_count) == (1200, 600.0, 6)
+    device = Device({'hsk1': [('card', 300, 100.0, 4, 1)]})
+    device.replay_reviews('hsk1', [card])
+    assert card.review_count == 6
@@ -0,0 +1,34 @@
+import asyncio
+
+from schedule_server import ScheduleService
+from Utils.Constants import RESPONSE_EASY
+from Utils.DeckFile import write_deck
+from Utils.Flashcard import Flashcard
+
+
+def make_service(tmp_path):
+    cards = [Flashcard('card%d' % i, 'pinyin', 'english', 'noun').to_dict() for i in range(4)]
+    write_deck(str(tmp_path / 'hsk1.json'), cards)
+    return ScheduleService(str(tmp_path / 'hsk1.json'), str(tmp_path / 'learners'))
+
+
+def test_reviews_survive_a_restart(tmp_path):
+    (tmp_path / 'learners').mkdir()
+
+    async def review_and_flush():
+        service = make_service(tmp_path)
+        learner = await service.learner('alice')
+        status, result = service.review(learner, 'card1', RESPONSE_EASY)
+        assert status == 200
+        await service.flush()
+        return result['interval']
+
+    interval = asyncio.run(review_and_flush())
+
+    async def reload():
+        service = make_service(tmp_path)
+        assert await service.warm_up() == 1
+        return service.learners['alice'].by_hanzi['card1']
+
+    card = asyncio.run(reload())
+    assert (card.interval, card.review_count) == (interval, 1)
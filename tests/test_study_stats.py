@@ -0,0 +1,39 @@
+from Utils.Constants import RESPONSE_EASY, SECONDS_PER_DAY
+from Utils.Flashcard import Flashcard
+from Utils.StudyStats import StudyStats
+
+
+def review(stats, current_time):
+    card = Flashcard('hanzi', 'pinyin', 'english', 'noun', interval=600,
+                     last_review=current_time, review_count=1)
+    stats.record_review(card, 300, None, RESPONSE_EASY, current_time)
+
+
+def test_reboot_continues_the_same_day(tmp_path):
+    path = str(tmp_path / 'stats.json')
+    stats = StudyStats()
+    review(stats, 5000.0)
+    stats.save(5000.0 + 3600, path)
+
+    # The monotonic clock starts over after a reboot
+    stats = StudyStats()
+    stats.load(20.0, path)
+    review(stats, 30.0)
+
+    assert len(stats.days) == 1
+    assert stats.summary(30.0)['reviews_today'] == 2
+
+
+def test_day_ends_after_the_remaining_time(tmp_path):
+    path = str(tmp_path / 'stats.json')
+    stats = StudyStats()
+    review(stats, 0.0)
+    stats.save(SECONDS_PER_DAY - 100, path)
+
+    stats = StudyStats()
+    stats.load(10.0, path)
+    review(stats, 50.0)
+    review(stats, 200.0)
+
+    assert len(stats.days) == 2
+    assert stats.summary(200.0)['reviews_today'] == 1
@@ -0,0 +1,104 @@
+import json
+
+from sync_server import LoopbackDevice, LoopbackTransport, SyncStore
+from Utils.Constants import SYNC_PAGE_CARDS
+from Utils.Sync import SyncClient
+
+
+class RecordingTransport(LoopbackTransport):
+    """Loopback transport that keeps every reply"""
+
+    def __init__(self, store):
+        super().__init__(store)
+        self.replies = []
+
+    def request(self, message):
+        reply = super().request(message)
+        self.replies.append(reply)
+        return reply
+
+
+def setup(tmp_path, count=4):
+    card_dicts = [{'hanzi': 'c%03d' % i, 'pinyin': 'p', 'english': 'e', 'part_of_speech': 'n',
+                   'example': '', 'interval': 300, 'last_review': None, 'review_count': 0}
+                  for i in range(count)]
+    deck_file = tmp_path / 'deck.json'
+    deck_file.write_text(json.dumps(card_dicts))
+    store = SyncStore()
+    store.import_deck(str(deck_file), 'hsk1')
+    device = LoopbackDevice('hsk1', card_dicts)
+    transport = RecordingTransport(store)
+    client = SyncClient(transport, state_path=str(tmp_path / 'sync.json'))
+    client.device_id = 'device-a'
+    return store, device, transport, client
+
+
+def test_reviews_are_not_echoed(tmp_path):
+    store, device, transport, client = setup(tmp_path)
+    client.sync(device)
+
+    # The same card twice in one sync, as in the loopback run
+    for i in range(20):
+        device.review('c%03d' % (i % 4), 1 + i % 3, 300 * (i + 1), float(i * 60))
+    result = client.sync(device)
+
+    assert result['reviews_sent'] == 20
+    assert result['cards_received'] == 0
+    assert all(store.decks['hsk1'][card_id]['review_count'] == card['review_count']
+               for card_id, card in device.cards.items())
+    assert client.sync(device)['cards_received'] == 0
+
+
+def test_desktop_edit_reaches_device(tmp_path):
+    store, device, transport, client = setup(tmp_path)
+    client.sync(device)
+    device.review('c001', 1, 600, 60.0)
+    client.sync(device)
+
+    store.decks['hsk1']['c001']['english'] = 'edited'
+    store.decks['hsk1']['c001']['_v'] = store.version = store.version + 1
+    store.decks['hsk1']['c001']['_by'] = None
+    result = client.sync(device)
+
+    assert result['cards_received'] == 1
+    assert device.cards['c001']['english'] == 'edited'
+    assert device.cards['c001']['review_count'] == 1
+
+
+def test_imported_deck_arrives_in_pages(tmp_path):
+    count = 2 * SYNC_PAGE_CARDS + 7
+    store, device, transport, client = setup(tmp_path, count)
+
+    result = client.sync(device)
+
+    assert result['pages'] == 3
+    assert result['cards_received'] == count
+    assert all(sum(map(len, reply['cards'].values())) <= SYNC_PAGE_CARDS
+               for reply in transport.replies)
+    assert client.version == store.version and client.cursor is None
+    assert client.sync(device)['cards_received'] == 0
+
+
+def test_interrupted_paging_resumes(tmp_path):
+    count = 2 * SYNC_PAGE_CARDS + 7
+    store, device, transport, client = setup(tmp_path, count)
+    original = transport.request
+
+    def fail_second_page(message):
+        if message.get('cursor'):
+            raise OSError('unplugged')
+        return original(message)
+
+    transport.request = fail_second_page
+    try:
+        client.sync(device)
+    except OSError:
+        pass
+    assert client.cursor is not None
+
+    transport.request = original
+    resumed = SyncClient(transport, state_path=str(tmp_path / 'sync.json'))
+    result = resumed.sync(device)
+
+    assert result['cards_received'] == count - SYNC_PAGE_CARDS
+    assert resumed.version == store.version
@@ -0,0 +1,153 @@
+import os
+
+import pytest
+
+from MiniAnki import MiniAnkiTiers as tiers_module
+from MiniAnki.MiniAnkiTiers import MiniAnkiTiers
+from Utils.ColdStore import cold_path
+from Utils.Constants import MATURE_INTERVAL_SEC, SECONDS_PER_DAY
+from Utils.DeckFile import read_deck, write_deck
+from Utils.Flashcard import Flashcard
+
+NOW = 100000.0
+
+
+class Device(MiniAnkiTiers):
+    """The tier mixin with just enough of MiniAnki around it"""
+
+    def __init__(self, directory):
+        self.deck_paths = {'hsk1': str(directory / 'hsk1.json')}
+        self.active_decks = ['hsk1']
+        self.decks = {}
+        self.dirty_decks = set()
+        self.load_tier_state()
+
+    def load(self, current_time=NOW):
+        cards = [Flashcard(**card) for card in read_deck(self.deck_paths['hsk1'])]
+        for card in cards:
+            card.deck = 'hsk1'
+        self.decks['hsk1'] = self.split_deck('hsk1', cards, current_time)
+        return self.decks['hsk1']
+
+    def save_deck(self, name, checkpoint=False):
+        if write_deck(self.deck_paths[name], (card.to_dict() for card in self.decks[name])) is None:
+            return
+        self.dirty_decks.discard(name)
+        if name in self.cold_stores:
+            self.cold_tier_saved(name)
+
+    def collect_active_cards(self):
+        pass
+
+
+def card(hanzi, interval=300, last_review=NOW, review_count=1):
+    return Flashcard(hanzi, 'pinyin', 'english', 'noun', interval=interval,
+                     last_review=last_review, review_count=review_count)
+
+
+@pytest.fixture
+def deck_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(tiers_module, 'TIER_STATE_PATH', str(tmp_path / 'tiers.json'))
+    cards = ([card('hot%d' % i) for i in range(3)]
+             + [card('mature%d' % i, interval=2 * MATURE_INTERVAL_SEC) for i in range(4)]
+             + [card('new%d' % i, last_review=None, review_count=0) for i in range(2)])
+    write_deck(str(tmp_path / 'hsk1.json'), [c.to_dict() for c in cards])
+    return tmp_path
+
+
+def all_ids(device):
+    """Every card id in the saved shard and the cold file, with repeats"""
+    ids = [c['hanzi'] for c in read_deck(device.deck_paths['hsk1'])]
+    return sorted(ids + [c.hanzi for c in device.cold_stores['hsk1'].cards()])
+
+
+def test_split_moves_cold_cards(deck_dir):
+    device = Device(deck_dir)
+    hot = device.load()
+
+    assert sorted(c.hanzi for c in hot) == ['hot0', 'hot1', 'hot2']
+    assert device.cold_stores['hsk1'].count == 6
+    assert device.cold_stores['hsk1'].unseen == 2
+    device.save_deck('hsk1')
+    assert not device.tier_state['hsk1']['pending']
+    assert len(all_ids(device)) == 9
+
+
+def test_lost_tier_state_keeps_cold_cards(deck_dir):
+    device = Device(deck_dir)
+    device.load()
+    device.save_deck('hsk1')
+    (deck_dir / 'tiers.json').unlink()
+
+    device = Device(deck_dir)
+    hot = device.load()
+
+    assert len(hot) == 3
+    assert device.cold_stores['hsk1'].count == 6
+    assert device.cold_stores['hsk1'].unseen == 2
+    device.save_deck('hsk1')
+    assert len(all_ids(device)) == 9
+
+
+def test_split_cut_short_before_deck_save(deck_dir):
+    device = Device(deck_dir)
+    device.load()
+    # Power cut: the cold file and state are written, the shard still has every card
+
+    device = Device(deck_dir)
+    hot = device.load()
+
+    assert len(hot) == 3
+    assert device.cold_stores['hsk1'].count == 6
+    device.save_deck('hsk1')
+    assert len(all_ids(device)) == 9
+    assert len(set(all_ids(device))) == 9
+
+
+def test_promote_saves_shard_before_dropping_cold_copy(deck_dir):
+    device = Device(deck_dir)
+    device.load()
+    device.save_deck('hsk1')
+
+    later = NOW + 2 * MATURE_INTERVAL_SEC
+    promoted = device.promote_cold_cards(later)
+
+    assert promoted == 6
+    assert device.cold_stores['hsk1'].count == 0
+    assert len(read_deck(device.deck_paths['hsk1'])) == 9
+    assert not device.tier_state['hsk1']['pending']
+    assert device.tier_state['hsk1']['admitted'] == 2
+
+
+def test_promote_cut_short_before_cold_removal(deck_dir, monkeypatch):
+    device = Device(deck_dir)
+    device.load()
+    device.save_deck('hsk1')
+    store = device.cold_stores['hsk1']
+    # Power cut after the shard is saved, before the cold file is rewritten
+    monkeypatch.setattr(store, 'remove', lambda card_ids: False)
+    device.promote_cold_cards(NOW + 2 * MATURE_INTERVAL_SEC)
+    assert device.tier_state['hsk1']['pending']
+
+    device = Device(deck_dir)
+    hot = device.load(NOW + SECONDS_PER_DAY / 2)
+    device.save_deck('hsk1')
+
+    assert len(hot) + device.cold_stores['hsk1'].count == 9
+    assert len(set(all_ids(device))) == len(all_ids(device)) == 9
+
+
+def test_rewrite_cut_short_between_remove_and_rename(deck_dir):
+    device = Device(deck_dir)
+    device.load()
+    device.save_deck('hsk1')
+    path = cold_path(device.deck_paths['hsk1'])
+    # Power cut after the old cold file is removed, before path.tmp is renamed
+    os.rename(path, path + '.tmp')
+
+    device = Device(deck_dir)
+    hot = device.load()
+
+    assert len(hot) + device.cold_stores['hsk1'].count == 9
+    assert len(set(all_ids(device))) == len(all_ids(device)) == 9
+    assert not os.path.exists(path + '.tmp')